@@ -12,9 +12,7 @@ import os
 import sys
 import logging
 from typing import List, Dict
-import pandas as pd
 import argparse
-from collections import defaultdict
 
 # 第三方库
 from sqlalchemy.orm import Session
@@ -30,7 +28,7 @@ from helper.mylogger import setup_logging
 setup_logging()
 logger = logging.getLogger('get_nv_data_from_db_in_fund')
 
-from agpwind.db import WindNetValues, creating_db_session
+from agpwind.db import creating_db_session, iter_wind_net_values_by_fund
 
 arg_parser = argparse.ArgumentParser()
 arg_parser.add_argument('-c', '--dbinfo', default=os.path.join(PATH_PROJECT, 'Config', 'DBInfo.json'))
@@ -59,34 +57,19 @@ if __name__ == '__main__':
     database = db_info['database']
     user = db_info['user']
     pwd = db_info['pwd']
-    db_session = creating_db_session(host=host, user=user, pwd=pwd, database=database)
+    dialect = db_info.get('dialect')     # 默认 mssql+pymssql
+    db_session = creating_db_session(host=host, user=user, pwd=pwd, database=database, dialect=dialect)
 
-    # 从数据库获取
-    result = db_session.query(WindNetValues.Date, WindNetValues.Fund, WindNetValues.NetValue).filter(
-        WindNetValues.Date >= START_DATE
-    ).all()
-    db_session.close()
-    # print(result)
-
-    # 转化数据格式
-    d_all_data_gb_fund = defaultdict(list)
-    for _data in result:
-        # _date = datetime.strptime(_data[0], '%Y%m%d')
-        # if (_date.weekday() == 6) or (_date.weekday() == 5):
-        #     # 防止误入了周六周日的净值
-        #     continue
-        d_all_data_gb_fund[_data[1]].append({
-            "Date": _data[0],
-            "Fund": _data[1],
-            "NetValue": _data[2],
-        })
-
-    for _fund, _data in d_all_data_gb_fund.items():
-        df = pd.DataFrame(_data)
-        df.sort_values('Date', inplace=True)
+    # 从数据库获取, 按 (Fund, Date) 排序分批读取, 每个基金读完后 立即输出
+    n_funds = 0
+    for _fund, _data in iter_wind_net_values_by_fund(db_session, start_date=START_DATE):
         # output_1 净值
         path_output_csv = os.path.join(PATH_OUTPUT_ROOT, _fund + '.csv')
-        df.to_csv(path_output_csv, columns=['Date', 'NetValue'], index=False, header=False, encoding='utf-8')
+        with open(path_output_csv, 'w', encoding='utf-8') as f:
+            f.writelines([f'{_date},{"" if _nv is None else _nv}\n' for _date, _nv in _data])
+        n_funds += 1
+    db_session.close()
+    logger.info(f'{n_funds} funds')
 
     logger.info('Finished')
 
@@ -16,11 +16,8 @@ import logging
 setup_logging()
 logger = logging.getLogger('APG.Wind.get_fund_net_value')
 
-try:
-    from WindPy import w
-except:
-    logger.error('import WindPy error')
-    raise ImportError
+from agpwind.method import start_wind, close_wind
+from agpwind.retry import request_wind, get_failure_report
 
 import argparse
 
@@ -76,7 +73,7 @@ if __name__ == '__main__':
         l_fund_info.append([line.split(',')[0], line.split(',')[1]])
 
     # 获取
-    w.start()
+    start_wind()
 
     # l_all_data = []
     l_fund_df = list()
@@ -84,7 +81,8 @@ if __name__ == '__main__':
     for _id, _name in l_fund_info:
         print(_name)
         # 从 wind 获取数据
-        wsd_data = w.wsd(
+        wsd_data = request_wind(
+            'wsd',
             _id, "NAV_adj",
             start_date,
             end_date,
@@ -93,9 +91,8 @@ if __name__ == '__main__':
         if wsd_data.ErrorCode == 0:
             pass
         else:
-            logger.error(f"Error Code: {wsd_data.ErrorCode}")
-            logger.error(f"Error Message: {wsd_data.Data[0][0]}")
-            os.system('pause')
+            # 错误已记录在 get_failure_report() 中, 跳过此基金
+            continue
 
         # 解析数据
         l_fund_data = list()
@@ -149,4 +146,5 @@ if __name__ == '__main__':
     df_all.columns = l_fund_name
     df_all.to_csv(os.path.join(output_root, '_all.csv'))
 
-    w.close()
+    close_wind()
+    get_failure_report().log()
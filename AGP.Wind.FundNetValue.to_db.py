@@ -6,6 +6,9 @@
 查看新数据的最新日期，
 删除旧数据，
 插入新数据
+
+默认将 所有基金 的新数据 一次写入临时表, 由一次 MERGE 完成 删除/更新/插入, 并输出每个基金的变化;
+--rowbyrow: 逐个基金 删除, 再逐行插入
 """
 
 # 内置库
@@ -30,16 +33,19 @@ from helper.mylogger import setup_logging
 setup_logging()
 logger = logging.getLogger('update_nv_data_to_db')
 
-from agpwind.db import WindNetValues, creating_db_session
+from agpwind.db import WindNetValues, creating_db_session, creating_engine, bulk_merge_wind_net_values
+from pyptools.common.db import log_engine_stats
 
 arg_parser = argparse.ArgumentParser()
 arg_parser.add_argument('-c', '--dbinfo', default=os.path.join(PATH_PROJECT, 'Config', 'DBInfo.json'))
 arg_parser.add_argument('-i', '--input')
 arg_parser.add_argument('--days', default=15)
+arg_parser.add_argument('--rowbyrow', action='store_true', help='逐行插入')
 args = arg_parser.parse_args()
 PATH_DB_INFO_FILE = os.path.abspath(args.dbinfo)
 PATH_INPUT = os.path.abspath(args.input)
 CHECKING_DAYS = int(args.days)
+IS_ROW_BY_ROW = args.rowbyrow
 assert os.path.isfile(PATH_DB_INFO_FILE)
 assert os.path.isdir(PATH_INPUT)
 
@@ -73,23 +79,9 @@ def del_old_data_in_db(db_session: Session, start_date, fund):
     db_session.commit()
 
 
-def main():
-    # 【0】  读取config
-    db_info: dict = json.loads(
-        open(PATH_DB_INFO_FILE, encoding='utf-8').read(),
-        encoding='utf-8'
-    )
-    host = db_info['host']
-    database = db_info['database']
-    user = db_info['user']
-    pwd = db_info['pwd']
-
-    # 输入到数据库
-    db_session = creating_db_session(host=host, user=user, pwd=pwd, database=database)
-
-    # 读取数据
-    dt_today = datetime.today().date()
-    start_date_to_input = (dt_today - timedelta(days=CHECKING_DAYS)).strftime('%Y%m%d')
+def read_new_data(start_date_to_input: str) -> dict:
+    """{fund: {date: net_value}}, 只包含 start_date_to_input 之后的数据"""
+    d_all_new_data = dict()
     for _file_name in os.listdir(PATH_INPUT):
         p_file = os.path.join(PATH_INPUT, _file_name)
         if not os.path.isfile(p_file):
@@ -114,7 +106,43 @@ def main():
             if _date < start_date_to_input:
                 continue
             d_new_data[_date] = _net_value
+        if not d_new_data:
+            logger.warning('没有新数据: %s' % _fund_name)
+            continue
+        d_all_new_data[_fund_name] = d_new_data
+    return d_all_new_data
+
+
+def main():
+    # 【0】  读取config
+    db_info: dict = json.loads(
+        open(PATH_DB_INFO_FILE, encoding='utf-8').read(),
+        encoding='utf-8'
+    )
+    host = db_info['host']
+    database = db_info['database']
+    user = db_info['user']
+    pwd = db_info['pwd']
+    dialect = db_info.get('dialect')     # 默认 mssql+pymssql
+
+    # 读取数据
+    dt_today = datetime.today().date()
+    start_date_to_input = (dt_today - timedelta(days=CHECKING_DAYS)).strftime('%Y%m%d')
+    d_all_new_data = read_new_data(start_date_to_input)
+
+    if not IS_ROW_BY_ROW:
+        # 一次 MERGE
+        engine = creating_engine(host=host, user=user, pwd=pwd, database=database, dialect=dialect)
+        d_changes = bulk_merge_wind_net_values(engine, d_all_new_data)
+        for _fund_name, _changes in sorted(d_changes.items()):
+            logger.info('%s, %s' % (_fund_name, str(_changes)))
+        log_engine_stats()
+        return
+
+    # 输入到数据库
+    db_session = creating_db_session(host=host, user=user, pwd=pwd, database=database, dialect=dialect)
 
+    for _fund_name, d_new_data in d_all_new_data.items():
         # 删除数据
         _first_day = min(list(d_new_data.keys()))
         del_old_data_in_db(db_session=db_session, start_date=_first_day, fund=_fund_name)
@@ -19,7 +19,8 @@ PATH_ROOT = os.path.abspath(os.path.dirname(__file__))
 sys.path.append(PATH_ROOT)
 
 from agpwind.object import WindGeneralTickerInfoFile, WindGeneralTickerInfoData
-from agpwind.db import WindGeneralTickerInfo
+from agpwind.db import WindGeneralTickerInfoQuery, creating_engine
+from pyptools.common.db import LARGE_POOL_SETTINGS
 from helper.mylogger import setup_logging
 import logging
 
@@ -49,43 +50,34 @@ PATH_CONFIG_FILE = os.path.join(PATH_ROOT, 'Config', 'Config.json')
 assert os.path.isfile(PATH_CONFIG_FILE)
 
 
-def _download_wind_gti(db_config) -> (List[WindGeneralTickerInfoData], List[WindGeneralTickerInfoData]):
-    from sqlalchemy import create_engine
-    from sqlalchemy.orm import relationship, sessionmaker
-    from sqlalchemy.sql import func
-    from urllib import parse
-
-    engine = create_engine(
-        f'mssql+pymssql://{str(db_config["user"])}:{parse.quote_plus(db_config["pwd"])}@'
-        f'{str(db_config["host"])}/{str(db_config["db"])}',
-        echo=False,
-        max_overflow=50,  # 超过连接池大小之后，允许最大扩展连接数；
-        pool_size=50,  # 连接池的大小
-        pool_timeout=600,  # 连接池如果没有连接了，最长的等待时间
-        pool_recycle=-1,  # 多久之后对连接池中连接进行一次回收
-    )
+def _download_wind_gti(db_config) -> (List[WindGeneralTickerInfoData], List[WindGeneralTickerInfoData], List[WindGeneralTickerInfoData]):
+    """
+    :return: 最新一天的数据; 最近两天之间 有变化的品种 在 第二新一天 和 最新一天 的数据
+    """
+    engine = creating_engine(
+        host=str(db_config["host"]), user=str(db_config["user"]),
+        pwd=str(db_config["pwd"]), database=str(db_config["db"]),
+        dialect=db_config.get("dialect"), pool_settings=LARGE_POOL_SETTINGS)
 
-    # 创建DBSession类
-    DBSession = sessionmaker(bind=engine)
-    session = DBSession()
-    db_data_date = list(set([_[0] for _ in session.query(WindGeneralTickerInfo.date).all()]))
-    db_data_date.sort()
-    # logger.info(db_data_date)
-    newest_date = db_data_date[-1]
+    # 日期 与 比较 都在数据库中完成
+    query = WindGeneralTickerInfoQuery(engine)
+    db_data_date = query.latest_dates(2)
+    newest_date = db_data_date[0]
     if len(db_data_date) >= 2:
-        second_date = db_data_date[-2]
+        second_date = db_data_date[1]
     else:
         second_date = None
     logger.info(f'{newest_date}, {second_date}')
 
-    l_db_newest_data: List[WindGeneralTickerInfo] = session.query(
-        WindGeneralTickerInfo).filter(WindGeneralTickerInfo.date == newest_date).all()
+    l_newest_data = query.snapshot(newest_date)
+    l_changed_second_data, l_changed_newest_data = [], []
     if second_date:
-        l_db_second_data: List[WindGeneralTickerInfo] = session.query(
-            WindGeneralTickerInfo).filter(WindGeneralTickerInfo.date == second_date).all()
-    else:
-        l_db_second_data = []
-    return [_.to_inner_data() for _ in l_db_newest_data], [_.to_inner_data() for _ in l_db_second_data]
+        for _second, _newest in query.changes_between(second_date, newest_date):
+            if _second:
+                l_changed_second_data.append(_second)
+            if _newest:
+                l_changed_newest_data.append(_newest)
+    return l_newest_data, l_changed_second_data, l_changed_newest_data
 
 
 def check_general_ticker_info(
@@ -159,8 +151,8 @@ if __name__ == '__main__':
     # 从db获取最新数据
     d_config = json.loads(open(PATH_CONFIG_FILE, encoding='utf-8').read())
     _db_config = d_config.get('db')
-    # 最新一天的数据，和第二新的数据
-    l_newest_data, l_second_data = _download_wind_gti(_db_config)
+    # 最新一天的数据，和最近两天有变化的数据
+    l_newest_data, l_changed_second_data, l_changed_newest_data = _download_wind_gti(_db_config)
 
     # 读取标准数据
     l_standard_gti_data: List[WindGeneralTickerInfoData] = WindGeneralTickerInfoFile.from_file(PATH_STANDARD_GTI_DATA_FILE)
@@ -183,7 +175,7 @@ if __name__ == '__main__':
     print('\n')
     logger.info('检查最近两天数据是否一致：')
     l_newest_changed_from_second_day: List[List[WindGeneralTickerInfoData]] = check_general_ticker_info(
-        standard=l_second_data, checking=l_newest_data)
+        standard=l_changed_second_data, checking=l_changed_newest_data)
     d_checking_result['Changed'] = [[__.json() for __ in _] for _ in l_newest_changed_from_second_day]
 
     # 2 异常, 今日数据 与 标准数据 不一致
@@ -1,15 +1,21 @@
 import os
 import sys
-from datetime import datetime
+from datetime import datetime, timedelta
 from pprint import pprint
-from typing import List
+from typing import List, Dict
+from collections import defaultdict
 
 
 PATH_ROOT = os.path.abspath(os.path.dirname(__file__))
 sys.path.append(PATH_ROOT)
 
-from agpwind.method import get_wind_daily_bar, start_wind, close_wind, _inner_symbol_to_wind
+from agpwind.cache import enable_cache
+from agpwind.retry import get_failure_report
+from agpwind.method import (
+    get_wind_daily_bars, start_wind, close_wind, _inner_symbol_to_wind, _wind_symbol_name_to_inner)
 from agpwind.object import WindDailyBarData, WindDailyBarFile
+from agpwind.incremental import existing_daily_bar_data, missing_daily_bar_ranges, exchange_holidays
+from pyptools.pyplatinum.holiday import HolidayManager
 from helper.mylogger import setup_logging
 import logging
 
@@ -24,12 +30,19 @@ arg_parser.add_argument('-s', '--start', default='')
 arg_parser.add_argument('-e', '--end', default='')
 arg_parser.add_argument('-i', '--input', default='', help='输入文件')
 arg_parser.add_argument('-o', '--output', default='')
+arg_parser.add_argument('--cache', default=os.path.join(PATH_ROOT, 'Cache', 'Wind'), help='wind 请求缓存目录')
+arg_parser.add_argument('--nocache', action='store_true')
+arg_parser.add_argument('--incremental', action='store_true', help='只获取输出文件中缺少的日期, 并合并到输出文件')
+arg_parser.add_argument('--holiday', default='', help='Holidays.csv, 用于增量获取时计算交易日')
 args = arg_parser.parse_args()
 symbol = args.symbol
 start_date = args.start
 end_date = args.end
 input_file = args.input
 output_file = args.output
+path_cache_root = '' if args.nocache else os.path.abspath(args.cache)
+is_incremental = args.incremental
+holiday_file = args.holiday
 
 if symbol:
     input_file = ''
@@ -44,6 +57,15 @@ if output_file:
     output_file = os.path.abspath(output_file)
     if not os.path.isdir(os.path.dirname(output_file)):
         os.makedirs(os.path.dirname(output_file))
+if holiday_file:
+    holiday_file = os.path.abspath(holiday_file)
+    assert os.path.isfile(holiday_file)
+if is_incremental:
+    assert output_file
+    if not end_date:
+        end_date = datetime.now().date()
+    if not start_date:
+        start_date = end_date - timedelta(days=10)
 
 
 if __name__ == '__main__':
@@ -61,14 +83,48 @@ if __name__ == '__main__':
         l_symbols = [symbol]
 
     # 获取
+    if path_cache_root:
+        wind_cache = enable_cache(path_cache_root)
     start_wind()
     l_all_data: List[WindDailyBarData] = []
-    for symbol in l_symbols:
-        l_data: List[WindDailyBarData] = get_wind_daily_bar(
-            symbol=_inner_symbol_to_wind(symbol), start_date=start_date, end_date=end_date)
-        pprint(l_data, indent=4)
-        l_all_data += l_data
+    if is_incremental:
+        # 增量, 按缺少的日期区间分组, 相同区间的 symbol 一起批量获取
+        d_existing_data: Dict[str, List[WindDailyBarData]] = existing_daily_bar_data(output_file)
+        d_holidays = HolidayManager(holiday_file).trading_calendars() if holiday_file else {}
+        d_range_symbols = defaultdict(list)
+        for symbol in l_symbols:
+            _product = _wind_symbol_name_to_inner(_inner_symbol_to_wind(symbol))
+            for _range in missing_daily_bar_ranges(
+                    d_existing_data, _product, start_date, end_date, exchange_holidays(d_holidays, symbol)):
+                d_range_symbols[_range].append(_inner_symbol_to_wind(symbol))
+        logger.info(f'incremental, {len(d_range_symbols)} missing ranges')
+        d_new_data: Dict[str, List[WindDailyBarData]] = defaultdict(list)
+        for (_start, _end), _l_wind_symbols in d_range_symbols.items():
+            for _wind_symbol, _l_data in get_wind_daily_bars(
+                    symbols=_l_wind_symbols, start_date=_start, end_date=_end).items():
+                d_new_data[_wind_symbol] += _l_data
+        # 合并, 新数据覆盖旧数据
+        for symbol in l_symbols:
+            _product = _wind_symbol_name_to_inner(_inner_symbol_to_wind(symbol))
+            d_product_data = {_.date: _ for _ in d_existing_data.pop(_product, [])}
+            for _data in d_new_data.get(_inner_symbol_to_wind(symbol), []):
+                d_product_data[_data.date] = _data
+            l_all_data += [d_product_data[_date] for _date in sorted(d_product_data.keys())]
+        # 保留 输入文件之外 的旧数据
+        for _product, _l_data in d_existing_data.items():
+            l_all_data += _l_data
+    else:
+        # 多品种单指标 批量获取
+        d_data: Dict[str, List[WindDailyBarData]] = get_wind_daily_bars(
+            symbols=[_inner_symbol_to_wind(symbol) for symbol in l_symbols], start_date=start_date, end_date=end_date)
+        for symbol in l_symbols:
+            l_data: List[WindDailyBarData] = d_data.get(_inner_symbol_to_wind(symbol), [])
+            pprint(l_data, indent=4)
+            l_all_data += l_data
     close_wind()
+    get_failure_report().log()
+    if path_cache_root:
+        logger.info(f'wind cache, {str(wind_cache.stats)}')
 
     WindDailyBarFile.to_file(l_all_data, output_file)
     # if output_file:
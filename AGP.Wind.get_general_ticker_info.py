@@ -9,9 +9,15 @@ import json
 PATH_ROOT = os.path.abspath(os.path.dirname(__file__))
 sys.path.append(PATH_ROOT)
 
-from agpwind.method import get_wind_general_ticker_info, start_wind, close_wind, _inner_symbol_to_wind
+from agpwind.cache import enable_cache
+from agpwind.retry import get_failure_report
+from agpwind.method import (
+    get_wind_general_ticker_info, get_wind_general_ticker_info_snapshot, start_wind, close_wind, _inner_symbol_to_wind)
+from agpwind.incremental import symbols_by_trading_day
 from agpwind.object import WindGeneralTickerInfoData, WindGeneralTickerInfoFile
-from agpwind.db import WindGeneralTickerInfo
+from agpwind.db import creating_engine, bulk_upsert_wind_gti
+from pyptools.common.db import log_engine_stats, LARGE_POOL_SETTINGS
+from pyptools.pyplatinum.holiday import HolidayManager
 from helper.mylogger import setup_logging
 import logging
 
@@ -27,6 +33,14 @@ arg_parser.add_argument('-o', '--output', default=os.path.join(PATH_ROOT, 'Outpu
 arg_parser.add_argument('-s', '--start', default='')
 arg_parser.add_argument('-e', '--end', default='')
 arg_parser.add_argument('--db', action='store_true')
+arg_parser.add_argument('--cache', default=os.path.join(PATH_ROOT, 'Cache', 'Wind'), help='wind 请求缓存目录')
+arg_parser.add_argument('--nocache', action='store_true')
+arg_parser.add_argument('--snapshot', action='store_true',
+                        help='按交易日 截面获取(w.wss), 每个交易日1次请求; '
+                             'start == end（日常任务）时 自动使用, 需要原来的 逐个品种 w.wsd 时 使用 --nosnapshot')
+arg_parser.add_argument('--nosnapshot', action='store_true',
+                        help='逐个品种获取(w.wsd), 即 原来的方式; 优先于 --snapshot 和 start == end 时的 自动截面获取')
+arg_parser.add_argument('--holiday', default='', help='Holidays.csv, 多日截面获取时 每个品种 只请求 其所属交易所的交易日; 没有时 多日 使用 w.wsd')
 args = arg_parser.parse_args()
 symbol = args.symbol
 start_date = args.start
@@ -34,6 +48,9 @@ end_date = args.end
 input_file = args.input
 path_output_root = os.path.abspath(args.output)
 is_saving_db = args.db
+path_cache_root = '' if args.nocache else os.path.abspath(args.cache)
+is_snapshot = args.snapshot
+holiday_file = args.holiday
 
 if symbol:
     input_file = ''
@@ -50,34 +67,29 @@ if input_file:
     assert os.path.isfile(input_file)
 if not os.path.isdir(path_output_root):
     os.makedirs(path_output_root)
+if start_date == end_date:
+    is_snapshot = True
+if args.nosnapshot:
+    is_snapshot = False
+if holiday_file:
+    holiday_file = os.path.abspath(holiday_file)
+    assert os.path.isfile(holiday_file)
+if is_snapshot and start_date != end_date and not holiday_file:
+    # 没有假期信息 无法确定 各交易所的交易日, 使用 w.wsd（只返回交易日的数据）
+    logger.warning('多日截面获取 需要 --holiday, 改为 逐个品种获取(w.wsd)')
+    is_snapshot = False
 
 
 def _to_wind_gti_db(db_config, data: List[WindGeneralTickerInfoData]):
-    from sqlalchemy import create_engine
-    from sqlalchemy.orm import sessionmaker
-    from urllib import parse
-
     logger.info(f'wind gti data to db')
 
-    engine = create_engine(
-        f'mssql+pymssql://{str(db_config["user"])}:{parse.quote_plus(db_config["pwd"])}@'
-        f'{str(db_config["host"])}/{str(db_config["db"])}',
-        echo=False,
-        max_overflow=50,  # 超过连接池大小之后，允许最大扩展连接数；
-        pool_size=50,  # 连接池的大小
-        pool_timeout=600,  # 连接池如果没有连接了，最长的等待时间
-        pool_recycle=-1,  # 多久之后对连接池中连接进行一次回收
-    )
-
-    # 创建DBSession类
-    DBSession = sessionmaker(bind=engine)
-    session = DBSession()
-    for _data in data:
-        session.add(WindGeneralTickerInfo.from_inner_data(_data))
-        try:
-            session.commit()
-        except :
-            logger.warning(f'插入db失败, {_data.product}, {str(_data.date)}')
+    engine = creating_engine(
+        host=str(db_config["host"]), user=str(db_config["user"]),
+        pwd=str(db_config["pwd"]), database=str(db_config["db"]),
+        dialect=db_config.get("dialect"), pool_settings=LARGE_POOL_SETTINGS)
+    # 批量写入, 主键冲突时 MERGE; 记录 inserted / updated / elapsed
+    bulk_upsert_wind_gti(engine, data)
+    log_engine_stats()
 
 
 if __name__ == '__main__':
@@ -97,17 +109,35 @@ if __name__ == '__main__':
         l_symbols = [symbol]
 
     # 获取
+    if path_cache_root:
+        wind_cache = enable_cache(path_cache_root)
     start_wind()
     l_all_data: List[WindGeneralTickerInfoData] = []
-    for symbol in l_symbols:
-        logger.info(f'checking {symbol}, {str(start_date)}, {str(end_date)}')
-        l_data: List[WindGeneralTickerInfoData] = get_wind_general_ticker_info(
-            symbol=_inner_symbol_to_wind(symbol),
-            start_date=start_date,
-            end_date=end_date
-        )
-        l_all_data += l_data
+    if is_snapshot:
+        # 截面获取, 每个交易日 1次请求, 只包含 当天 所属交易所 交易的 symbol
+        # 单日 (日常任务) 直接请求该日期
+        if start_date == end_date:
+            d_day_symbols = {start_date: l_symbols}
+        else:
+            d_day_symbols = symbols_by_trading_day(
+                start_date, end_date, HolidayManager(holiday_file).trading_calendars(), l_symbols)
+        for _trade_date, _symbols in d_day_symbols.items():
+            logger.info(f'checking snapshot, {len(_symbols)} symbols, {str(_trade_date)}')
+            l_all_data += get_wind_general_ticker_info_snapshot(
+                symbols=[_inner_symbol_to_wind(_) for _ in _symbols], trade_date=_trade_date)
+    else:
+        for symbol in l_symbols:
+            logger.info(f'checking {symbol}, {str(start_date)}, {str(end_date)}')
+            l_data: List[WindGeneralTickerInfoData] = get_wind_general_ticker_info(
+                symbol=_inner_symbol_to_wind(symbol),
+                start_date=start_date,
+                end_date=end_date
+            )
+            l_all_data += l_data
     close_wind()
+    get_failure_report().log()
+    if path_cache_root:
+        logger.info(f'wind cache, {str(wind_cache.stats)}')
 
     logger.info('output file')
     output_file = os.path.join(path_output_root, 'TickerInfos.csv')
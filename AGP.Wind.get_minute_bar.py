@@ -8,8 +8,12 @@ from typing import List
 PATH_ROOT = os.path.abspath(os.path.dirname(__file__))
 sys.path.append(PATH_ROOT)
 
-from agpwind.method import get_wind_minute_bar, start_wind, close_wind, _inner_symbol_to_wind, output_wind_minute_bar_data
-from agpwind.object import WindMinuteBarData
+from agpwind.retry import get_failure_report
+from agpwind.method import start_wind, close_wind, _inner_symbol_to_wind, _wind_symbol_name_to_inner
+from agpwind.pipeline import MinuteBarPipeline, iter_minute_bar_batches
+from agpwind.backfill import MinuteBarBackfill, _chunk_to_wsi_range
+from agpwind.incremental import missing_minute_bar_ranges, exchange_holidays
+from pyptools.pyplatinum.holiday import HolidayManager
 from helper.mylogger import setup_logging
 import logging
 
@@ -24,12 +28,24 @@ arg_parser.add_argument('-s', '--start', default='')
 arg_parser.add_argument('-e', '--end', default='')
 arg_parser.add_argument('-i', '--input', default='', help='输入文件, symbols')
 arg_parser.add_argument('-o', '--output', default='')
+arg_parser.add_argument('--backfill', action='store_true', help='按交易日切分, 并发回补')
+arg_parser.add_argument('--incremental', action='store_true', help='只获取输出目录中缺少的日期')
+arg_parser.add_argument('--holiday', default='', help='Holidays.csv, 用于回补/增量获取时计算交易日')
+arg_parser.add_argument('--chunk', default=5, help='回补时每个请求包含的交易日数量')
+arg_parser.add_argument('--workers', default=4, help='回补时的并发请求数量')
+arg_parser.add_argument('--queue', default=16, help='获取/输出 之间 最多等待写出的 (ticker, 日期) 数量')
 args = arg_parser.parse_args()
 symbol = args.symbol
 start_date = args.start
 end_date = args.end
 input_file = args.input
 output_root = args.output
+is_backfill = args.backfill
+is_incremental = args.incremental
+holiday_file = args.holiday
+chunk_days = int(args.chunk)
+max_workers = int(args.workers)
+max_queue = int(args.queue)
 
 if symbol:
     input_file = ''
@@ -43,6 +59,9 @@ if input_file:
 if output_root:
     if not os.path.isdir(output_root):
         os.makedirs(output_root)
+if holiday_file:
+    holiday_file = os.path.abspath(holiday_file)
+    assert os.path.isfile(holiday_file)
 
 
 if __name__ == '__main__':
@@ -64,19 +83,47 @@ if __name__ == '__main__':
     else:
         l_symbols_start_end.append([symbol, start_date, end_date])
 
-    # 获取
-    start_wind()
-    l_all_data: List[WindMinuteBarData] = []
-    for _symbol, _start, _end in l_symbols_start_end:
-        _wind_symbol = _inner_symbol_to_wind(_symbol)
-        l_data: List[WindMinuteBarData] = get_wind_minute_bar(
-            symbol=_wind_symbol, start_date=_start, end_date=_end)
-        # pprint(l_data, indent=4)
-        l_all_data += l_data
-    close_wind()
+    # 增量, 只获取 输出目录中 缺少的交易日区间
+    if is_incremental:
+        assert output_root
+        d_holidays = HolidayManager(holiday_file).trading_calendars() if holiday_file else {}
+        l_missing_symbols_start_end = list()
+        for _symbol, _start, _end in l_symbols_start_end:
+            _ticker = _wind_symbol_name_to_inner(_inner_symbol_to_wind(_symbol))
+            for _missing_start, _missing_end in missing_minute_bar_ranges(
+                    output_root, _ticker, _start, _end, exchange_holidays(d_holidays, _symbol)):
+                l_missing_symbols_start_end.append([_symbol, _missing_start, _missing_end])
+        logger.info(f'incremental, {len(l_symbols_start_end)} symbols, '
+                    f'{len(l_missing_symbols_start_end)} missing ranges')
+        l_symbols_start_end = l_missing_symbols_start_end
+
+    # 回补, 分段并发获取, 每段完成后直接输出
+    if is_backfill:
+        assert output_root
+        d_holidays = HolidayManager(holiday_file).trading_calendars() if holiday_file else {}
+        start_wind()
+        backfill = MinuteBarBackfill(
+            output_root=output_root, holidays=d_holidays, chunk_days=chunk_days, max_workers=max_workers)
+        backfill.run(l_symbols_start_end)
+        close_wind()
+        get_failure_report().log()
+        logger.info(f'backfill finished, {str(backfill.stats)}')
+        sys.exit()
+
+    # 获取 与 输出 流水线: 每个 symbol 获取后 按日期拆分, 经有界队列 交给写出, 不在内存中累积
+    def _gen_wind_symbols_start_end():
+        for _symbol, _start, _end in l_symbols_start_end:
+            if is_incremental:
+                # 按整日请求, 避免覆盖已有的日期文件
+                _start, _end = _chunk_to_wsi_range(_start, _end)
+            yield [_inner_symbol_to_wind(_symbol), _start, _end]
 
-    # WindDailyBarFile.to_file(l_all_data, output_file)
-    # if output_file:
-    #     WindDailyBarFile.to_file(l_all_data, output_file)
+    start_wind()
     if output_root:
-        output_wind_minute_bar_data(data=l_all_data, output_root=output_root)
+        pipeline = MinuteBarPipeline(output_root=output_root, max_queue=max_queue)
+        pipeline.run(iter_minute_bar_batches(_gen_wind_symbols_start_end()))
+    else:
+        for _ in iter_minute_bar_batches(_gen_wind_symbols_start_end()):
+            pass
+    close_wind()
+    get_failure_report().log()
@@ -0,0 +1,411 @@
+"""
+wind 数据接口
+
+agpwind.method 中的所有 wind 请求都通过 get_backend() 获取的 WindBackend 发出，
+    WindPyBackend:  真实的 WindPy (from WindPy import w)，默认使用
+    FakeWindBackend:  确定性的 模拟数据，可设置 规模/延迟/缺失/错误，用于在没有 wind 终端的机器上 测试和benchmark
+    RecordingWindBackend / ReplayWindBackend:  记录真实请求的返回，保存到文件，之后在其他机器上回放
+
+    from agpwind.backend import set_backend, FakeWindBackend
+    set_backend(FakeWindBackend(latency=0.05))
+
+返回的数据结构与 WindPy 的 WindData 相同: ErrorCode, Codes, Fields, Times, Data
+"""
+
+import time
+import zlib
+import pickle
+import random
+import logging
+from datetime import datetime, date, timedelta
+from typing import List, Dict
+
+logger = logging.getLogger('apgwind')
+
+
+class WindBackend:
+    """wind 接口, 方法与 WindPy.w 相同"""
+
+    def start(self):
+        raise NotImplementedError
+
+    def close(self):
+        raise NotImplementedError
+
+    def wsd(self, codes, fields, beginTime=None, endTime=None, options=None, **kwargs):
+        """日期序列. 多品种单指标 或者 单品种多指标"""
+        raise NotImplementedError
+
+    def wsi(self, codes, fields, beginTime=None, endTime=None, options=None, **kwargs):
+        """分钟序列"""
+        raise NotImplementedError
+
+    def wss(self, codes, fields, options=None, **kwargs):
+        """截面数据. 多品种多指标"""
+        raise NotImplementedError
+
+
+class WindPyBackend(WindBackend):
+    def __init__(self):
+        try:
+            from WindPy import w
+        except:
+            logger.error('import WindPy error')
+            raise ImportError
+        self._w = w
+
+    def start(self):
+        return self._w.start()
+
+    def close(self):
+        return self._w.close()
+
+    def wsd(self, codes, fields, beginTime=None, endTime=None, options=None, **kwargs):
+        return self._w.wsd(codes, fields, beginTime, endTime, options, **kwargs)
+
+    def wsi(self, codes, fields, beginTime=None, endTime=None, options=None, **kwargs):
+        return self._w.wsi(codes, fields, beginTime, endTime, options, **kwargs)
+
+    def wss(self, codes, fields, options=None, **kwargs):
+        return self._w.wss(codes, fields, options, **kwargs)
+
+
+_backend: WindBackend or None = None
+
+
+def get_backend() -> WindBackend:
+    """当前使用的 wind 接口; 未设置时, 使用 WindPyBackend"""
+    global _backend
+    if _backend is None:
+        _backend = WindPyBackend()
+    return _backend
+
+
+def set_backend(backend: WindBackend):
+    global _backend
+    _backend = backend
+
+
+"""
+模拟数据
+"""
+
+
+class FakeWindData:
+    """与 WindPy.WindData 结构相同"""
+
+    def __init__(self, error_code=0, codes=None, fields=None, times=None, data=None):
+        self.ErrorCode = error_code
+        self.Codes = codes or []
+        self.Fields = fields or []
+        self.Times = times or []
+        self.Data = data or []
+
+    def __repr__(self):
+        return (f'<FakeWindData(ErrorCode={self.ErrorCode}, Codes={self.Codes}, Fields={self.Fields}, '
+                f'Times={len(self.Times)}, Data={len(self.Data)})>')
+
+    @classmethod
+    def from_wind_data(cls, data):
+        return cls(
+            error_code=data.ErrorCode, codes=list(data.Codes), fields=list(data.Fields),
+            times=list(data.Times), data=[list(_) for _ in data.Data]
+        )
+
+
+def _split(s) -> List[str]:
+    if isinstance(s, (list, tuple)):
+        return [str(_).strip() for _ in s]
+    return [_.strip() for _ in str(s).split(',') if _.strip()]
+
+
+def _to_datetime(d) -> datetime:
+    if isinstance(d, datetime):
+        return d
+    if isinstance(d, date):
+        return datetime.combine(d, datetime.min.time())
+    d = str(d)
+    for _fmt in ['%Y-%m-%d %H:%M:%S', '%Y-%m-%d', '%Y%m%d']:
+        try:
+            return datetime.strptime(d, _fmt)
+        except ValueError:
+            continue
+    raise ValueError(d)
+
+
+# 模拟的交易时间段 (分钟数据的 Times 为 bar 的开始时间)
+FAKE_TRADING_SESSION = [
+    [(9, 0), (10, 15)],
+    [(10, 30), (11, 30)],
+    [(13, 30), (15, 0)],
+    [(21, 0), (23, 0)],
+]
+
+
+class FakeWindBackend(WindBackend):
+    """
+    确定性的 模拟 wind 接口. 相同的 (seed, code, field, time) 总是返回相同的数值, 与请求区间无关.
+
+    :param seed:
+    :param latency: 每次请求的 模拟延迟（秒）
+    :param nan_ratio: 行情数值为 nan 的比例
+    :param error_ratio: 请求返回错误的比例
+    :param error_code: 返回错误时的 ErrorCode
+    :param replay: 缓存请求结果, 相同的请求直接返回缓存（不再模拟延迟）, 用于只测量解析速度
+    """
+    ErrorCodeInvalidRequest = -40522003     # 非法请求, 如 wsd 多品种多指标
+
+    def __init__(
+            self,
+            seed: int = 0,
+            latency: float = 0,
+            nan_ratio: float = 0,
+            error_ratio: float = 0,
+            error_code: int = -40520007,
+            replay: bool = False,
+    ):
+        self.seed = seed
+        self.latency = latency
+        self.nan_ratio = nan_ratio
+        self.error_ratio = error_ratio
+        self.error_code = error_code
+        self.replay = replay
+        self._replay_data: Dict[tuple, FakeWindData] = dict()
+        self._rng = random.Random(seed)
+        # 请求计数
+        self.n_requests = 0
+
+    def start(self):
+        return FakeWindData()
+
+    def close(self):
+        return None
+
+    # 确定性的随机数, [0, 1)
+    def _uniform(self, *key) -> float:
+        return zlib.crc32('|'.join([str(self.seed)] + [str(_) for _ in key]).encode('utf-8')) / 2 ** 32
+
+    def _choice(self, l: list, *key):
+        return l[int(self._uniform(*key) * len(l))]
+
+    def _price(self, code, n: int) -> float:
+        """第 n 个 bar 的价格: 以 code 为种子, 每 50 个 bar 变动一次"""
+        _base = 1000 + self._uniform(code) * 9000
+        return round(_base * (1 + 0.1 * (self._uniform(code, 'walk', n // 50) - 0.5)), 1)
+
+    def _value(self, code, field, t: datetime, n: int):
+        field = field.lower()
+        if field in ['open', 'high', 'low', 'close', 'volume', 'amt', 'oi', 'oiamount']:
+            _u = self._uniform(code, field, n)
+            if self.nan_ratio and self._uniform(code, 'nan', n) < self.nan_ratio:
+                return float('nan')
+            _price = self._price(code, n)
+            if field == 'open':
+                return _price
+            if field == 'high':
+                return round(_price * (1 + _u * 0.01), 1)
+            if field == 'low':
+                return round(_price * (1 - _u * 0.01), 1)
+            if field == 'close':
+                return round(_price * (1 + (_u - 0.5) * 0.01), 1)
+            if field == 'volume':
+                return float(int(_u * 5000))
+            if field == 'amt':
+                return float(int(_u * 5000)) * _price * 10
+            if field == 'oi':
+                return float(10000 + int(_u * 490000))
+            if field == 'oiamount':
+                return float(10000 + int(_u * 490000)) * _price * 10
+        # 合约信息
+        _name, _exchange = (code.split('.') + [''])[:2]
+        if field == 'trade_hiscode':
+            return f'{_name}{t.strftime("%y")}{(t.month % 12) + 1:02d}.{_exchange}'
+        if field in ['transactionfee', 'todaypositionfee']:
+            if self._uniform(code, 'fee_type') < 0.5:
+                return f'{self._choice([1, 2, 3, 5], code, "fee")}元/手'
+            if field == 'transactionfee':
+                return f'{self._choice([0.5, 1, 1.5], code, "fee")}%%'
+            return '0'
+        if field == 'margin':
+            return float(self._choice([5, 8, 10, 12, 15], code, 'margin'))
+        if field == 'punit':
+            return '元/吨'
+        if field == 'mfprice':
+            return f'{self._choice([1, 2, 5, 10], code, "mfprice")}元/吨'
+        if field == 'contractmultiplier':
+            return float(self._choice([5, 10, 20, 100], code, 'cm'))
+        return None
+
+    def _before_request(self, key):
+        self.n_requests += 1
+        if self.replay and key in self._replay_data:
+            return self._replay_data[key]
+        if self.latency:
+            time.sleep(self.latency)
+        if self.error_ratio and self._rng.random() < self.error_ratio:
+            return FakeWindData(error_code=self.error_code, data=[['Fake Error']])
+        return None
+
+    def _after_request(self, key, data: FakeWindData) -> FakeWindData:
+        if self.replay:
+            self._replay_data[key] = data
+        return data
+
+    @staticmethod
+    def _gen_days(begin: datetime, end: datetime) -> List[date]:
+        _l = []
+        _d = begin.date()
+        while _d <= end.date():
+            if _d.weekday() < 5:
+                _l.append(_d)
+            _d += timedelta(days=1)
+        return _l
+
+    @staticmethod
+    def _gen_minutes(begin: datetime, end: datetime) -> List[datetime]:
+        _l = []
+        _d = begin.date()
+        while _d <= end.date():
+            if _d.weekday() < 5:
+                for (_sh, _sm), (_eh, _em) in FAKE_TRADING_SESSION:
+                    _t = datetime(_d.year, _d.month, _d.day, _sh, _sm)
+                    _e = datetime(_d.year, _d.month, _d.day, _eh, _em)
+                    while _t < _e:
+                        if begin <= _t <= end:
+                            _l.append(_t)
+                        _t += timedelta(minutes=1)
+            _d += timedelta(days=1)
+        return _l
+
+    def wsd(self, codes, fields, beginTime=None, endTime=None, options=None, **kwargs):
+        l_codes, l_fields = _split(codes), _split(fields)
+        _key = ('wsd', tuple(l_codes), tuple(l_fields), str(beginTime), str(endTime))
+        _rtn = self._before_request(_key)
+        if _rtn is not None:
+            return _rtn
+        if len(l_codes) > 1 and len(l_fields) > 1:
+            return FakeWindData(error_code=self.ErrorCodeInvalidRequest, data=[['Invalid request']])
+
+        _end = _to_datetime(endTime) if endTime else datetime.now()
+        _begin = _to_datetime(beginTime) if beginTime else _end
+        l_days = self._gen_days(_begin, _end)
+        l_times = [datetime.combine(_d, datetime.min.time()) for _d in l_days]
+        if len(l_codes) > 1:
+            data = [[self._value(_code, l_fields[0], _t, _t.toordinal()) for _t in l_times] for _code in l_codes]
+        else:
+            data = [[self._value(l_codes[0], _field, _t, _t.toordinal()) for _t in l_times] for _field in l_fields]
+        return self._after_request(_key, FakeWindData(
+            codes=l_codes, fields=[_.upper() for _ in l_fields], times=l_days, data=data))
+
+    def wsi(self, codes, fields, beginTime=None, endTime=None, options=None, **kwargs):
+        l_codes, l_fields = _split(codes), _split(fields)
+        _key = ('wsi', tuple(l_codes), tuple(l_fields), str(beginTime), str(endTime))
+        _rtn = self._before_request(_key)
+        if _rtn is not None:
+            return _rtn
+        if len(l_codes) > 1:
+            return FakeWindData(error_code=self.ErrorCodeInvalidRequest, data=[['Invalid request']])
+
+        _end = _to_datetime(endTime) if endTime else datetime.now()
+        _begin = _to_datetime(beginTime) if beginTime else _end - timedelta(days=1)
+        l_times = self._gen_minutes(_begin, _end)
+        _code = l_codes[0]
+        data = [
+            [self._value(_code, _field, _t, int(_t.timestamp()) // 60) for _t in l_times]
+            for _field in l_fields
+        ]
+        return self._after_request(_key, FakeWindData(
+            codes=l_codes, fields=[_.lower() for _ in l_fields], times=l_times, data=data))
+
+    def wss(self, codes, fields, options=None, **kwargs):
+        l_codes, l_fields = _split(codes), _split(fields)
+        _key = ('wss', tuple(l_codes), tuple(l_fields), str(options), str(sorted(kwargs.items())))
+        _rtn = self._before_request(_key)
+        if _rtn is not None:
+            return _rtn
+
+        # options: "tradeDate=20240102"
+        _trade_date = kwargs.get('tradeDate')
+        for _option in _split(str(options or '').replace(';', ',')):
+            if _option.lower().startswith('tradedate='):
+                _trade_date = _option.split('=')[1]
+        _t = _to_datetime(_trade_date) if _trade_date else datetime.combine(datetime.now().date(), datetime.min.time())
+        data = [[self._value(_code, _field, _t, _t.toordinal()) for _code in l_codes] for _field in l_fields]
+        return self._after_request(_key, FakeWindData(
+            codes=l_codes, fields=[_.upper() for _ in l_fields], times=[_t.date()], data=data))
+
+
+"""
+记录 / 回放
+"""
+
+
+class RecordingWindBackend(WindBackend):
+    """
+    包装另一个 backend, 记录每个请求的返回, 通过 save() 保存到文件, 再由 ReplayWindBackend 回放.
+    """
+
+    def __init__(self, backend: WindBackend):
+        self._backend = backend
+        self.records: Dict[tuple, FakeWindData] = dict()
+
+    def start(self):
+        return self._backend.start()
+
+    def close(self):
+        return self._backend.close()
+
+    def _record(self, key, data):
+        self.records[key] = FakeWindData.from_wind_data(data)
+        return data
+
+    def wsd(self, codes, fields, beginTime=None, endTime=None, options=None, **kwargs):
+        _key = ('wsd', str(codes), str(fields), str(beginTime), str(endTime), str(options), str(sorted(kwargs.items())))
+        return self._record(_key, self._backend.wsd(codes, fields, beginTime, endTime, options, **kwargs))
+
+    def wsi(self, codes, fields, beginTime=None, endTime=None, options=None, **kwargs):
+        _key = ('wsi', str(codes), str(fields), str(beginTime), str(endTime), str(options), str(sorted(kwargs.items())))
+        return self._record(_key, self._backend.wsi(codes, fields, beginTime, endTime, options, **kwargs))
+
+    def wss(self, codes, fields, options=None, **kwargs):
+        _key = ('wss', str(codes), str(fields), str(options), str(sorted(kwargs.items())))
+        return self._record(_key, self._backend.wss(codes, fields, options, **kwargs))
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            pickle.dump(self.records, f)
+
+
+class ReplayWindBackend(WindBackend):
+    """回放 RecordingWindBackend 保存的请求; 未记录的请求返回 ErrorCode 非0"""
+    ErrorCodeNotRecorded = -40520007        # 没有可用数据
+
+    def __init__(self, path, latency: float = 0):
+        with open(path, 'rb') as f:
+            self.records: Dict[tuple, FakeWindData] = pickle.load(f)
+        self.latency = latency
+
+    def start(self):
+        return FakeWindData()
+
+    def close(self):
+        return None
+
+    def _replay(self, key) -> FakeWindData:
+        if self.latency:
+            time.sleep(self.latency)
+        if key in self.records:
+            return self.records[key]
+        logger.warning(f'ReplayWindBackend, 没有记录此请求, {key}')
+        return FakeWindData(error_code=self.ErrorCodeNotRecorded, data=[['Not recorded']])
+
+    def wsd(self, codes, fields, beginTime=None, endTime=None, options=None, **kwargs):
+        return self._replay(
+            ('wsd', str(codes), str(fields), str(beginTime), str(endTime), str(options), str(sorted(kwargs.items()))))
+
+    def wsi(self, codes, fields, beginTime=None, endTime=None, options=None, **kwargs):
+        return self._replay(
+            ('wsi', str(codes), str(fields), str(beginTime), str(endTime), str(options), str(sorted(kwargs.items()))))
+
+    def wss(self, codes, fields, options=None, **kwargs):
+        return self._replay(('wss', str(codes), str(fields), str(options), str(sorted(kwargs.items()))))
@@ -0,0 +1,199 @@
+"""
+分钟数据 回补
+
+将每个 symbol 的 [start_date, end_date] 按交易日切分为多个 chunk,
+由有限大小的线程池并发请求 w.wsi, 失败的 chunk 单独重试,
+每个 chunk 完成后立即通过 output_wind_minute_bar_data 写出, 不在内存中累积全部数据.
+
+chunk 的时间区间:
+    WindMinuteBarData.datatime = wsi 的 Times + 1分钟, 输出文件按 datatime 的日期分组,
+    所以 chunk [d1, d2] 请求的 Times 区间为 [d1 - 1天 23:59:00, d2 23:58:59],
+    保证每个日期文件的数据完整地来自同一个 chunk, 不会被相邻 chunk 覆盖.
+    相邻 chunk 首尾相接, 交易日之间的非交易日(如周六凌晨的夜盘) 归入前一个 chunk.
+"""
+
+import time
+import logging
+from datetime import datetime, date, timedelta
+from typing import List, Dict, Tuple
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+
+from agpwind.method import (
+    get_wind_minute_bar_columns, output_wind_minute_bar_data, _inner_symbol_to_wind, _wind_symbol_name_to_inner,
+    WindDataError)
+from agpwind.retry import classify_error_code, WindErrorType
+from agpwind.columns import WindBarColumns
+from agpwind.incremental import gen_trading_days, exchange_holidays
+from pyptools.common.trading_calendar import TradingCalendar, ExchangeTradingCalendars
+
+logger = logging.getLogger('apgwind')
+
+
+def gen_trading_day_chunks(
+        start_date: date, end_date: date, holidays: List[date] or TradingCalendar or None = None,
+        chunk_days: int = 5,
+) -> List[Tuple[date, date]]:
+    """
+    将 [start_date, end_date] 切分为 每段 chunk_days 个交易日 的区间,
+    相邻区间首尾相接（非交易日归入前一个区间）, 不包含交易日的区间会被剔除.
+    交易日: 非周末, 且不在 holidays 中
+    """
+    assert chunk_days >= 1
+    l_trading_days = gen_trading_days(start_date, end_date, holidays)
+    if not l_trading_days:
+        return []
+
+    # 每个 chunk 的第一个交易日
+    l_chunk_first_days = l_trading_days[::chunk_days]
+    l_chunks = []
+    for n, _first_day in enumerate(l_chunk_first_days):
+        _chunk_start = start_date if n == 0 else _first_day
+        if n + 1 < len(l_chunk_first_days):
+            _chunk_end = l_chunk_first_days[n + 1] - timedelta(days=1)
+        else:
+            _chunk_end = end_date
+        l_chunks.append((_chunk_start, _chunk_end))
+    return l_chunks
+
+
+def _chunk_to_wsi_range(start_date: date, end_date: date) -> Tuple[datetime, datetime]:
+    """chunk 日期区间 -> w.wsi 的 beginTime, endTime; 见模块说明"""
+    _begin = datetime.combine(start_date, datetime.min.time()) - timedelta(minutes=1)
+    _end = datetime.combine(end_date, datetime.min.time()) + timedelta(days=1, minutes=-1, seconds=-1)
+    return _begin, _end
+
+
+@dataclass
+class MinuteBarBackfillStats:
+    """回补过程的 吞吐量 计数"""
+    chunks_total: int = 0
+    chunks_done: int = 0
+    chunks_failed: int = 0
+    chunks_retried: int = 0
+    chunks_in_flight: int = 0
+    bars: int = 0
+    started_at: float = field(default_factory=time.time)
+
+    @property
+    def elapsed(self) -> float:
+        return time.time() - self.started_at
+
+    @property
+    def bars_per_second(self) -> float:
+        if self.elapsed <= 0:
+            return 0
+        return self.bars / self.elapsed
+
+    def __str__(self):
+        return (f'chunks {self.chunks_done}/{self.chunks_total}, in flight {self.chunks_in_flight}, '
+                f'failed {self.chunks_failed}, retried {self.chunks_retried}, '
+                f'bars {self.bars}, {self.bars_per_second:.1f} bars/s, elapsed {self.elapsed:.1f}s')
+
+
+@dataclass
+class _MinuteBarChunk:
+    symbol: str         # inner symbol
+    start_date: date
+    end_date: date
+    n_try: int = 0
+
+
+class MinuteBarBackfill:
+    """
+    分钟数据回补引擎
+
+        backfill = MinuteBarBackfill(output_root, holidays=..., chunk_days=5, max_workers=4)
+        backfill.run([[symbol, start, end], ])
+        backfill.stats
+
+    :param holidays: {exchange: [date, ]}, 如 HolidayManager.holiday_by_exchange,
+        或 HolidayManager.trading_calendars(); 找不到 exchange 时使用 SHFE
+    :param chunk_days: 每个 chunk 包含的交易日数量
+    :param max_workers: 线程池大小. WindPy 为阻塞调用, 不宜过大
+    :param max_retry: 单个 chunk 的最大重试次数
+    """
+
+    def __init__(
+            self,
+            output_root: str,
+            holidays: Dict[str, List[date]] or ExchangeTradingCalendars or None = None,
+            chunk_days: int = 5,
+            max_workers: int = 4,
+            max_retry: int = 3,
+    ):
+        self.output_root = output_root
+        self.holidays: Dict[str, List[date]] or ExchangeTradingCalendars = holidays or {}
+        self.chunk_days = chunk_days
+        self.max_workers = max_workers
+        self.max_retry = max_retry
+        self.stats = MinuteBarBackfillStats()
+        # 最终失败的 chunk
+        self.failed_chunks: List[_MinuteBarChunk] = []
+
+    def gen_chunks(self, symbols_start_end: List[list]) -> List[_MinuteBarChunk]:
+        l_chunks = []
+        for _symbol, _start, _end in symbols_start_end:
+            _symbol = _wind_symbol_name_to_inner(_symbol)
+            for _chunk_start, _chunk_end in gen_trading_day_chunks(
+                    _start, _end, exchange_holidays(self.holidays, _symbol), self.chunk_days):
+                l_chunks.append(_MinuteBarChunk(symbol=_symbol, start_date=_chunk_start, end_date=_chunk_end))
+        return l_chunks
+
+    @staticmethod
+    def _fetch_chunk(chunk: _MinuteBarChunk) -> WindBarColumns:
+        _begin, _end = _chunk_to_wsi_range(chunk.start_date, chunk.end_date)
+        return get_wind_minute_bar_columns(
+            symbol=_inner_symbol_to_wind(chunk.symbol), start_date=_begin, end_date=_end, raise_error=True)
+
+    def run(self, symbols_start_end: List[list]) -> MinuteBarBackfillStats:
+        """
+        :param symbols_start_end: [[symbol, start_date, end_date], ]
+        """
+        l_pending: List[_MinuteBarChunk] = self.gen_chunks(symbols_start_end)
+        l_pending.reverse()     # 使用 pop() 按顺序取出
+        self.stats = MinuteBarBackfillStats(chunks_total=len(l_pending))
+        self.failed_chunks = []
+        logger.info(f'MinuteBarBackfill, {len(symbols_start_end)} symbols, {len(l_pending)} chunks')
+
+        d_in_flight: Dict[Future, _MinuteBarChunk] = dict()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while l_pending or d_in_flight:
+                # 提交, 同时在途的 chunk 不超过 max_workers 个, 以限制内存占用
+                while l_pending and len(d_in_flight) < self.max_workers:
+                    _chunk = l_pending.pop()
+                    _chunk.n_try += 1
+                    d_in_flight[executor.submit(self._fetch_chunk, _chunk)] = _chunk
+                self.stats.chunks_in_flight = len(d_in_flight)
+
+                _done, _ = wait(list(d_in_flight.keys()), return_when=FIRST_COMPLETED)
+                for _future in _done:
+                    _chunk = d_in_flight.pop(_future)
+                    try:
+                        l_data: WindBarColumns = _future.result()
+                    except Exception as e:
+                        logger.error(f'MinuteBarBackfill, chunk 失败, {_chunk.symbol}, '
+                                     f'{str(_chunk.start_date)}, {str(_chunk.end_date)}, try {_chunk.n_try}, {e}')
+                        # 非暂时性错误（额度/代码错误），重试无意义
+                        _is_retryable = not (
+                            isinstance(e, WindDataError)
+                            and classify_error_code(e.error_code) != WindErrorType.Transient
+                        )
+                        if _is_retryable and _chunk.n_try <= self.max_retry:
+                            self.stats.chunks_retried += 1
+                            l_pending.append(_chunk)
+                        else:
+                            self.stats.chunks_failed += 1
+                            self.failed_chunks.append(_chunk)
+                        continue
+                    # 写出
+                    output_wind_minute_bar_data(data=l_data, output_root=self.output_root)
+                    self.stats.chunks_done += 1
+                    self.stats.bars += len(l_data)
+                self.stats.chunks_in_flight = len(d_in_flight)
+                logger.info(f'MinuteBarBackfill, {str(self.stats)}')
+
+        for _chunk in self.failed_chunks:
+            logger.error(f'MinuteBarBackfill, 最终失败, {_chunk.symbol}, '
+                         f'{str(_chunk.start_date)}, {str(_chunk.end_date)}')
+        return self.stats
@@ -0,0 +1,231 @@
+"""
+wind 请求的 本地磁盘缓存
+
+以 (function, codes, fields, begin, end, options) 的 hash 作为文件名, 缓存 wind 的返回数据.
+    结束日期早于今天的请求（已经完结的历史数据）永久缓存；
+    包含今天（或没有明确日期）的请求, 缓存 ttl 秒.
+缓存总大小超过 max_bytes 时, 按最近使用时间（LRU）删除.
+只缓存 ErrorCode == 0 的返回.
+
+CachedWindBackend 包装任意 WindBackend, 对 get_wind_* 透明:
+
+    from agpwind.cache import enable_cache
+    cache = enable_cache('./Cache/Wind')
+    ...
+    logger.info(cache.stats)
+"""
+
+import os
+import time
+import pickle
+import hashlib
+import logging
+import threading
+from datetime import datetime, date
+from dataclasses import dataclass
+from typing import Dict
+
+from agpwind.backend import WindBackend, FakeWindData, get_backend, set_backend, _to_datetime, _split
+
+logger = logging.getLogger('apgwind')
+
+
+@dataclass
+class WindCacheStats:
+    hits: int = 0
+    misses: int = 0
+    expired: int = 0
+    stores: int = 0
+    evictions: int = 0
+    bytes: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        _n = self.hits + self.misses
+        return self.hits / _n if _n else 0
+
+    def __str__(self):
+        return (f'hits {self.hits}, misses {self.misses}, expired {self.expired}, hit ratio {self.hit_ratio:.1%}, '
+                f'stores {self.stores}, evictions {self.evictions}, size {self.bytes / 1024 / 1024:.1f}MB')
+
+
+class WindResponseCache:
+    """
+    :param root: 缓存目录
+    :param max_bytes: 缓存总大小上限
+    :param ttl: 包含今天的请求 的缓存时间（秒）
+    """
+    FileSuffix = '.pkl'
+
+    def __init__(self, root, max_bytes: int = 2 * 1024 ** 3, ttl: float = 3600):
+        self.root = os.path.abspath(root)
+        if not os.path.isdir(self.root):
+            os.makedirs(self.root)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stats = WindCacheStats()
+        self._lock = threading.Lock()
+        # {file_name: [size, last_access]}, 按 mtime 记录 最近使用时间
+        self._index: Dict[str, list] = dict()
+        for _name in os.listdir(self.root):
+            if not _name.endswith(self.FileSuffix):
+                continue
+            _stat = os.stat(os.path.join(self.root, _name))
+            self._index[_name] = [_stat.st_size, _stat.st_mtime]
+        self.stats.bytes = sum([_[0] for _ in self._index.values()])
+
+    @staticmethod
+    def gen_key(function, codes, fields, begin=None, end=None, options=None, **kwargs) -> str:
+        _s = '|'.join([
+            str(function),
+            ','.join(_split(codes)),
+            ','.join([_.lower() for _ in _split(fields)]),
+            str(begin), str(end), str(options),
+            str(sorted(kwargs.items()))
+        ])
+        return hashlib.sha1(_s.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> FakeWindData or None:
+        """文件读取 不持有锁, 只在 查询/更新 索引 和 统计 时加锁"""
+        _name = key + self.FileSuffix
+        _path = os.path.join(self.root, _name)
+        with self._lock:
+            if _name not in self._index:
+                self.stats.misses += 1
+                return None
+        try:
+            with open(_path, 'rb') as f:
+                _expires_at, data = pickle.load(f)
+        except FileNotFoundError:
+            # 已被其他线程 删除 / 淘汰
+            with self._lock:
+                self.stats.misses += 1
+            return None
+        except Exception as e:
+            logger.warning(f'WindResponseCache, 读取缓存失败, {_path}, {e}')
+            with self._lock:
+                if _name in self._index:
+                    self._remove(_name)
+                self.stats.misses += 1
+            return None
+        if _expires_at is not None and _expires_at < time.time():
+            with self._lock:
+                if _name in self._index:
+                    self._remove(_name)
+                self.stats.expired += 1
+                self.stats.misses += 1
+            return None
+        # 更新 最近使用时间
+        _now = time.time()
+        try:
+            os.utime(_path, (_now, _now))
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            if _name in self._index:
+                self._index[_name][1] = _now
+            self.stats.hits += 1
+        return data
+
+    def put(self, key: str, data, permanent: bool):
+        """文件写入 不持有锁; 先写临时文件 再替换, 避免并发/中断 留下不完整的缓存文件"""
+        _name = key + self.FileSuffix
+        _path = os.path.join(self.root, _name)
+        _expires_at = None if permanent else time.time() + self.ttl
+        _bytes = pickle.dumps((_expires_at, FakeWindData.from_wind_data(data)))
+        _tmp = _path + f'.{threading.get_ident()}.tmp'
+        with open(_tmp, 'wb') as f:
+            f.write(_bytes)
+        os.replace(_tmp, _path)
+        with self._lock:
+            if _name in self._index:
+                # 文件已被替换, 只更新 索引 和 大小
+                self.stats.bytes -= self._index[_name][0]
+            self._index[_name] = [len(_bytes), time.time()]
+            self.stats.bytes += len(_bytes)
+            self.stats.stores += 1
+            self._evict()
+
+    def _remove(self, name):
+        _size, _ = self._index.pop(name)
+        self.stats.bytes -= _size
+        try:
+            os.remove(os.path.join(self.root, name))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        if self.stats.bytes <= self.max_bytes:
+            return
+        for _name, _ in sorted(self._index.items(), key=lambda x: x[1][1]):
+            if self.stats.bytes <= self.max_bytes:
+                break
+            self._remove(_name)
+            self.stats.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            for _name in list(self._index.keys()):
+                self._remove(_name)
+
+
+def _is_closed_range(end) -> bool:
+    """结束日期 早于今天, 数据不会再变化"""
+    if end is None or end == '':
+        return False
+    try:
+        _end: date = _to_datetime(end).date()
+    except ValueError:
+        return False
+    return _end < datetime.now().date()
+
+
+class CachedWindBackend(WindBackend):
+    def __init__(self, backend: WindBackend, cache: WindResponseCache):
+        self._backend = backend
+        self.cache = cache
+
+    def start(self):
+        return self._backend.start()
+
+    def close(self):
+        return self._backend.close()
+
+    def _request(self, key, permanent, func, *args, **kwargs):
+        data = self.cache.get(key)
+        if data is not None:
+            return data
+        data = func(*args, **kwargs)
+        if data.ErrorCode == 0:
+            self.cache.put(key, data, permanent=permanent)
+        return data
+
+    def wsd(self, codes, fields, beginTime=None, endTime=None, options=None, **kwargs):
+        _key = self.cache.gen_key('wsd', codes, fields, beginTime, endTime, options, **kwargs)
+        return self._request(
+            _key, _is_closed_range(endTime),
+            self._backend.wsd, codes, fields, beginTime, endTime, options, **kwargs)
+
+    def wsi(self, codes, fields, beginTime=None, endTime=None, options=None, **kwargs):
+        _key = self.cache.gen_key('wsi', codes, fields, beginTime, endTime, options, **kwargs)
+        return self._request(
+            _key, _is_closed_range(endTime),
+            self._backend.wsi, codes, fields, beginTime, endTime, options, **kwargs)
+
+    def wss(self, codes, fields, options=None, **kwargs):
+        # 截面数据, 日期在 options 的 tradeDate 中
+        _trade_date = kwargs.get('tradeDate')
+        for _option in _split(str(options or '').replace(';', ',')):
+            if _option.lower().startswith('tradedate='):
+                _trade_date = _option.split('=')[1]
+        _key = self.cache.gen_key('wss', codes, fields, None, _trade_date, options, **kwargs)
+        return self._request(
+            _key, _is_closed_range(_trade_date),
+            self._backend.wss, codes, fields, options, **kwargs)
+
+
+def enable_cache(root, max_bytes: int = 2 * 1024 ** 3, ttl: float = 3600) -> WindResponseCache:
+    """在当前 backend 外包装 CachedWindBackend, 返回 cache, 可用 cache.stats 查看命中情况"""
+    cache = WindResponseCache(root, max_bytes=max_bytes, ttl=ttl)
+    set_backend(CachedWindBackend(get_backend(), cache))
+    return cache
@@ -0,0 +1,224 @@
+"""
+列式 bar 数据
+
+WindBarColumns 直接由 wind 返回的 Data 列表构建, 每个字段为一个 NumPy 数组,
+类型转换 和 NaN 过滤 都是向量化的, 不再逐行构造 WindMinuteBarData.
+
+WindMinuteBarList 是 WindBarColumns 之上的 只读视图, 兼容原来的 List[WindMinuteBarData],
+只有在访问某一行时 才构造对应的 WindMinuteBarData.
+
+    columns = get_wind_minute_bar_columns(symbol, start, end)
+    columns.close.mean()
+    l_data = WindMinuteBarList(columns)
+    l_data[0].datatime
+"""
+
+import os
+import logging
+from datetime import datetime, timedelta
+from collections.abc import Sequence
+from typing import List, Dict, Tuple
+
+import numpy as np
+
+from agpwind.object import WindMinuteBarData
+
+logger = logging.getLogger('apgwind')
+
+
+# WindMinuteBarData 的 数值字段, 与 wsi 请求的字段 顺序一致
+MINUTE_BAR_FLOAT_FIELDS = ['open', 'high', 'low', 'close', 'volume', 'open_interest']
+
+
+def _to_float_array(values) -> np.ndarray:
+    """wind 的 Data 列 -> float64 数组; None 为 nan; 无法转换的值 为 nan, 并记录错误"""
+    try:
+        return np.asarray(values, dtype=np.float64)
+    except (ValueError, TypeError):
+        pass
+    _arr = np.empty(len(values), dtype=np.float64)
+    for n, _v in enumerate(values):
+        try:
+            _arr[n] = np.nan if _v is None else float(_v)
+        except (ValueError, TypeError) as e:
+            logger.error('解析 wind_data 失败')
+            logger.error(e)
+            _arr[n] = np.nan
+    return _arr
+
+
+def _to_datetime_array(values) -> np.ndarray:
+    return np.asarray(values, dtype='datetime64[us]')
+
+
+class WindBarColumns:
+    """
+    :param ticker: 每一行的 ticker, object 数组
+    :param datatime: datetime64[us] 数组
+    :param columns: {field: float64 数组}
+    """
+
+    def __init__(self, ticker: np.ndarray, datatime: np.ndarray, columns: Dict[str, np.ndarray]):
+        self.ticker = ticker
+        self.datatime = datatime
+        self.columns = columns
+        for _field, _arr in columns.items():
+            assert len(_arr) == len(datatime), f'{_field}, {len(_arr)} != {len(datatime)}'
+
+    def __len__(self):
+        return len(self.datatime)
+
+    def __getattr__(self, item) -> np.ndarray:
+        # 数值字段 可以直接作为属性访问, 如 columns.close
+        try:
+            return self.__dict__['columns'][item]
+        except KeyError:
+            raise AttributeError(item)
+
+    def __repr__(self):
+        return f'<WindBarColumns(rows={len(self)}, fields={list(self.columns.keys())})>'
+
+    @classmethod
+    def empty(cls, fields: List[str] = None) -> 'WindBarColumns':
+        return cls(
+            ticker=np.empty(0, dtype=object),
+            datatime=np.empty(0, dtype='datetime64[us]'),
+            columns={_: np.empty(0, dtype=np.float64) for _ in (fields or MINUTE_BAR_FLOAT_FIELDS)},
+        )
+
+    @classmethod
+    def from_wind_data(
+            cls, wind_data, ticker: str, fields: List[str], time_offset: timedelta = timedelta(0),
+    ) -> 'WindBarColumns':
+        """
+        单品种多指标 的 wind 返回数据, Data[i] 对应 fields[i]
+        :param ticker: inner ticker
+        :param time_offset: 加到 Times 上的偏移, 如 wsi 的 +1分钟
+        """
+        assert len(wind_data.Data) == len(fields), f'{len(wind_data.Data)} != {len(fields)}'
+        _datatime = _to_datetime_array(wind_data.Times)
+        if time_offset:
+            _datatime = _datatime + np.timedelta64(time_offset)
+        return cls(
+            ticker=np.full(len(_datatime), ticker, dtype=object),
+            datatime=_datatime,
+            columns={_field: _to_float_array(_values) for _field, _values in zip(fields, wind_data.Data)},
+        )
+
+    @classmethod
+    def concat(cls, l_columns: List['WindBarColumns']) -> 'WindBarColumns':
+        l_columns = [_ for _ in l_columns if len(_)]
+        if not l_columns:
+            return cls.empty()
+        if len(l_columns) == 1:
+            return l_columns[0]
+        _fields = list(l_columns[0].columns.keys())
+        return cls(
+            ticker=np.concatenate([_.ticker for _ in l_columns]),
+            datatime=np.concatenate([_.datatime for _ in l_columns]),
+            columns={_f: np.concatenate([_.columns[_f] for _ in l_columns]) for _f in _fields},
+        )
+
+    def take(self, index: np.ndarray) -> 'WindBarColumns':
+        """index: bool mask 或 位置数组"""
+        return WindBarColumns(
+            ticker=self.ticker[index],
+            datatime=self.datatime[index],
+            columns={_f: _arr[index] for _f, _arr in self.columns.items()},
+        )
+
+    def dropna(self, fields: List[str] = None) -> 'WindBarColumns':
+        """剔除 fields 中任一字段为 nan 的行"""
+        if not len(self):
+            return self
+        _mask = np.zeros(len(self), dtype=bool)
+        for _f in (fields or list(self.columns.keys())):
+            _mask |= np.isnan(self.columns[_f])
+        if not _mask.any():
+            return self
+        return self.take(~_mask)
+
+    def group_by_date(self) -> Dict[Tuple[str, str], 'WindBarColumns']:
+        """按 (ticker, datatime 的日期 YYYYMMDD) 分组"""
+        d_groups = dict()
+        if not len(self):
+            return d_groups
+        _days = self.datatime.astype('datetime64[D]')
+        for _ticker in np.unique(self.ticker):
+            _ticker_index = np.flatnonzero(self.ticker == _ticker)
+            _ticker_days = _days[_ticker_index]
+            _unique_days, _inverse = np.unique(_ticker_days, return_inverse=True)
+            for n, _day in enumerate(_unique_days):
+                _s_date = str(_day).replace('-', '')
+                d_groups[(str(_ticker), _s_date)] = self.take(_ticker_index[_inverse == n])
+        return d_groups
+
+    def to_minute_bar_lines(self) -> List[str]:
+        """与 WindMinuteBarData.__str__ 相同的格式: time,open,high,low,close,volume,last,open_interest"""
+        _times = [_[11:19] for _ in np.datetime_as_string(self.datatime, unit='s')]
+        _close = self.columns['close'].tolist()
+        return [
+            ','.join([str(_) for _ in _row])
+            for _row in zip(
+                _times,
+                self.columns['open'].tolist(),
+                self.columns['high'].tolist(),
+                self.columns['low'].tolist(),
+                _close,
+                self.columns['volume'].tolist(),
+                _close,
+                self.columns['open_interest'].tolist(),
+            )
+        ]
+
+    def to_minute_bar_file(self, path):
+        """与 WindMinuteBarFile.to_file 输出相同"""
+        output_root = os.path.dirname(path)
+        if output_root and not os.path.isdir(output_root):
+            os.makedirs(output_root)
+        with open(path, 'w') as f:
+            f.writelines('\n'.join(self.to_minute_bar_lines()))
+
+
+class WindMinuteBarList(Sequence):
+    """WindBarColumns 的 List[WindMinuteBarData] 视图, 按需构造 WindMinuteBarData"""
+
+    def __init__(self, columns: WindBarColumns):
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.columns)
+
+    def _row(self, n: int) -> WindMinuteBarData:
+        _c = self.columns.columns
+        return WindMinuteBarData(
+            ticker=self.columns.ticker[n],
+            datatime=self.columns.datatime[n].astype(datetime),
+            open=_c['open'][n],
+            high=_c['high'][n],
+            low=_c['low'][n],
+            close=_c['close'][n],
+            volume=_c['volume'][n],
+            open_interest=_c['open_interest'][n],
+        )
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return WindMinuteBarList(self.columns.take(np.arange(len(self))[item]))
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError(item)
+        return self._row(item)
+
+    def __iter__(self):
+        for n in range(len(self)):
+            yield self._row(n)
+
+    def __add__(self, other):
+        if isinstance(other, WindMinuteBarList):
+            return WindMinuteBarList(WindBarColumns.concat([self.columns, other.columns]))
+        return list(self) + list(other)
+
+    def __repr__(self):
+        return f'<WindMinuteBarList(rows={len(self)})>'
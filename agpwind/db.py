@@ -1,23 +1,37 @@
 from urllib import parse
 from datetime import datetime, date
+from dataclasses import dataclass, field
+from typing import List, Dict, Tuple, Iterator
+import time
 import logging
 
 logger = logging.getLogger('apgwind')
 
 from .object import WindGeneralTickerInfoData
+from pyptools.common.db import build_dsn, get_engine, EnginePoolSettings
 
 from sqlalchemy import Column, String, Integer, Date, Float, ForeignKey, DateTime
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, select, and_, or_, bindparam, text, table, column
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.engine import Engine, Connection
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker, Session
 
 
-def creating_engine(host: str, user: str, pwd: str, database: str):
-    return create_engine(f'mssql+pymssql://{user}:{pwd}@{host}/{database}', echo=False)
+def creating_engine(
+        host: str, user: str, pwd: str, database: str, dialect: str or None = None,
+        pool_settings: EnginePoolSettings or None = None,
+) -> Engine:
+    """
+    进程内共享的 engine, 相同的连接信息 复用同一个连接池, 见 pyptools.common.db
+    :param dialect: 默认 mssql+pymssql; 'sqlite' 时 database 为文件路径
+    :param pool_settings: None 时 使用 pyptools.common.db 的默认参数
+    """
+    return get_engine(build_dsn(host=host, user=user, pwd=pwd, database=database, dialect=dialect), pool_settings)
 
 
-def creating_db_session(host: str, user: str, pwd: str, database: str) -> Session:
-    engine = creating_engine(host=host, user=user, pwd=pwd, database=database)
+def creating_db_session(host: str, user: str, pwd: str, database: str, dialect: str or None = None) -> Session:
+    engine = creating_engine(host=host, user=user, pwd=pwd, database=database, dialect=dialect)
     DBSession = sessionmaker(bind=engine)
     session = DBSession()
     return session
@@ -86,6 +100,73 @@ class WindGeneralTickerInfo(Base):  # 定义一个类，继承Base
         return WindGeneralTickerInfoData(**self.to_dict())
 
 
+class WindGeneralTickerInfoQuery:
+    """
+    WindGeneralTickerInfo 的 时点查询; DISTINCT / TOP / ORDER BY 及 比较 都在数据库中完成,
+    查询量 只与 品种数量 有关, 与 表中的历史数据量 无关.
+
+        query = WindGeneralTickerInfoQuery(engine)
+        newest_date, second_date = query.latest_dates(2)
+        query.snapshot(newest_date)
+        query.changes_between(second_date, newest_date)
+    """
+    # changes_between 默认比较的字段（不比较 ticker, 主力合约 会正常切换）
+    ValueFields = [
+        'point_value', 'min_move', 'commission_on_rate', 'commission_per_share', 'flat_today_discount', 'margin']
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+
+    def latest_dates(self, n: int = 1) -> List[date]:
+        """最新的 n 个日期, 从新到旧"""
+        _c = WindGeneralTickerInfo.__table__.c
+        with self.engine.connect() as conn:
+            return [_[0] for _ in conn.execute(
+                select(_c.date).distinct().order_by(_c.date.desc()).limit(n))]
+
+    def snapshot(self, _date: date) -> List[WindGeneralTickerInfoData]:
+        _c = WindGeneralTickerInfo.__table__.c
+        with self.engine.connect() as conn:
+            return [
+                WindGeneralTickerInfoData(**_row._mapping)
+                for _row in conn.execute(select(WindGeneralTickerInfo.__table__).where(_c.date == _date))
+            ]
+
+    def changes_between(
+            self, date_1: date, date_2: date, fields: List[str] or None = None,
+    ) -> List[Tuple[WindGeneralTickerInfoData or None, WindGeneralTickerInfoData or None]]:
+        """
+        date_1 与 date_2 之间 有变化的品种, [(date_1 的数据, date_2 的数据), ]
+        只在一天存在的品种, 另一天为 None
+        :param fields: 比较的字段, 默认 ValueFields
+        """
+        fields = fields or self.ValueFields
+        _t = WindGeneralTickerInfo.__table__
+        _columns = [_.name for _ in _t.columns]
+        _1 = select(_t).where(_t.c.date == date_1).subquery('d1')
+        _2 = select(_t).where(_t.c.date == date_2).subquery('d2')
+        _stmt = select(
+            *[_1.c[_].label(f'd1_{_}') for _ in _columns],
+            *[_2.c[_].label(f'd2_{_}') for _ in _columns],
+        ).select_from(
+            _1.outerjoin(_2, _1.c.product == _2.c.product, full=True)
+        ).where(or_(
+            _1.c.product.is_(None),
+            _2.c.product.is_(None),
+            *[_1.c[_].is_distinct_from(_2.c[_]) for _ in fields]
+        ))
+        l_changes = []
+        with self.engine.connect() as conn:
+            for _row in conn.execute(_stmt):
+                _d = _row._mapping
+                l_changes.append(tuple(
+                    WindGeneralTickerInfoData(**{_: _d[f'{_prefix}_{_}'] for _ in _columns})
+                    if _d[f'{_prefix}_product'] is not None else None
+                    for _prefix in ['d1', 'd2']
+                ))
+        return l_changes
+
+
 class WindNetValues(Base):
     __tablename__ = 'WindNetValues'
 
@@ -114,3 +195,288 @@ class WindNetValues(Base):
             "NetValue": self.NetValue
         }
 
+
+
+def iter_wind_net_values_by_fund(
+        session: Session, start_date: str or None = None, yield_per: int = 10000,
+) -> Iterator[Tuple[str, List[Tuple[str, float]]]]:
+    """
+    按 (Fund, Date) 排序 由数据库分批返回（yield_per）, 每个 Fund 的数据读完后 立即 yield,
+    内存中 只保留一个 Fund 的数据.
+    :return: (fund, [(date, net_value), ])
+    """
+    _query = session.query(WindNetValues.Fund, WindNetValues.Date, WindNetValues.NetValue)
+    if start_date:
+        _query = _query.filter(WindNetValues.Date >= start_date)
+    _query = _query.order_by(WindNetValues.Fund, WindNetValues.Date).yield_per(yield_per)
+
+    _fund = None
+    _l_data = []
+    for _row_fund, _row_date, _row_nv in _query:
+        if _row_fund != _fund:
+            if _l_data:
+                yield _fund, _l_data
+            _fund = _row_fund
+            _l_data = []
+        _l_data.append((_row_date, _row_nv))
+    if _l_data:
+        yield _fund, _l_data
+
+
+"""
+批量写入
+"""
+
+
+@dataclass
+class BulkUpsertResult:
+    inserted: int = 0
+    updated: int = 0
+    elapsed: float = 0
+    # [(action, key), ], action: 'INSERT' / 'UPDATE'; key: 主键值的 tuple
+    changes: List[Tuple[str, tuple]] = field(default_factory=list)
+
+    def __str__(self):
+        return f'inserted {self.inserted}, updated {self.updated}, elapsed {self.elapsed:.2f}s'
+
+
+def _batches(l: list, batch_size: int):
+    for n in range(0, len(l), batch_size):
+        yield l[n: n + batch_size]
+
+
+def _merge_mssql(conn: Connection, db_table, rows: List[dict], key_columns: List[str], batch_size: int) -> list:
+    """写入临时表, 再由一次 MERGE 更新/插入; 返回 [(action, key), ]"""
+    _columns = [_.name for _ in db_table.columns]
+    _stage_name = f'#{db_table.name}_stage'
+    conn.execute(text(f'SELECT TOP 0 * INTO [{_stage_name}] FROM [{db_table.name}]'))
+    _stage = table(_stage_name, *[column(_) for _ in _columns])
+    for _rows in _batches(rows, batch_size):
+        conn.execute(_stage.insert(), _rows)
+    _on = ' AND '.join([f't.[{_}] = s.[{_}]' for _ in key_columns])
+    _update = ', '.join([f't.[{_}] = s.[{_}]' for _ in _columns if _ not in key_columns])
+    _insert_columns = ', '.join([f'[{_}]' for _ in _columns])
+    _insert_values = ', '.join([f's.[{_}]' for _ in _columns])
+    _output = ', '.join([f'inserted.[{_}]' for _ in key_columns])
+    _result = conn.execute(text(
+        f'MERGE [{db_table.name}] WITH (HOLDLOCK) AS t '
+        f'USING [{_stage_name}] AS s ON {_on} '
+        + (f'WHEN MATCHED THEN UPDATE SET {_update} ' if _update else '')
+        + f'WHEN NOT MATCHED THEN INSERT ({_insert_columns}) VALUES ({_insert_values}) '
+        f'OUTPUT $action, {_output};'
+    ))
+    l_changes = [(str(_row[0]), tuple(_row[1:])) for _row in _result]
+    conn.execute(text(f'DROP TABLE [{_stage_name}]'))
+    return l_changes
+
+
+def _upsert_generic(conn: Connection, db_table, rows: List[dict], key_columns: List[str], batch_size: int) -> list:
+    """
+    不支持 MERGE 的数据库: 按批 查询已存在的主键, 再批量 update + 批量 insert; 返回 [(action, key), ]
+    """
+    _c = db_table.c
+    _existing = set()
+    _keys = set([tuple(_[_k] for _k in key_columns) for _ in rows])
+    for _rows in _batches(rows, batch_size):
+        # 每个主键字段 IN (...), 结果为超集, 再按完整主键过滤
+        _where = and_(*[_c[_k].in_(set([_[_k] for _ in _rows])) for _k in key_columns])
+        for _row in conn.execute(select(*[_c[_k] for _k in key_columns]).where(_where)):
+            if tuple(_row) in _keys:
+                _existing.add(tuple(_row))
+
+    l_update, l_insert, l_changes = [], [], []
+    for _row in rows:
+        _key = tuple(_row[_k] for _k in key_columns)
+        if _key in _existing:
+            l_update.append(_row)
+            l_changes.append(('UPDATE', _key))
+        else:
+            l_insert.append(_row)
+            l_changes.append(('INSERT', _key))
+
+    _value_columns = [_.name for _ in db_table.columns if _.name not in key_columns]
+    if l_update and _value_columns:
+        _stmt = db_table.update().where(
+            and_(*[_c[_k] == bindparam(f'_key_{_k}') for _k in key_columns])
+        ).values({_v: bindparam(f'_value_{_v}') for _v in _value_columns})
+        for _rows in _batches(l_update, batch_size):
+            conn.execute(_stmt, [
+                {**{f'_key_{_k}': _[_k] for _k in key_columns}, **{f'_value_{_v}': _[_v] for _v in _value_columns}}
+                for _ in _rows
+            ])
+    for _rows in _batches(l_insert, batch_size):
+        conn.execute(db_table.insert(), _rows)
+    return l_changes
+
+
+def bulk_upsert(
+        engine: Engine, db_table, rows: List[dict], key_columns: List[str] or None = None, batch_size: int = 1000,
+) -> BulkUpsertResult:
+    """
+    批量写入 rows, 每个阶段在一个事务内完成:
+        1. 批量 insert（executemany）;
+        2. 主键冲突时, 回滚, 改为 set-based upsert:
+            mssql: 写入临时表, 一次 MERGE;
+            其他: 批量查询已存在的主键, 批量 update + 批量 insert.
+    :param db_table: sqlalchemy Table, 如 WindGeneralTickerInfo.__table__
+    :param key_columns: 默认为 主键
+    """
+    _t = time.time()
+    if not key_columns:
+        key_columns = [_.name for _ in db_table.primary_key.columns]
+    # 主键重复时, 保留最后一条
+    d_rows: Dict[tuple, dict] = dict()
+    for _row in rows:
+        d_rows[tuple(_row[_k] for _k in key_columns)] = _row
+    if len(d_rows) != len(rows):
+        logger.warning(f'bulk_upsert, {db_table.name}, 主键重复 {len(rows) - len(d_rows)} 行, 保留最后一条')
+    rows = list(d_rows.values())
+
+    result = BulkUpsertResult()
+    try:
+        with engine.begin() as conn:
+            for _rows in _batches(rows, batch_size):
+                conn.execute(db_table.insert(), _rows)
+        result.changes = [('INSERT', _key) for _key in d_rows.keys()]
+    except IntegrityError:
+        logger.info(f'bulk_upsert, {db_table.name}, 主键冲突, 改为 upsert')
+        with engine.begin() as conn:
+            if engine.dialect.name == 'mssql':
+                result.changes = _merge_mssql(conn, db_table, rows, key_columns, batch_size)
+            else:
+                result.changes = _upsert_generic(conn, db_table, rows, key_columns, batch_size)
+    result.inserted = len([_ for _ in result.changes if _[0] == 'INSERT'])
+    result.updated = len([_ for _ in result.changes if _[0] == 'UPDATE'])
+    result.elapsed = time.time() - _t
+    logger.info(f'bulk_upsert, {db_table.name}, {len(rows)} rows, {str(result)}')
+    return result
+
+
+def bulk_upsert_wind_gti(
+        engine: Engine, data: List[WindGeneralTickerInfoData], batch_size: int = 1000) -> BulkUpsertResult:
+    return bulk_upsert(
+        engine, WindGeneralTickerInfo.__table__,
+        [WindGeneralTickerInfo.from_inner_data(_).to_dict() for _ in data],
+        batch_size=batch_size
+    )
+
+
+@dataclass
+class FundNetValueChanges:
+    inserted: int = 0
+    updated: int = 0
+    deleted: int = 0
+    unchanged: int = 0
+
+    def __str__(self):
+        return (f'inserted {self.inserted}, updated {self.updated}, '
+                f'deleted {self.deleted}, unchanged {self.unchanged}')
+
+
+def _merge_wind_net_values_mssql(conn: Connection, rows: List[dict]) -> List[Tuple[str, str]]:
+    """
+    写入临时表, 一次 MERGE; 目标为 每个 Fund 在临时表中 最早日期 之后的数据,
+    不在临时表中的 旧数据 删除（与 先删除再插入 相同）. 返回 [(action, fund), ]
+    目标 CTE 只能引用 一张表（多表的 CTE/视图 不能 UPDATE/DELETE, 错误 4405）, 所以用 EXISTS 过滤;
+    NetValue 比较 用 EXCEPT, NULL 也视为 变化
+    """
+    _stage_name = '#WindNetValues_stage'
+    conn.execute(text(f'SELECT TOP 0 [Date], [Fund], [NetValue] INTO [{_stage_name}] FROM [WindNetValues]'))
+    _stage = table(_stage_name, column('Date'), column('Fund'), column('NetValue'))
+    for _rows in _batches(rows, 1000):
+        conn.execute(_stage.insert(), _rows)
+    _result = conn.execute(text(
+        f'WITH t AS ('
+        f'  SELECT * FROM [WindNetValues] w WHERE EXISTS ('
+        f'    SELECT 1 FROM (SELECT [Fund], MIN([Date]) AS [FirstDate] FROM [{_stage_name}] GROUP BY [Fund]) f '
+        f'    WHERE f.[Fund] = w.[Fund] AND w.[Date] >= f.[FirstDate])'
+        f') '
+        f'MERGE t USING [{_stage_name}] AS s ON t.[Fund] = s.[Fund] AND t.[Date] = s.[Date] '
+        f'WHEN MATCHED AND EXISTS (SELECT t.[NetValue] EXCEPT SELECT s.[NetValue]) '
+        f'  THEN UPDATE SET t.[NetValue] = s.[NetValue] '
+        f'WHEN NOT MATCHED BY TARGET THEN INSERT ([Date], [Fund], [NetValue]) VALUES (s.[Date], s.[Fund], s.[NetValue]) '
+        f'WHEN NOT MATCHED BY SOURCE THEN DELETE '
+        f'OUTPUT $action, COALESCE(inserted.[Fund], deleted.[Fund]);'
+    ))
+    l_changes = [(str(_row[0]), str(_row[1])) for _row in _result]
+    conn.execute(text(f'DROP TABLE [{_stage_name}]'))
+    return l_changes
+
+
+def _merge_wind_net_values_generic(conn: Connection, rows: List[dict]) -> List[Tuple[str, str]]:
+    """不支持 MERGE 的数据库: 查询每个 Fund 的窗口内数据, 批量 delete / update / insert"""
+    _c = WindNetValues.__table__.c
+    d_first_date: Dict[str, str] = dict()
+    for _row in rows:
+        if _row['Fund'] not in d_first_date or _row['Date'] < d_first_date[_row['Fund']]:
+            d_first_date[_row['Fund']] = _row['Date']
+    d_existing: Dict[tuple, float] = dict()
+    for _funds in _batches(list(d_first_date.keys()), 200):
+        _where = or_(*[and_(_c.Fund == _f, _c.Date >= d_first_date[_f]) for _f in _funds])
+        for _date, _fund, _nv in conn.execute(select(_c.Date, _c.Fund, _c.NetValue).where(_where)):
+            d_existing[(_date, _fund)] = _nv
+
+    l_insert, l_update, l_changes = [], [], []
+    _d_new = {(_['Date'], _['Fund']): _ for _ in rows}
+    for _key, _row in _d_new.items():
+        if _key not in d_existing:
+            l_insert.append(_row)
+            l_changes.append(('INSERT', _row['Fund']))
+        elif d_existing[_key] != _row['NetValue']:
+            l_update.append(_row)
+            l_changes.append(('UPDATE', _row['Fund']))
+    l_delete = [_key for _key in d_existing.keys() if _key not in _d_new]
+    l_changes += [('DELETE', _key[1]) for _key in l_delete]
+
+    _t = WindNetValues.__table__
+    for _rows in _batches(l_delete, 1000):
+        conn.execute(_t.delete().where(and_(
+            _c.Date == bindparam('_Date'), _c.Fund == bindparam('_Fund'))), [
+            {'_Date': _date, '_Fund': _fund} for _date, _fund in _rows])
+    for _rows in _batches(l_update, 1000):
+        conn.execute(_t.update().where(and_(
+            _c.Date == bindparam('_Date'), _c.Fund == bindparam('_Fund'))).values(NetValue=bindparam('_NetValue')), [
+            {'_Date': _['Date'], '_Fund': _['Fund'], '_NetValue': _['NetValue']} for _ in _rows])
+    for _rows in _batches(l_insert, 1000):
+        conn.execute(_t.insert(), _rows)
+    return l_changes
+
+
+def bulk_merge_wind_net_values(
+        engine: Engine, data: Dict[str, Dict[str, float]]) -> Dict[str, FundNetValueChanges]:
+    """
+    一个事务内, 用 data 替换 每个 Fund 自其最早日期起 的 WindNetValues 数据
+    （与 逐个 Fund 先删除 再逐行插入 的结果相同）.
+        mssql: 全部数据写入临时表, 一次 MERGE
+        其他: 批量 delete / update / insert
+    :param data: {fund: {date: net_value}}
+    :return: {fund: FundNetValueChanges}
+    """
+    _t = time.time()
+    rows = [
+        {'Date': _date, 'Fund': _fund, 'NetValue': _nv}
+        for _fund, _d in data.items() for _date, _nv in _d.items()
+    ]
+    d_changes: Dict[str, FundNetValueChanges] = {_fund: FundNetValueChanges() for _fund in data.keys()}
+    if not rows:
+        return d_changes
+    with engine.begin() as conn:
+        if engine.dialect.name == 'mssql':
+            l_changes = _merge_wind_net_values_mssql(conn, rows)
+        else:
+            l_changes = _merge_wind_net_values_generic(conn, rows)
+    for _action, _fund in l_changes:
+        _changes = d_changes.setdefault(_fund, FundNetValueChanges())
+        if _action == 'INSERT':
+            _changes.inserted += 1
+        elif _action == 'UPDATE':
+            _changes.updated += 1
+        elif _action == 'DELETE':
+            _changes.deleted += 1
+    for _fund, _changes in d_changes.items():
+        _changes.unchanged = len(data.get(_fund, {})) - _changes.inserted - _changes.updated
+    logger.info(f'bulk_merge_wind_net_values, {len(data)} funds, {len(rows)} rows, '
+                f'{sum([_.inserted for _ in d_changes.values()])} inserted, '
+                f'{sum([_.updated for _ in d_changes.values()])} updated, '
+                f'{sum([_.deleted for _ in d_changes.values()])} deleted, elapsed {time.time() - _t:.2f}s')
+    return d_changes
@@ -0,0 +1,133 @@
+"""
+增量获取
+
+检查已经输出的数据, 计算每个 symbol 在 [start_date, end_date] 中 缺少的交易日,
+并合并为 最少的连续区间, 只请求这些区间.
+    分钟数据:  <output_root>/<YYYYMMDD>/<ticker>.csv
+    日线数据:  WindDailyBarFile
+"""
+
+import os
+from datetime import datetime, date, timedelta
+from typing import List, Dict, Tuple, Set
+from collections import defaultdict
+
+from agpwind.object import WindDailyBarData, WindDailyBarFile
+from pyptools.common.trading_calendar import TradingCalendar, ExchangeTradingCalendars
+
+
+def gen_trading_days(
+        start_date: date, end_date: date, holidays: List[date] or TradingCalendar or None = None) -> List[date]:
+    """
+    交易日: 非周末, 且不在 holidays 中
+    :param holidays: 假期列表, 或 TradingCalendar（如 exchange_holidays() 的返回, 不必每次重新构建）
+    """
+    if not isinstance(holidays, TradingCalendar):
+        holidays = TradingCalendar(holidays)
+    return holidays.trading_days(start_date, end_date)
+
+
+def exchange_holidays(
+        holidays: Dict[str, List[date]] or ExchangeTradingCalendars, symbol: str
+) -> List[date] or TradingCalendar:
+    """
+    :param holidays: {exchange: [date, ]}, 如 HolidayManager.holiday_by_exchange;
+        或 ExchangeTradingCalendars, 如 HolidayManager.trading_calendars(), 此时返回 TradingCalendar
+    :param symbol: inner symbol; 找不到其 exchange 时使用 SHFE
+    """
+    _exchange = symbol.split('.')[-1]
+    if isinstance(holidays, ExchangeTradingCalendars):
+        return holidays.calendar(_exchange)
+    if _exchange in holidays:
+        return holidays[_exchange]
+    return holidays.get('SHFE', [])
+
+
+def symbols_by_trading_day(
+        start_date: date, end_date: date,
+        holidays: Dict[str, List[date]] or ExchangeTradingCalendars, symbols: List[str]) -> Dict[date, List[str]]:
+    """
+    symbols 按 所属 exchange 分组, 每组 只包含 该 exchange 的交易日;
+    :param holidays: 同 exchange_holidays
+    :param symbols: inner symbol
+    :return: {交易日: [当天 所属交易所 交易的 symbol, ]}, 按日期排序
+    """
+    d_exchange_symbols: Dict[str, List[str]] = defaultdict(list)
+    for _symbol in symbols:
+        d_exchange_symbols[_symbol.split('.')[-1]].append(_symbol)
+    d_day_symbols: Dict[date, List[str]] = defaultdict(list)
+    for _symbols in d_exchange_symbols.values():
+        for _d in gen_trading_days(start_date, end_date, exchange_holidays(holidays, _symbols[0])):
+            d_day_symbols[_d] += _symbols
+    return {_d: d_day_symbols[_d] for _d in sorted(d_day_symbols.keys())}
+
+
+def coalesce_missing_dates(
+        trading_days: List[date], existing_dates: Set[date]) -> List[Tuple[date, date]]:
+    """
+    trading_days 中不存在于 existing_dates 的日期, 合并为连续区间.
+    在 trading_days 序列中相邻的缺失日期 属于同一区间（中间的周末/假期不会拆分区间）
+    """
+    l_ranges = []
+    _range_start = None
+    _range_end = None
+    for _d in trading_days:
+        if _d in existing_dates:
+            if _range_start:
+                l_ranges.append((_range_start, _range_end))
+                _range_start = None
+            continue
+        if not _range_start:
+            _range_start = _d
+        _range_end = _d
+    if _range_start:
+        l_ranges.append((_range_start, _range_end))
+    return l_ranges
+
+
+# 分钟数据
+def existing_minute_bar_dates(output_root, ticker: str) -> Set[date]:
+    """<output_root>/<YYYYMMDD>/<ticker>.csv 中, 已经存在（且非空）的日期"""
+    _dates = set()
+    if not os.path.isdir(output_root):
+        return _dates
+    for _name in os.listdir(output_root):
+        try:
+            _date = datetime.strptime(_name, '%Y%m%d').date()
+        except ValueError:
+            continue
+        _p_file = os.path.join(output_root, _name, ticker + '.csv')
+        if os.path.isfile(_p_file) and os.path.getsize(_p_file) > 0:
+            _dates.add(_date)
+    return _dates
+
+
+def missing_minute_bar_ranges(
+        output_root, ticker: str, start_date: date, end_date: date,
+        holidays: List[date] or TradingCalendar or None = None
+) -> List[Tuple[date, date]]:
+    return coalesce_missing_dates(
+        gen_trading_days(start_date, end_date, holidays),
+        existing_minute_bar_dates(output_root, ticker)
+    )
+
+
+# 日线数据
+def existing_daily_bar_data(path) -> Dict[str, List[WindDailyBarData]]:
+    """已经存在的日线文件, {product: [WindDailyBarData, ]}"""
+    _d = defaultdict(list)
+    if not path or not os.path.isfile(path):
+        return _d
+    for _data in WindDailyBarFile.from_file(path):
+        _d[_data.product].append(_data)
+    return _d
+
+
+def missing_daily_bar_ranges(
+        existing_data: Dict[str, List[WindDailyBarData]], product: str,
+        start_date: date, end_date: date, holidays: List[date] or TradingCalendar or None = None
+) -> List[Tuple[date, date]]:
+    return coalesce_missing_dates(
+        gen_trading_days(start_date, end_date, holidays),
+        set([_.date for _ in existing_data.get(product, [])])
+    )
@@ -1,19 +1,15 @@
 import os
 from datetime import datetime, date, timedelta
-from typing import List
+from typing import List, Dict
 import logging
 from collections import defaultdict
-import math
 
 logger = logging.getLogger('apgwind')
 
-try:
-    from WindPy import w
-except:
-    logger.error('import WindPy error')
-    raise ImportError
-
+from agpwind.backend import get_backend
+from agpwind.retry import request_wind, _error_message
 from agpwind.object import WindGeneralTickerInfoData, WindDailyBarData, WindMinuteBarData, WindMinuteBarFile
+from agpwind.columns import WindBarColumns, WindMinuteBarList, MINUTE_BAR_FLOAT_FIELDS
 
 
 def _parse_transaction_fee(s) -> (float, float):
@@ -57,12 +53,20 @@ def _parse_transaction_fee(s) -> (float, float):
     raise ValueError
 
 
+class WindDataError(Exception):
+    """wind 返回的 ErrorCode 非0"""
+    def __init__(self, error_code, message=''):
+        self.error_code = error_code
+        self.message = message
+        super().__init__(f'Error Code: {error_code}, Error Message: {message}')
+
+
 def start_wind():
-    w.start()
+    get_backend().start()
 
 
 def close_wind():
-    w.close()
+    get_backend().close()
 
 
 # 用于转换 exchange名字 的对应表
@@ -152,6 +156,71 @@ WindGeneralTickerInfo
 """
 
 
+# 合约信息 字段, 顺序与 _parse_general_ticker_info 的 values 一致
+WIND_GENERAL_TICKER_INFO_FIELDS = [
+    "trade_hiscode",    # 月合约代码
+    # "ftdate",           # 开始交易日
+    # "ftdate_new",       # 开始交易日
+    # "lasttrade_date",   # 最后交易日
+    # "ltdate_new",       # 最后交易日
+    "transactionfee",   # 交易手续费，
+    "todaypositionfee",  # 平今手续费
+    "margin",           # 保证金率
+    # "changelt",         # 涨跌幅限制
+    # "changelt_new",     # 涨跌幅限制
+    "punit",            # 报价单位
+    "mfprice",          # 最小变动价位
+    # "mfprice1",
+    "contractmultiplier",   # 合约乘数
+    # "thours2",          # 交易时间说明
+]
+
+
+def _parse_general_ticker_info(symbol: str, _date, values: list) -> WindGeneralTickerInfoData:
+    """
+    :param symbol: wind symbol (品种)
+    :param values: 按 WIND_GENERAL_TICKER_INFO_FIELDS 顺序的 一行数据
+    """
+    _ticker = values[0]
+    _transaction_fee = values[1]
+    _transaction_fee_float_today = values[2]
+    _margin = float(values[3]) / 100
+    _price_unit = values[4]           # 价格单位
+    _min_move = float(str(values[5]).strip(_price_unit))       # 5 人民币元/吨
+    _point_value = float(values[6])
+
+    # 佣金识别
+    if not _transaction_fee:
+        _commission_on_rate, _commission_per_share = ('', '')
+    else:
+        _commission_on_rate, _commission_per_share = _parse_transaction_fee(_transaction_fee)
+    if not _transaction_fee_float_today:
+        _commission_on_rate_today, _commission_per_share_today = ('', '')
+    else:
+        _commission_on_rate_today, _commission_per_share_today = _parse_transaction_fee(_transaction_fee_float_today)
+    if _commission_on_rate or _commission_per_share:
+        if _commission_on_rate != 0:
+            _flat_today_discount = round(_commission_on_rate_today / _commission_on_rate, 4)
+        else:
+            if _commission_per_share == 0:
+                _flat_today_discount = 1
+            else:
+                _flat_today_discount = round(_commission_per_share_today / _commission_per_share, 4)
+    else:
+        _flat_today_discount = ''
+    return WindGeneralTickerInfoData(
+        product=_wind_symbol_name_to_inner(symbol),
+        ticker=_wind_symbol_name_to_inner(_ticker),
+        date=_date,
+        point_value=_point_value,
+        min_move=_min_move,
+        commission_on_rate=_commission_on_rate,
+        commission_per_share=_commission_per_share,
+        flat_today_discount=_flat_today_discount,
+        margin=_margin
+    )
+
+
 def get_wind_general_ticker_info(
         symbol: str,
         start_date: datetime or date = datetime.now().date(),
@@ -167,25 +236,10 @@ def get_wind_general_ticker_info(
     all_data = list()
 
     # 获取
-    wsd_data = w.wsd(
+    wsd_data = request_wind(
+        'wsd',
         codes=symbol,
-        fields=",".join([
-            "trade_hiscode",    # 月合约代码
-            # "ftdate",           # 开始交易日
-            # "ftdate_new",       # 开始交易日
-            # "lasttrade_date",   # 最后交易日
-            # "ltdate_new",       # 最后交易日
-            "transactionfee",   # 交易手续费，
-            "todaypositionfee",  # 平今手续费
-            "margin",           # 保证金率
-            # "changelt",         # 涨跌幅限制
-            # "changelt_new",     # 涨跌幅限制
-            "punit",            # 报价单位
-            "mfprice",          # 最小变动价位
-            # "mfprice1",
-            "contractmultiplier",   # 合约乘数
-            # "thours2",          # 交易时间说明
-        ]),
+        fields=",".join(WIND_GENERAL_TICKER_INFO_FIELDS),
         beginTime=start_date,
         endTime=end_date,
         Fill='Previous',     # 默认为 "Blank"
@@ -196,9 +250,8 @@ def get_wind_general_ticker_info(
     if wsd_data.ErrorCode == 0:
         pass
     else:
-        logger.error(f"Error Code: {wsd_data.ErrorCode}")
-        logger.error(f"Error Message: {wsd_data.Data[0][0]}")
-        os.system('pause')
+        # 错误已由 request_wind 重试/记录在 get_failure_report() 中, 跳过此 symbol
+        return all_data
     # """
     """
     # usedf = True
@@ -211,46 +264,59 @@ def get_wind_general_ticker_info(
 
     # 数据格式转换
     for n in range(len(wsd_data.Times)):
-        _date = wsd_data.Times[n]
-        _ticker = wsd_data.Data[0][n]
-        _transaction_fee = wsd_data.Data[1][n]
-        _transaction_fee_float_today = wsd_data.Data[2][n]
-        _margin = float(wsd_data.Data[3][n]) / 100
-        _price_unit = wsd_data.Data[4][n]           # 价格单位
-        _min_move = float(str(wsd_data.Data[5][n]).strip(_price_unit))       # 5 人民币元/吨
-        _point_value = float(wsd_data.Data[6][n])
-
-        # 佣金识别
-        if not _transaction_fee:
-            _commission_on_rate, _commission_per_share = ('', '')
-        else:
-            _commission_on_rate, _commission_per_share = _parse_transaction_fee(_transaction_fee)
-        if not _transaction_fee_float_today:
-            _commission_on_rate_today, _commission_per_share_today = ('', '')
+        all_data.append(_parse_general_ticker_info(
+            symbol, wsd_data.Times[n], [_values[n] for _values in wsd_data.Data]))
+
+    return all_data
+
+
+def get_wind_general_ticker_info_snapshot(
+        symbols: List[str],
+        trade_date: datetime or date or None = None,
+        max_codes_per_request: int = 500,
+) -> List[WindGeneralTickerInfoData]:
+    """
+    获取多个 品种 在 trade_date 的合约信息（截面）
+    w.wss（codes, fields, options）, 每个请求包含多个 codes（最多 max_codes_per_request 个），
+    N 个品种 只需 1 次请求, 而 get_wind_general_ticker_info 需要 N 次.
+    多品种请求失败时, 改为逐个 symbol 通过 get_wind_general_ticker_info 获取.
+    :param symbols: wind symbol
+    :param trade_date: None 时 为今天
+    """
+    if trade_date is None:
+        trade_date = datetime.now().date()
+    if type(trade_date) is datetime:
+        trade_date = trade_date.date()
+    # 去重，保持顺序
+    symbols = list(dict.fromkeys(symbols))
+    all_data = list()
+    for n in range(0, len(symbols), max_codes_per_request):
+        _codes = symbols[n: n + max_codes_per_request]
+        logger.info(f'get_wind_general_ticker_info_snapshot(), checking {len(_codes)} codes, {str(trade_date)}')
+        wss_data = request_wind(
+            'wss',
+            codes=",".join(_codes),
+            fields=",".join(WIND_GENERAL_TICKER_INFO_FIELDS),
+            options=f"tradeDate={trade_date.strftime('%Y%m%d')}",
+        )
+        if wss_data.ErrorCode == 0:
+            pass
         else:
-            _commission_on_rate_today, _commission_per_share_today = _parse_transaction_fee(_transaction_fee_float_today)
-        if _commission_on_rate or _commission_per_share:
-            if _commission_on_rate != 0:
-                _flat_today_discount = round(_commission_on_rate_today / _commission_on_rate, 4)
+            # 错误已由 request_wind 重试/记录在 get_failure_report() 中
+            if len(_codes) > 1:
+                for symbol in _codes:
+                    all_data += get_wind_general_ticker_info(symbol, start_date=trade_date, end_date=trade_date)
+            continue
+
+        # 截面数据, Data[i][j] 对应 Fields[i], Codes[j]
+        for j, _code in enumerate(wss_data.Codes):
+            try:
+                _ = _parse_general_ticker_info(_code, trade_date, [_values[j] for _values in wss_data.Data])
+            except Exception as e:
+                logger.error(f'解析 wind_data 失败, {_code}')
+                logger.error(e)
             else:
-                if _commission_per_share == 0:
-                    _flat_today_discount = 1
-                else:
-                    _flat_today_discount = round(_commission_per_share_today / _commission_per_share, 4)
-        else:
-            _flat_today_discount = ''
-        _ = WindGeneralTickerInfoData(
-            product=_wind_symbol_name_to_inner(symbol),
-            ticker=_wind_symbol_name_to_inner(_ticker),
-            date=_date,
-            point_value=_point_value,
-            min_move=_min_move,
-            commission_on_rate=_commission_on_rate,
-            commission_per_share=_commission_per_share,
-            flat_today_discount=_flat_today_discount,
-            margin=_margin
-        )
-        all_data.append(_)
+                all_data.append(_)
 
     return all_data
 
@@ -280,7 +346,8 @@ def get_wind_daily_bar(
 
     # 获取
     logger.info(f'get_wind_daily_bar(), checking {symbol}, {str(start_date)}, {str(end_date)}')
-    wsd_data = w.wsd(
+    wsd_data = request_wind(
+        'wsd',
         codes=symbol,
         fields=",".join([
             "trade_hiscode",
@@ -303,9 +370,8 @@ def get_wind_daily_bar(
     if wsd_data.ErrorCode == 0:
         pass
     else:
-        logger.error(f"Error Code: {wsd_data.ErrorCode}")
-        logger.error(f"Error Message: {wsd_data.Data[0][0]}")
-        os.system('pause')
+        # 错误已由 request_wind 重试/记录在 get_failure_report() 中, 跳过此 symbol
+        return all_data
     # pprint(wsd_data, indent=4)
     # """
     """
@@ -353,26 +419,157 @@ def get_wind_daily_bar(
     return all_data
 
 
-def get_wind_minute_bar(
+# wsd 日线字段 与 WindDailyBarData 属性 的对应表
+# ['Wind', 'Inner']
+WIND_DAILY_BAR_FIELDS = [
+    ["trade_hiscode", "ticker"],
+    ["open", "open"],
+    ["high", "high"],
+    ["low", "low"],
+    ["close", "close"],
+    ["volume", "volume"],
+    ["amt", "traded_value"],            # 成交额
+    ["oi", "open_interest"],            # 持仓量
+    ["oiamount", "open_interest_value"],    # 持仓额
+]
+
+
+def get_wind_daily_bars(
+        symbols: List[str],
+        fields: List[str] = None,
+        start_date: datetime or date = None,
+        end_date: datetime or date = None,
+        max_codes_per_request: int = 100,
+) -> Dict[str, List[WindDailyBarData]]:
+    """
+    批量获取多个 symbol 的日线数据，返回 {symbol: [WindDailyBarData, ]}
+    w.wsd 只支持 多品种单指标 或者 单品种多指标，
+    所以按 字段 拆分请求，每个请求包含多个 codes（最多 max_codes_per_request 个），
+    再按 code 拆回每个 symbol 的数据。
+    当 symbol 数量少于请求数量时，退回 单品种多指标 的方式（get_wind_daily_bar）。
+    :param symbols: wind symbol
+    :param fields: wsd 字段，须为 WIND_DAILY_BAR_FIELDS 中的字段；未请求的字段填 nan
+    """
+    if not end_date:
+        end_date: date = datetime.now().date()
+    if not start_date:
+        start_date: date = end_date - timedelta(days=10)
+    d_field_to_inner = dict(WIND_DAILY_BAR_FIELDS)
+    if not fields:
+        fields = [_[0] for _ in WIND_DAILY_BAR_FIELDS]
+    for _field in fields:
+        if _field not in d_field_to_inner:
+            logger.error(f'get_wind_daily_bars(), 不支持的字段, {_field}')
+            raise ValueError
+    # 去重，保持顺序
+    symbols = list(dict.fromkeys(symbols))
+
+    l_codes_chunks = [
+        symbols[n: n + max_codes_per_request]
+        for n in range(0, len(symbols), max_codes_per_request)
+    ]
+    n_requests_single = len(symbols)
+    n_requests_multi = len(fields) * len(l_codes_chunks)
+
+    d_all_data: Dict[str, List[WindDailyBarData]] = dict()
+    # 单品种多指标 更省
+    if n_requests_single <= n_requests_multi:
+        logger.info(f'get_wind_daily_bars(), {len(symbols)} symbols, {n_requests_single} requests, saved 0 requests')
+        for symbol in symbols:
+            d_all_data[symbol] = get_wind_daily_bar(symbol, start_date=start_date, end_date=end_date)
+        return d_all_data
+
+    # 多品种单指标
+    # {symbol: {inner_field: [value, ]}}
+    d_values: Dict[str, Dict[str, list]] = defaultdict(dict)
+    d_times: Dict[str, list] = dict()
+    s_fallback_symbols = set()
+    for _codes in l_codes_chunks:
+        for _field in fields:
+            logger.info(f'get_wind_daily_bars(), checking {_field}, {len(_codes)} codes, '
+                        f'{str(start_date)}, {str(end_date)}')
+            wsd_data = request_wind(
+                'wsd',
+                codes=",".join(_codes),
+                fields=_field,
+                beginTime=start_date,
+                endTime=end_date,
+                Fill='Previous',
+            )
+            if wsd_data.ErrorCode == 0:
+                pass
+            else:
+                # 多品种请求失败时, 改为逐个 symbol 获取, 只跳过出错的 symbol
+                if len(_codes) > 1:
+                    s_fallback_symbols.update(_codes)
+                break
+
+            # 多品种单指标, Data[i] 对应 Codes[i]
+            for i, _code in enumerate(wsd_data.Codes):
+                d_values[_code][d_field_to_inner[_field]] = wsd_data.Data[i]
+                d_times[_code] = wsd_data.Times
+
+    # 数据格式转换
+    _l_inner_fields = [_[1] for _ in WIND_DAILY_BAR_FIELDS if _[1] != 'ticker']
+    for symbol in symbols:
+        if symbol in s_fallback_symbols:
+            d_all_data[symbol] = get_wind_daily_bar(symbol, start_date=start_date, end_date=end_date)
+            continue
+        all_data = list()
+        _times = d_times.get(symbol, [])
+        _d_symbol_values = d_values.get(symbol, {})
+        for n in range(len(_times)):
+            try:
+                _d_bar = dict()
+                for _inner_field in _l_inner_fields:
+                    if _inner_field in _d_symbol_values:
+                        _d_bar[_inner_field] = float(_d_symbol_values[_inner_field][n])
+                    else:
+                        _d_bar[_inner_field] = float('nan')
+                # 未请求 trade_hiscode 时，ticker 使用 symbol
+                if 'ticker' in _d_symbol_values:
+                    _ticker = _d_symbol_values['ticker'][n]
+                else:
+                    _ticker = symbol
+                _ = WindDailyBarData(
+                    product=_wind_symbol_name_to_inner(symbol),
+                    ticker=_wind_symbol_name_to_inner(_ticker),
+                    date=_times[n],
+                    **_d_bar
+                )
+            except Exception as e:
+                logger.error('解析 wind_data 失败')
+                logger.error(e)
+            else:
+                all_data.append(_)
+        d_all_data[symbol] = all_data
+
+    logger.info(f'get_wind_daily_bars(), {len(symbols)} symbols, {n_requests_multi} requests, '
+                f'saved {n_requests_single - n_requests_multi} requests')
+    return d_all_data
+
+
+def get_wind_minute_bar_columns(
         symbol: str,
         start_date: datetime or date = None,
         end_date: datetime or date = None,
-) -> List[WindMinuteBarData]:
+        raise_error: bool = False,
+) -> WindBarColumns:
+    """
+    列式的分钟数据, 剔除 open/high/low/close/volume 中有 nan 的行
+    :param raise_error: 最终失败时，抛出 WindDataError（而不是返回空数据），用于由调用方处理
+    """
 
     if not end_date:
         end_date: date = datetime.now().date()
     if not start_date:
         start_date: date = end_date - timedelta(days=10)
 
-    # w.start()
-    # w.wsd（codes, fields, beginTime, endTime, options）
-    # 可以支持取 多品种单指标 或者 单品种多指标 的时间序列数据
-    all_data = list()
-
     # 获取
     logger.info(f'get_wind_minute_bar(), checking {symbol}, {str(start_date)}, {str(end_date)}')
 
-    wsi_data = w.wsi(
+    wsi_data = request_wind(
+        'wsi',
         codes=symbol,
         fields=",".join([
             "open",
@@ -392,46 +589,47 @@ def get_wind_minute_bar(
     if wsi_data.ErrorCode == 0:
         pass
     else:
-        logger.error(f"Error Code: {wsi_data.ErrorCode}")
-        logger.error(f"Error Message: {wsi_data.Data[0][0]}")
-        os.system('pause')
+        # 错误已由 request_wind 重试/记录在 get_failure_report() 中
+        if raise_error:
+            raise WindDataError(wsi_data.ErrorCode, _error_message(wsi_data))
+        return WindBarColumns.empty()
+
+    # 数据格式转换, Data[i] 对应 请求的第 i 个字段
+    columns = WindBarColumns.from_wind_data(
+        wsi_data,
+        ticker=_wind_symbol_name_to_inner(symbol),
+        fields=MINUTE_BAR_FLOAT_FIELDS,
+        time_offset=timedelta(minutes=1),
+    )
+    return columns.dropna(['open', 'high', 'low', 'close', 'volume'])
 
-    # 数据格式转换
-    for n in range(len(wsi_data.Times)):
-        try:
-            _data_time = wsi_data.Times[n] + timedelta(minutes=1)
-            _o = float(wsi_data.Data[0][n])
-            _h = float(wsi_data.Data[1][n])
-            _l = float(wsi_data.Data[2][n])
-            _c = float(wsi_data.Data[3][n])
-            _v = float(wsi_data.Data[4][n])
-            _open_interest = float(wsi_data.Data[5][n])
-        except Exception as e:
-            logger.error('解析 wind_data 失败')
-            logger.error(e)
-            # logger.error(wsd_data.Data[1][n])
-        else:
-            if True in [math.isnan(__) for __ in [_o, _h, _l, _c, _v]]:
-                continue
-            else:
-                _ = WindMinuteBarData(
-                    ticker=_wind_symbol_name_to_inner(symbol),
-                    datatime=_data_time,
-                    open=_o,
-                    high=_h,
-                    low=_l,
-                    close=_c,
-                    volume=_v,
-                    open_interest=_open_interest,
-                )
-                all_data.append(_)
 
-    return all_data
+def get_wind_minute_bar(
+        symbol: str,
+        start_date: datetime or date = None,
+        end_date: datetime or date = None,
+        raise_error: bool = False,
+) -> List[WindMinuteBarData]:
+    """
+    返回 get_wind_minute_bar_columns 的 List[WindMinuteBarData] 视图（WindMinuteBarList）
+    :param raise_error: 最终失败时，抛出 WindDataError（而不是返回空数据），用于由调用方处理
+    """
+    return WindMinuteBarList(get_wind_minute_bar_columns(
+        symbol=symbol, start_date=start_date, end_date=end_date, raise_error=raise_error))
 
 
-def output_wind_minute_bar_data(data: List[WindMinuteBarData], output_root):
+def output_wind_minute_bar_data(data: List[WindMinuteBarData] or WindBarColumns, output_root):
     if not os.path.isdir(output_root):
         os.makedirs(output_root)
+    # 列式数据, 直接按列输出
+    if isinstance(data, WindMinuteBarList):
+        data = data.columns
+    if isinstance(data, WindBarColumns):
+        for (_ticker, _date), _columns in data.group_by_date().items():
+            logger.info(f'output_wind_minute_bar_data, {_wind_symbol_name_to_inner(_ticker)}, {_date}')
+            _columns.to_minute_bar_file(os.path.join(output_root, _date, _ticker + '.csv'))
+        return
+
     l_data_group_by = defaultdict(list)
     for _ in data:
         l_data_group_by[(_.ticker, _.datatime.date().strftime('%Y%m%d'))].append(_)
@@ -0,0 +1,135 @@
+"""
+分钟数据 流式获取/输出
+
+    获取: iter_minute_bar_batches 逐个 symbol 请求, 按 (ticker, 日期) 拆分为 batch 依次 yield
+    输出: MinuteBarPipeline 在后台线程中运行获取, 通过 有界队列 将 batch 交给 当前线程 写出
+
+获取 与 写文件 同时进行; 队列满时 获取线程等待, 内存中最多只有 max_queue 个 batch
+加上 正在处理的一个 symbol 的数据, 与 symbol 的数量无关.
+
+    pipeline = MinuteBarPipeline(output_root, max_queue=16)
+    pipeline.run(iter_minute_bar_batches([[wind_symbol, start, end], ]))
+    pipeline.stats
+"""
+
+import os
+import time
+import queue
+import logging
+import threading
+from typing import Iterator, Iterable, Tuple
+from dataclasses import dataclass, field
+
+from agpwind.columns import WindBarColumns
+from agpwind.method import get_wind_minute_bar_columns
+
+logger = logging.getLogger('apgwind')
+
+
+# ((ticker, 'YYYYMMDD'), 该 ticker 该日期 的全部数据)
+MinuteBarBatch = Tuple[Tuple[str, str], WindBarColumns]
+
+
+def iter_minute_bar_batches(
+        symbols_start_end: Iterable[list],
+) -> Iterator[MinuteBarBatch]:
+    """
+    :param symbols_start_end: [[wind_symbol, start, end], ], 可以是 生成器
+    逐个 symbol 请求, 每个 symbol 的数据 按 datatime 的日期 拆分后 依次 yield
+    """
+    for _symbol, _start, _end in symbols_start_end:
+        columns = get_wind_minute_bar_columns(symbol=_symbol, start_date=_start, end_date=_end)
+        for _key, _columns in sorted(columns.group_by_date().items()):
+            yield _key, _columns
+
+
+def write_minute_bar_batch(batch: MinuteBarBatch, output_root):
+    """<output_root>/<YYYYMMDD>/<ticker>.csv"""
+    (_ticker, _date), _columns = batch
+    logger.info(f'output_wind_minute_bar_data, {_ticker}, {_date}')
+    _columns.to_minute_bar_file(os.path.join(output_root, _date, _ticker + '.csv'))
+
+
+@dataclass
+class MinuteBarPipelineStats:
+    batches: int = 0
+    bars: int = 0
+    max_queue_size: int = 0
+    writer_wait: float = 0      # 写出线程 等待获取 的时间
+    started_at: float = field(default_factory=time.time)
+
+    @property
+    def elapsed(self) -> float:
+        return time.time() - self.started_at
+
+    def __str__(self):
+        return (f'batches {self.batches}, bars {self.bars}, max queue size {self.max_queue_size}, '
+                f'writer wait {self.writer_wait:.1f}s, elapsed {self.elapsed:.1f}s')
+
+
+class _PipelineEnd:
+    """获取结束 的标记; error 为获取线程中的异常"""
+
+    def __init__(self, error: BaseException or None = None):
+        self.error = error
+
+
+class MinuteBarPipeline:
+    """
+    :param max_queue: 队列中最多等待写出的 batch 数量
+    """
+
+    def __init__(self, output_root: str, max_queue: int = 16):
+        assert max_queue >= 1
+        self.output_root = output_root
+        self.max_queue = max_queue
+        self.stats = MinuteBarPipelineStats()
+
+    @staticmethod
+    def _put(item, q: queue.Queue, stop: threading.Event) -> bool:
+        """队列满时等待; 写出线程 出错退出后（stop）放弃, 返回 False"""
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self, batches: Iterator[MinuteBarBatch], q: queue.Queue, stop: threading.Event):
+        try:
+            for _batch in batches:
+                if not self._put(_batch, q, stop):
+                    return
+        except BaseException as e:
+            self._put(_PipelineEnd(e), q, stop)
+        else:
+            self._put(_PipelineEnd(), q, stop)
+
+    def run(self, batches: Iterable[MinuteBarBatch]) -> MinuteBarPipelineStats:
+        if not os.path.isdir(self.output_root):
+            os.makedirs(self.output_root)
+        self.stats = MinuteBarPipelineStats()
+        q = queue.Queue(maxsize=self.max_queue)
+        stop = threading.Event()
+        producer = threading.Thread(
+            target=self._produce, args=(iter(batches), q, stop), name='MinuteBarPipeline', daemon=True)
+        producer.start()
+        try:
+            while True:
+                _t = time.time()
+                _item = q.get()
+                self.stats.writer_wait += time.time() - _t
+                if isinstance(_item, _PipelineEnd):
+                    if _item.error is not None:
+                        raise _item.error
+                    break
+                self.stats.max_queue_size = max(self.stats.max_queue_size, q.qsize() + 1)
+                write_minute_bar_batch(_item, self.output_root)
+                self.stats.batches += 1
+                self.stats.bars += len(_item[1])
+        finally:
+            stop.set()
+            producer.join()
+        logger.info(f'MinuteBarPipeline, {str(self.stats)}')
+        return self.stats
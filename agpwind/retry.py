@@ -0,0 +1,256 @@
+"""
+wind 请求的 错误处理 与 重试
+
+ErrorCode 分类 (WindErrorType):
+    Transient:  网络/超时/频繁访问 等, 按 带抖动的指数退避 重试
+    Quota:      数据提取量超限, 触发熔断 (WindCircuitBreaker), 之后的请求直接失败, 不再发出
+    BadCode:    代码错误/无数据, 不重试, 跳过并记录
+    Unknown:    其他, 不重试, 记录
+所有最终失败的请求记录在 WindFailureReport 中, 由调用方在批量任务结束后查看, 不会阻塞任务.
+
+    from agpwind.retry import request_wind, get_failure_report
+    wsd_data = request_wind('wsd', codes, fields, begin, end, Fill='Previous')
+    ...
+    get_failure_report().log()
+"""
+
+import time
+import random
+import logging
+import threading
+from enum import Enum
+from dataclasses import dataclass, field
+from typing import List, Dict
+
+from agpwind.backend import get_backend, FakeWindData
+
+logger = logging.getLogger('apgwind')
+
+
+class WindErrorType(Enum):
+    Transient = 'Transient'
+    Quota = 'Quota'
+    BadCode = 'BadCode'
+    Unknown = 'Unknown'
+
+
+# wind ErrorCode 分类
+WIND_ERROR_CODE_TYPES: Dict[int, WindErrorType] = {
+    -40520007: WindErrorType.BadCode,      # 没有可用数据
+    -40522004: WindErrorType.BadCode,      # 万得代码语法错误
+    -40522005: WindErrorType.BadCode,      # 不支持的万得代码
+    -40522017: WindErrorType.Quota,        # 数据提取量超限
+    -40520008: WindErrorType.Transient,    # 超时错误
+    -40520009: WindErrorType.Transient,    # 本地WBOX错误
+    -40521001: WindErrorType.Transient,    # IO操作错误
+    -40521002: WindErrorType.Transient,    # 后台服务器不可用
+    -40521003: WindErrorType.Transient,    # 网络连接失败
+    -40521004: WindErrorType.Transient,    # 请求发送失败
+    -40521005: WindErrorType.Transient,    # 数据接收失败
+    -40521006: WindErrorType.Transient,    # 网络错误
+    -40521007: WindErrorType.Transient,    # 服务器拒绝请求
+    -40521008: WindErrorType.Transient,    # 错误的应答
+    -40521009: WindErrorType.Transient,    # 数据解码失败
+    -40521010: WindErrorType.Transient,    # 网络超时
+    -40521011: WindErrorType.Transient,    # 频繁访问
+}
+
+
+def classify_error_code(error_code: int) -> WindErrorType:
+    return WIND_ERROR_CODE_TYPES.get(error_code, WindErrorType.Unknown)
+
+
+def _error_message(data) -> str:
+    try:
+        return str(data.Data[0][0])
+    except (IndexError, TypeError, AttributeError):
+        return ''
+
+
+@dataclass
+class WindRetryPolicy:
+    """
+    Transient 错误的重试策略: 第 n 次重试前 等待 uniform(0, min(max_delay, base_delay * 2 ** n)) 秒
+    """
+    max_retry: int = 5
+    base_delay: float = 1
+    max_delay: float = 60
+
+    def delay(self, n: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** n))
+
+
+class WindCircuitBreaker:
+    """
+    出现 Quota 错误时打开, 打开期间所有请求直接失败;
+    cooldown 秒后自动关闭, cooldown 为 None 时保持打开, 直到 reset()
+    """
+
+    def __init__(self, cooldown: float or None = None):
+        self.cooldown = cooldown
+        self._opened_at: float or None = None
+        self.error_code = None
+
+    @property
+    def is_open(self) -> bool:
+        if self._opened_at is None:
+            return False
+        if self.cooldown is not None and time.time() - self._opened_at >= self.cooldown:
+            self.reset()
+            return False
+        return True
+
+    def trip(self, error_code):
+        if self._opened_at is None:
+            logger.error(f'WindCircuitBreaker, 熔断, Error Code: {error_code}')
+        self._opened_at = time.time()
+        self.error_code = error_code
+
+    def reset(self):
+        self._opened_at = None
+        self.error_code = None
+
+
+@dataclass
+class WindFailure:
+    function: str
+    codes: str
+    fields: str
+    begin: str
+    end: str
+    error_code: int
+    error_message: str
+    error_type: WindErrorType
+    attempts: int
+    skipped: bool = False       # 熔断期间, 未发出请求
+
+    def __str__(self):
+        return (f'{self.function}, {self.codes}, {self.fields}, {self.begin}, {self.end}, '
+                f'{self.error_type.value}, Error Code: {self.error_code}, Error Message: {self.error_message}, '
+                f'attempts {self.attempts}{", skipped" if self.skipped else ""}')
+
+
+@dataclass
+class WindFailureReport:
+    failures: List[WindFailure] = field(default_factory=list)
+    n_requests: int = 0
+    n_retries: int = 0
+
+    @property
+    def bad_codes(self) -> List[str]:
+        """出错的单个代码; 多品种请求出错时无法确定是哪个代码, 不计入"""
+        _l = []
+        for _ in self.failures:
+            if _.error_type == WindErrorType.BadCode and ',' not in _.codes and _.codes not in _l:
+                _l.append(_.codes)
+        return _l
+
+    def by_type(self) -> Dict[WindErrorType, List[WindFailure]]:
+        _d = {}
+        for _ in self.failures:
+            _d.setdefault(_.error_type, []).append(_)
+        return _d
+
+    def __str__(self):
+        _s = ', '.join([f'{_k.value} {len(_v)}' for _k, _v in self.by_type().items()])
+        return (f'requests {self.n_requests}, retries {self.n_retries}, '
+                f'failures {len(self.failures)}{" (" + _s + ")" if _s else ""}')
+
+    def log(self):
+        logger.info(f'WindFailureReport, {str(self)}')
+        for _ in self.failures:
+            logger.warning(f'WindFailureReport, {str(_)}')
+
+    def clear(self):
+        self.failures = []
+        self.n_requests = 0
+        self.n_retries = 0
+
+
+class WindRequestExecutor:
+    """通过当前 backend 发出请求, 处理 重试/熔断, 失败记录在 self.report"""
+
+    def __init__(
+            self,
+            policy: WindRetryPolicy or None = None,
+            breaker: WindCircuitBreaker or None = None,
+            sleep=time.sleep,
+    ):
+        self.policy = policy or WindRetryPolicy()
+        self.breaker = breaker or WindCircuitBreaker()
+        self.report = WindFailureReport()
+        self._sleep = sleep
+        self._lock = threading.Lock()
+
+    def _add_failure(self, failure: WindFailure):
+        with self._lock:
+            self.report.failures.append(failure)
+
+    def request(self, function: str, codes, fields, *args, **kwargs):
+        """
+        :param function: 'wsd' / 'wsi' / 'wss'
+        其余参数与 WindPy 相同. 返回 wind 数据; 最终失败时返回 ErrorCode 非0 的数据
+        """
+        _begin = str(args[0]) if len(args) > 0 else str(kwargs.get('beginTime', ''))
+        _end = str(args[1]) if len(args) > 1 else str(kwargs.get('endTime', ''))
+        with self._lock:
+            self.report.n_requests += 1
+
+        if self.breaker.is_open:
+            _error_code = self.breaker.error_code
+            self._add_failure(WindFailure(
+                function=function, codes=str(codes), fields=str(fields), begin=_begin, end=_end,
+                error_code=_error_code, error_message='circuit breaker open', error_type=WindErrorType.Quota,
+                attempts=0, skipped=True
+            ))
+            return FakeWindData(error_code=_error_code, data=[['circuit breaker open']])
+
+        n = 0
+        while True:
+            data = getattr(get_backend(), function)(codes, fields, *args, **kwargs)
+            if data.ErrorCode == 0:
+                return data
+            _error_type = classify_error_code(data.ErrorCode)
+            if _error_type == WindErrorType.Transient and n < self.policy.max_retry:
+                _delay = self.policy.delay(n)
+                n += 1
+                with self._lock:
+                    self.report.n_retries += 1
+                logger.warning(f'{function}, {codes}, Error Code: {data.ErrorCode}, '
+                               f'retry {n} in {_delay:.1f}s')
+                self._sleep(_delay)
+                continue
+            if _error_type == WindErrorType.Quota:
+                self.breaker.trip(data.ErrorCode)
+            logger.error(f"{function}, {codes}, Error Code: {data.ErrorCode}, {_error_type.value}")
+            logger.error(f"Error Message: {_error_message(data)}")
+            self._add_failure(WindFailure(
+                function=function, codes=str(codes), fields=str(fields), begin=_begin, end=_end,
+                error_code=data.ErrorCode, error_message=_error_message(data), error_type=_error_type,
+                attempts=n + 1
+            ))
+            return data
+
+
+_executor: WindRequestExecutor or None = None
+
+
+def get_executor() -> WindRequestExecutor:
+    global _executor
+    if _executor is None:
+        _executor = WindRequestExecutor()
+    return _executor
+
+
+def set_executor(executor: WindRequestExecutor):
+    global _executor
+    _executor = executor
+
+
+def request_wind(function: str, codes, fields, *args, **kwargs):
+    """通过 get_executor() 发出 wind 请求"""
+    return get_executor().request(function, codes, fields, *args, **kwargs)
+
+
+def get_failure_report() -> WindFailureReport:
+    return get_executor().report
@@ -0,0 +1,215 @@
+"""
+benchmark: 数据库 写入 / 查询
+
+使用 sqlite（本地文件）运行与 mssql 相同的模型和代码, 用模拟的 GTI / 净值 / 委托 数据,
+分别测量 逐行写入（原有方式）、批量写入、查询 的耗时.
+逐行写入 很慢, 只写入前 --row-by-row 行, 按此估算 rows/s.
+
+    python benchmarks/db_bench.py
+    python benchmarks/db_bench.py --sizes 10000,100000,1000000 --row-by-row 5000
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import logging
+import tempfile
+from datetime import datetime, date, timedelta
+
+PATH_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PATH_ROOT)
+
+from sqlalchemy import select, insert
+from sqlalchemy.orm import sessionmaker
+
+from pyptools.common.db import build_dsn, get_engine, dispose_engines
+from pyptools.pyplatinum.oms.db import Base as OmsBase, Order, OmsDbManagement
+from agpwind.db import (
+    Base, WindGeneralTickerInfo, WindNetValues, bulk_upsert_wind_gti, bulk_merge_wind_net_values)
+from agpwind.object import WindGeneralTickerInfoData
+
+logging.getLogger('apgwind').setLevel(logging.WARNING)
+logging.getLogger('pyptools.db').setLevel(logging.WARNING)
+
+arg_parser = argparse.ArgumentParser()
+arg_parser.add_argument('--sizes', default='10000,100000', help='数据行数, 逗号分隔')
+arg_parser.add_argument('--row-by-row', default=2000, help='逐行写入 的最多行数')
+arg_parser.add_argument('--path', default='', help='sqlite 文件目录, 默认为临时目录')
+args = arg_parser.parse_args()
+SIZES = [int(_) for _ in str(args.sizes).split(',')]
+N_ROW_BY_ROW = int(args.row_by_row)
+PATH_DB_ROOT = os.path.abspath(args.path) if args.path else tempfile.mkdtemp(prefix='db_bench_')
+
+START_DATE = date(2015, 1, 1)
+N_PRODUCTS = 100
+
+
+def _print(name, n_rows, elapsed):
+    print(f'{name:<36}{n_rows:>12}{elapsed:>12.4f}{(n_rows / elapsed if elapsed else 0):>14.0f}')
+
+
+def _timeit(name, n_rows, func):
+    _t = time.perf_counter()
+    _rtn = func()
+    _print(name, n_rows, time.perf_counter() - _t)
+    return _rtn
+
+
+def _new_engine(name, metadata):
+    _p = os.path.join(PATH_DB_ROOT, f'{name}.db')
+    if os.path.isfile(_p):
+        os.remove(_p)
+    engine = get_engine(build_dsn(host='', user='', pwd='', database=_p, dialect='sqlite'))
+    metadata.create_all(engine)
+    return engine
+
+
+# 模拟数据
+def gen_gti_data(n) -> list:
+    l_data = []
+    for i in range(n):
+        _product = f'p{i % N_PRODUCTS}.SHFE'
+        _date = START_DATE + timedelta(days=i // N_PRODUCTS)
+        l_data.append(WindGeneralTickerInfoData(
+            product=_product, ticker=_product.replace('.', '2401.'), date=_date,
+            point_value=10, min_move=1, commission_on_rate=0.0001, commission_per_share=0,
+            flat_today_discount=1, margin=0.1 + (i % 7) / 100,
+        ))
+    return l_data
+
+
+def gen_nav_data(n) -> dict:
+    d_data = dict()
+    for i in range(n):
+        _fund = f'fund{i % N_PRODUCTS}'
+        _date = (START_DATE + timedelta(days=i // N_PRODUCTS)).strftime('%Y%m%d')
+        d_data.setdefault(_fund, dict())[_date] = 1 + (i % 97) / 1000
+    return d_data
+
+
+def gen_order_rows(n) -> list:
+    _t = datetime(2024, 1, 2, 9)
+    return [
+        dict(
+            InternalId=f'o{i}', ExternalId=f'e{i}', Account='acc', Trader=f't{i % 20}', Ticker='rb2405.SHFE',
+            OrderStatus=4, OrderType=1, Direction=1 if i % 2 else -1, LimitPrice=3500.0, Volume=1.0,
+            TradedPrice=3500.0, TradedVolume=1.0, HedgeFlag=1, OffsetFlag=0,
+            CreateTime=_t + timedelta(seconds=i), UpdateTime=_t + timedelta(seconds=i),
+            CacheTime=_t, FillingTime=_t + timedelta(seconds=i), Remark='', BatchId='', IsBatchOrder='0',
+        )
+        for i in range(n)
+    ]
+
+
+# GTI
+def bench_gti(n):
+    l_data = gen_gti_data(n)
+
+    # 逐行: session.add + commit（原 _to_wind_gti_db）
+    engine = _new_engine('gti_row', Base.metadata)
+    session = sessionmaker(bind=engine)()
+    _n = min(n, N_ROW_BY_ROW)
+
+    def _row_by_row():
+        for _data in l_data[:_n]:
+            session.add(WindGeneralTickerInfo.from_inner_data(_data))
+            session.commit()
+    _timeit('gti insert, row by row', _n, _row_by_row)
+    session.close()
+
+    # 批量
+    engine = _new_engine('gti_bulk', Base.metadata)
+    _timeit('gti insert, bulk', n, lambda: bulk_upsert_wind_gti(engine, l_data))
+    _timeit('gti upsert, bulk (all conflict)', n, lambda: bulk_upsert_wind_gti(engine, l_data))
+
+    # 查询
+    session = sessionmaker(bind=engine)()
+    _timeit('gti query, all dates', n, lambda: set([_[0] for _ in session.query(WindGeneralTickerInfo.date).all()]))
+    _last_date = START_DATE + timedelta(days=(n - 1) // N_PRODUCTS)
+    _timeit('gti query, one date (orm)', N_PRODUCTS, lambda: session.query(WindGeneralTickerInfo).filter(
+        WindGeneralTickerInfo.date == _last_date).all())
+    session.close()
+
+
+# 净值
+def bench_nav(n):
+    d_data = gen_nav_data(n)
+
+    # 逐行: 先删除, 再 session.add + commit（原 FundNetValue.to_db）
+    engine = _new_engine('nav_row', Base.metadata)
+    session = sessionmaker(bind=engine)()
+    _l_rows = [(_fund, _date, _nv) for _fund, _d in d_data.items() for _date, _nv in _d.items()][:N_ROW_BY_ROW]
+
+    def _row_by_row():
+        for _fund, _date, _nv in _l_rows:
+            session.add(WindNetValues(date=_date, fund=_fund, net_value=_nv))
+            session.commit()
+    _timeit('nav insert, row by row', len(_l_rows), _row_by_row)
+    session.close()
+
+    # 批量
+    engine = _new_engine('nav_bulk', Base.metadata)
+    _timeit('nav merge, bulk (new)', n, lambda: bulk_merge_wind_net_values(engine, d_data))
+    _timeit('nav merge, bulk (unchanged)', n, lambda: bulk_merge_wind_net_values(engine, d_data))
+
+    # 查询
+    session = sessionmaker(bind=engine)()
+    _timeit('nav query, all (orm)', n, lambda: session.query(WindNetValues).all())
+    _timeit('nav query, one fund (orm)', n // N_PRODUCTS, lambda: session.query(WindNetValues).filter(
+        WindNetValues.Fund == 'fund0').order_by(WindNetValues.Date).all())
+    session.close()
+
+
+# 委托
+def bench_orders(n):
+    l_rows = gen_order_rows(n)
+
+    engine = _new_engine('orders_row', OmsBase.metadata)
+    session = sessionmaker(bind=engine)()
+    _n = min(n, N_ROW_BY_ROW)
+
+    def _row_by_row():
+        for _row in l_rows[:_n]:
+            session.add(Order(**_row))
+            session.commit()
+    _timeit('orders insert, row by row', _n, _row_by_row)
+    session.close()
+
+    engine = _new_engine('orders_bulk', OmsBase.metadata)
+
+    def _bulk():
+        with engine.begin() as conn:
+            for i in range(0, n, 1000):
+                conn.execute(insert(Order.__table__), l_rows[i: i + 1000])
+    _timeit('orders insert, bulk', n, _bulk)
+
+    oms = OmsDbManagement(
+        db=os.path.join(PATH_DB_ROOT, 'orders_bulk.db'), host='', user='', pwd='', dialect='sqlite')
+    _timeit('orders query, all (orm)', n, lambda: oms.query_orders())
+    view = oms.create_view(Order)
+    _timeit('orders view, first poll', n, view.poll)
+    _timeit('orders view, poll (no change)', n, view.poll)
+    oms.close()
+
+    def _core():
+        with engine.connect() as conn:
+            return conn.execute(select(Order.__table__)).all()
+    _timeit('orders query, all (core)', n, _core)
+
+
+def main():
+    print(f'sqlite: {PATH_DB_ROOT}')
+    print(f'{"case":<36}{"rows":>12}{"seconds":>12}{"rows/s":>14}')
+    for n in SIZES:
+        bench_gti(n)
+        bench_nav(n)
+        bench_orders(n)
+        dispose_engines()
+    if not args.path:
+        shutil.rmtree(PATH_DB_ROOT, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
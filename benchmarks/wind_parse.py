@@ -0,0 +1,87 @@
+"""
+benchmark: agpwind.method 的 解析速度
+
+使用 FakeWindBackend(replay=True) 生成数据, 每个 case 先请求一次（生成并缓存模拟数据）,
+之后重复请求只测量 get_wind_* 的 解析耗时, 不包含 wind 请求本身.
+
+    python benchmarks/wind_parse.py
+    python benchmarks/wind_parse.py --sizes 10,100,500 --days 60 --repeat 3
+"""
+
+import os
+import sys
+import time
+import argparse
+import logging
+from datetime import datetime, timedelta
+
+PATH_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PATH_ROOT)
+
+from agpwind.backend import FakeWindBackend, set_backend
+from agpwind import method
+
+logging.getLogger('apgwind').setLevel(logging.WARNING)
+
+arg_parser = argparse.ArgumentParser()
+arg_parser.add_argument('--sizes', default='10,50,200', help='universe 大小, 逗号分隔')
+arg_parser.add_argument('--days', default=20, help='日线/合约信息 的日期区间长度')
+arg_parser.add_argument('--minute-days', default=5, help='分钟数据 的日期区间长度')
+arg_parser.add_argument('--repeat', default=3)
+args = arg_parser.parse_args()
+UNIVERSE_SIZES = [int(_) for _ in str(args.sizes).split(',')]
+N_DAYS = int(args.days)
+N_MINUTE_DAYS = int(args.minute_days)
+N_REPEAT = int(args.repeat)
+
+END_DATE = datetime(2024, 6, 28).date()
+
+
+def _gen_universe(n):
+    _exchanges = ['SHF', 'DCE', 'CZC', 'INE', 'CFE', 'GFE']
+    return [f'p{i}.{_exchanges[i % len(_exchanges)]}' for i in range(n)]
+
+
+def _bench(name, n_symbols, func, symbols, start_date, end_date):
+    # 预热: 生成并缓存模拟数据
+    n_rows = sum([len(func(_symbol, start_date, end_date)) for _symbol in symbols])
+    l_elapsed = []
+    for _ in range(N_REPEAT):
+        _t = time.perf_counter()
+        for _symbol in symbols:
+            func(_symbol, start_date, end_date)
+        l_elapsed.append(time.perf_counter() - _t)
+    _best = min(l_elapsed)
+    print(f'{name:<28}{n_symbols:>8}{n_rows:>12}{_best:>12.4f}{(n_rows / _best if _best else 0):>14.0f}')
+
+
+def main():
+    set_backend(FakeWindBackend(replay=True))
+    print(f'{"case":<28}{"symbols":>8}{"rows":>12}{"best(s)":>12}{"rows/s":>14}')
+    for n in UNIVERSE_SIZES:
+        symbols = _gen_universe(n)
+        _bench(
+            'get_wind_daily_bar', n,
+            lambda s, b, e: method.get_wind_daily_bar(s, b, e),
+            symbols, END_DATE - timedelta(days=N_DAYS), END_DATE)
+        _bench(
+            'get_wind_general_ticker_info', n,
+            lambda s, b, e: method.get_wind_general_ticker_info(s, b, e),
+            symbols, END_DATE - timedelta(days=N_DAYS), END_DATE)
+        _bench(
+            'get_wind_minute_bar', n,
+            lambda s, b, e: method.get_wind_minute_bar(s, b, e),
+            symbols, END_DATE - timedelta(days=N_MINUTE_DAYS), END_DATE)
+        # 构造全部 WindMinuteBarData
+        _bench(
+            'get_wind_minute_bar(list)', n,
+            lambda s, b, e: list(method.get_wind_minute_bar(s, b, e)),
+            symbols, END_DATE - timedelta(days=N_MINUTE_DAYS), END_DATE)
+        _bench(
+            'get_wind_minute_bar_columns', n,
+            lambda s, b, e: method.get_wind_minute_bar_columns(s, b, e),
+            symbols, END_DATE - timedelta(days=N_MINUTE_DAYS), END_DATE)
+
+
+if __name__ == '__main__':
+    main()
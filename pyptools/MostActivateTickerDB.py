@@ -2,14 +2,15 @@
 
 """
 import os
+import time
 from datetime import datetime, date, timedelta
 import json
-from typing import List
+from typing import List, Dict
 import sys
 from collections import defaultdict
 from dataclasses import dataclass
 
-from sqlalchemy import create_engine, select, and_
+from sqlalchemy import create_engine, select, and_, bindparam
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import Column, Integer, String, Float, Date, PrimaryKeyConstraint
 from sqlalchemy.ext.declarative import declarative_base
@@ -18,6 +19,7 @@ PATH_ROOT = os.path.dirname(os.path.dirname(__file__))
 sys.path.append(PATH_ROOT)
 
 from pyptools.helper.simpleLogger import MyLogger
+from pyptools.common.db import build_dsn, get_engine, EnginePoolSettings
 
 
 Base = declarative_base()
@@ -62,15 +64,13 @@ class MostActivateTicker(Base):
 class MostActivateTickerToDB:
     def __init__(
             self,
-            user, pwd, host, db, logger=MyLogger('class MostActivateTickerToDB')
+            user, pwd, host, db, logger=MyLogger('class MostActivateTickerToDB'),
+            pool_settings: EnginePoolSettings or None = None, dialect: str or None = None,
     ):
-        engine = create_engine(
-            # echo=True参数表示连接发出的 SQL 将被记录到标准输出
-            # future=True是为了方便便我们充分利用sqlalchemy2.0样式用法
-            f'mssql+pymssql://{user}:{pwd}@{host}/{db}',
-            echo=False,
-        )
+        # 进程内共享, 相同连接信息 复用同一个连接池
+        engine = get_engine(build_dsn(host=host, user=user, pwd=pwd, database=db, dialect=dialect), pool_settings)
         Base.metadata.create_all(engine)  # 首次创建表
+        self.engine = engine
         Session = sessionmaker(bind=engine)
         self.session = Session()
         #
@@ -177,6 +177,102 @@ class MostActivateTickerToDB:
                 except Exception as e:
                     self.logger.error(e)
 
+    @staticmethod
+    def _list_date_files(root, checking_n_days) -> List[tuple]:
+        """root 中 最近 checking_n_days 天的 日期文件, [(date, path), ]"""
+        _checking_date_start: date = (datetime.now() - timedelta(days=checking_n_days-1)).date()
+        l_files = []
+        for _file_name in os.listdir(root):
+            _p_file = os.path.join(root, _file_name)
+            if not os.path.isfile(_p_file):
+                continue
+            try:
+                _dt_date = datetime.strptime(_file_name.split(".")[0], "%Y%m%d").date()
+            except :
+                continue
+            if _dt_date >= _checking_date_start:
+                l_files.append((_dt_date, _p_file))
+        l_files.sort()
+        return l_files
+
+    @staticmethod
+    def _read_date_file(p, dt_date: date, activate_num) -> Dict[tuple, tuple]:
+        """{(Date, Product, Num): (Ticker, TotalVolume, TotalValue)}"""
+        d_rows = dict()
+        with open(p) as f:
+            l_lines = f.readlines()
+        for line in l_lines:
+            line = line.strip()
+            if line == '':
+                continue
+            line_split = line.split(",")
+            total_volume = float(line_split[2]) if line_split[2] else 0
+            total_value = float(line_split[3]) if line_split[3] else 0
+            d_rows[(dt_date, line_split[0], activate_num)] = (line_split[1], total_volume, total_value)
+        return d_rows
+
+    def sync_from_files(self, root, checking_n_days=1, activate_num=1, dates_per_batch=31) -> Dict[str, int]:
+        """
+        批量同步, 结果与 upload_new_data_from_files 相同（按 Date, Product, Num 覆盖）:
+        一次读取所有日期文件, 按 主键 hash 与 数据库中的数据 比较,
+        每 dates_per_batch 个日期 一个事务, 批量 delete 有变化的旧数据, 批量 insert 新增/变化的数据.
+        :return: {'inserted': , 'updated': , 'unchanged': }
+        """
+        _t = time.time()
+        path_root = os.path.abspath(root)
+        assert os.path.isdir(path_root)
+        l_files = self._list_date_files(path_root, checking_n_days)
+        if not l_files:
+            self.logger.warning('no checking date folder')
+            return {'inserted': 0, 'updated': 0, 'unchanged': 0}
+
+        # {date: {key: values}}
+        d_new_by_date: Dict[date, Dict[tuple, tuple]] = dict()
+        for _dt_date, _p_file in l_files:
+            d_new_by_date[_dt_date] = self._read_date_file(_p_file, _dt_date, activate_num)
+
+        _t_table = MostActivateTicker.__table__
+        _c = _t_table.c
+        _stmt_delete = _t_table.delete().where(and_(
+            _c.Date == bindparam('_Date'), _c.Product == bindparam('_Product'), _c.Num == bindparam('_Num')))
+        d_count = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+        l_dates = list(d_new_by_date.keys())
+        for n in range(0, len(l_dates), dates_per_batch):
+            _dates = l_dates[n: n + dates_per_batch]
+            with self.engine.begin() as conn:
+                # 数据库中 已有的数据
+                d_existing = {
+                    (_row.Date, _row.Product, _row.Num): (_row.Ticker, _row.TotalVolume, _row.TotalValue)
+                    for _row in conn.execute(
+                        select(_t_table).where(_c.Date.in_(_dates), _c.Num == activate_num))
+                }
+                l_delete, l_insert = [], []
+                for _dt_date in _dates:
+                    for _key, _values in d_new_by_date[_dt_date].items():
+                        _old = d_existing.get(_key)
+                        if _old == _values:
+                            d_count['unchanged'] += 1
+                            continue
+                        if _old is not None:
+                            l_delete.append({'_Date': _key[0], '_Product': _key[1], '_Num': _key[2]})
+                            d_count['updated'] += 1
+                        else:
+                            d_count['inserted'] += 1
+                        l_insert.append({
+                            'Date': _key[0], 'Product': _key[1], 'Num': _key[2],
+                            'Ticker': _values[0], 'TotalVolume': _values[1], 'TotalValue': _values[2],
+                        })
+                if l_delete:
+                    conn.execute(_stmt_delete, l_delete)
+                if l_insert:
+                    conn.execute(_t_table.insert(), l_insert)
+            self.logger.info(f'sync {str(_dates[0])} - {str(_dates[-1])}, '
+                             f'delete {len(l_delete)}, insert {len(l_insert)}')
+        self.logger.info(f'sync finished, {len(l_dates)} dates, inserted {d_count["inserted"]}, '
+                         f'updated {d_count["updated"]}, unchanged {d_count["unchanged"]}, '
+                         f'elapsed {time.time() - _t:.2f}s')
+        return d_count
+
     def download_from_db(self, start_date: date or str = "20100101"):
         _db_rtn: List[MostActivateTicker] = self.session.scalars(
             select(MostActivateTicker).where(MostActivateTicker.Date >= start_date)).all()
@@ -0,0 +1,184 @@
+"""
+进程内共享的 sqlalchemy engine
+
+按 DSN 缓存 engine, 相同 DSN 的 get_engine() 复用同一个 engine 及其连接池,
+脚本 / 常驻进程 中的多个任务 不必每次重新建立 TCP 连接 和 登录.
+
+    from pyptools.common.db import build_dsn, get_engine, engine_stats
+    engine = get_engine(build_dsn(host, user, pwd, database))
+    ...
+    engine_stats()
+
+连接池参数 见 EnginePoolSettings; 同一 DSN 以第一次 get_engine() 的参数为准, 之后传入不同的参数 会记录 warning.
+
+数据库类型: build_dsn 的 dialect, 默认 mssql+pymssql,
+可以通过 set_default_dialect() 或 环境变量 PYPTOOLS_DB_DIALECT 修改, 如 本地使用 sqlite:
+    PYPTOOLS_DB_DIALECT=sqlite  ->  sqlite:///<database>, database 为文件路径（或 :memory:）, 忽略 host/user/pwd
+"""
+
+import os
+import time
+import logging
+import threading
+from urllib import parse
+from dataclasses import dataclass, field
+from typing import Dict
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger('pyptools.db')
+
+
+@dataclass
+class EnginePoolSettings:
+    """默认值 与 sqlalchemy create_engine 的默认值相同, pool_pre_ping 除外"""
+    pool_size: int = 5          # 连接池的大小
+    max_overflow: int = 10      # 超过连接池大小之后，允许最大扩展连接数；
+    pool_timeout: float = 30    # 连接池如果没有连接了，最长的等待时间
+    pool_recycle: int = -1      # 多久之后对连接池中连接进行一次回收
+    pool_pre_ping: bool = True  # 取出连接时 检查连接是否可用, 断开的连接 自动重连
+    echo: bool = False
+
+
+# OMS / PM / GTI 脚本 原来使用的 连接池参数
+LARGE_POOL_SETTINGS = EnginePoolSettings(pool_size=50, max_overflow=50, pool_timeout=600, pool_recycle=-1)
+
+
+@dataclass
+class EnginePoolStats:
+    connects: int = 0           # 新建的 DBAPI 连接数（TCP + 登录）
+    connect_seconds: float = 0  # 新建连接 的总耗时
+    checkouts: int = 0          # 从连接池取出 的次数
+    checkins: int = 0
+    invalidated: int = 0        # 失效 被丢弃的连接数（如 pre-ping 失败）
+    checked_out: int = 0        # 当前 取出未归还 的连接数
+    max_checked_out: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    @property
+    def avg_connect_seconds(self) -> float:
+        return self.connect_seconds / self.connects if self.connects else 0
+
+    @property
+    def reuse_ratio(self) -> float:
+        """取出的连接中, 复用已有连接 的比例"""
+        return 1 - self.connects / self.checkouts if self.checkouts else 0
+
+    def __str__(self):
+        return (f'connects {self.connects}, avg connect {self.avg_connect_seconds * 1000:.1f}ms, '
+                f'checkouts {self.checkouts}, reuse {self.reuse_ratio:.1%}, invalidated {self.invalidated}, '
+                f'checked out {self.checked_out}, max checked out {self.max_checked_out}')
+
+
+_default_settings = EnginePoolSettings()
+_default_dialect = os.environ.get('PYPTOOLS_DB_DIALECT', 'mssql+pymssql')
+_engines: Dict[str, Engine] = dict()
+_settings: Dict[str, EnginePoolSettings] = dict()
+_stats: Dict[str, EnginePoolStats] = dict()
+_lock = threading.Lock()
+
+
+def build_dsn(host: str, user: str, pwd: str, database: str, dialect: str or None = None) -> str:
+    """:param dialect: 默认为 set_default_dialect() 的设置"""
+    dialect = dialect or _default_dialect
+    if dialect.startswith('sqlite'):
+        return f'{dialect}:///{str(database)}'
+    return f'{dialect}://{str(user)}:{parse.quote_plus(str(pwd))}@{str(host)}/{str(database)}'
+
+
+def set_default_dialect(dialect: str):
+    """如 'mssql+pymssql', 'sqlite'"""
+    global _default_dialect
+    _default_dialect = dialect
+
+
+def set_default_pool_settings(settings: EnginePoolSettings):
+    """之后新建的 engine 使用的 默认连接池参数"""
+    global _default_settings
+    _default_settings = settings
+
+
+def _attach_stats(engine: Engine, stats: EnginePoolStats):
+    _local = threading.local()
+
+    @event.listens_for(engine, 'do_connect')
+    def _do_connect(dialect, conn_rec, cargs, cparams):
+        _local.connect_started_at = time.perf_counter()
+
+    @event.listens_for(engine.pool, 'connect')
+    def _connect(dbapi_connection, connection_record):
+        _started_at = getattr(_local, 'connect_started_at', None)
+        with stats._lock:
+            stats.connects += 1
+            if _started_at is not None:
+                stats.connect_seconds += time.perf_counter() - _started_at
+        _local.connect_started_at = None
+
+    @event.listens_for(engine.pool, 'checkout')
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        with stats._lock:
+            stats.checkouts += 1
+            stats.checked_out += 1
+            stats.max_checked_out = max(stats.max_checked_out, stats.checked_out)
+
+    @event.listens_for(engine.pool, 'checkin')
+    def _checkin(dbapi_connection, connection_record):
+        with stats._lock:
+            stats.checkins += 1
+            stats.checked_out = max(0, stats.checked_out - 1)
+
+    @event.listens_for(engine.pool, 'invalidate')
+    def _invalidate(dbapi_connection, connection_record, exception):
+        with stats._lock:
+            stats.invalidated += 1
+
+
+def get_engine(dsn: str, settings: EnginePoolSettings or None = None) -> Engine:
+    """相同 dsn 返回同一个 engine; 已有 engine 时 忽略 settings, 与已有 engine 的参数不同时 记录 warning"""
+    with _lock:
+        if dsn in _engines:
+            if settings is not None and settings != _settings[dsn]:
+                logger.warning(
+                    f'get_engine, engine exists, settings ignored, {repr(_engines[dsn].url)}, '
+                    f'using {_settings[dsn]}, ignored {settings}')
+            return _engines[dsn]
+        settings = settings or _default_settings
+        kwargs = dict(echo=settings.echo, pool_pre_ping=settings.pool_pre_ping)
+        # sqlite 使用 SingletonThreadPool / StaticPool, 不支持 QueuePool 的参数
+        if not dsn.startswith('sqlite'):
+            kwargs.update(dict(
+                pool_size=settings.pool_size,
+                max_overflow=settings.max_overflow,
+                pool_timeout=settings.pool_timeout,
+                pool_recycle=settings.pool_recycle,
+            ))
+        engine = create_engine(dsn, **kwargs)
+        _settings[dsn] = settings
+        _stats[dsn] = EnginePoolStats()
+        _attach_stats(engine, _stats[dsn])
+        _engines[dsn] = engine
+        logger.info(f'get_engine, new engine, {repr(engine.url)}')
+        return engine
+
+
+def engine_stats(dsn: str or None = None) -> Dict[str, EnginePoolStats] or EnginePoolStats:
+    """dsn 为 None 时 返回 {url(隐藏密码): EnginePoolStats}"""
+    if dsn is not None:
+        return _stats[dsn]
+    return {repr(_engines[_dsn].url): _s for _dsn, _s in _stats.items()}
+
+
+def log_engine_stats():
+    for _url, _s in engine_stats().items():
+        logger.info(f'engine, {_url}, {str(_s)}')
+
+
+def dispose_engines():
+    """关闭所有 engine 的连接池, 之后的 get_engine() 会新建 engine"""
+    with _lock:
+        for _engine in _engines.values():
+            _engine.dispose()
+        _engines.clear()
+        _settings.clear()
+        _stats.clear()
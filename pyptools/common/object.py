@@ -1,6 +1,7 @@
 from datetime import date
 from dataclasses import dataclass
-from typing import Dict, List
+from typing import Dict, List, Tuple
+from bisect import bisect_right
 
 import numpy as np
 
@@ -366,21 +367,81 @@ class TradingSessionData:
     ExchangeTimezone: str           # 交易所所在时区，很少情况需要用到，所以作废（乱填）
 
 
+def trading_session_minute_mask(trading_session: List[List[time]]) -> np.ndarray:
+    """
+    一天 1440 分钟 的 bool 数组, 第 n 个元素 对应 AllMinuteTime[n] (即 hour * 60 + minute),
+    在任一 [start, end] 区间内（包含两端）为 True; start > end 时 为跨夜区间
+    """
+    _mask = np.zeros(24 * 60, dtype=bool)
+    for _start, _end in trading_session:
+        _s = _start.hour * 60 + _start.minute
+        _e = _end.hour * 60 + _end.minute
+        if _s <= _e:
+            _mask[_s: _e + 1] = True
+        else:
+            _mask[_s:] = True
+            _mask[: _e + 1] = True
+    return _mask
+
+
 class TradingSessionDataSet:
+    """
+    每个 product 的 TradingSessionData 按 Date 排序, 查询某天的交易时间（Date <= 该日 的最后一条）为 二分查找;
+    该日期 早于所有记录时, 使用 最早的一条
+    """
+
     def __init__(self, data):
         self._data: Dict[Product, List[TradingSessionData]] = data
-
-    def get(self, product: Product, checking_date=datetime.today().date()) -> List[List[time]] or None:
+        for _ts_list in self._data.values():
+            _ts_list.sort(key=lambda x: x.Date)
+        self._dates: Dict[Product, List[date]] = {
+            _product: [_.Date for _ in _ts_list] for _product, _ts_list in self._data.items()}
+        # id(TradingSessionData) -> 分钟 mask, 相同的交易时间 共用一个只读数组
+        self._masks: Dict[int, np.ndarray] = dict()
+
+    def get_data(self, product: Product, checking_date: date = None) -> TradingSessionData or None:
         _product_ts_list: List[TradingSessionData] or None = self._data.get(product)
         if not _product_ts_list:
             return None
-        else:
-            if len(_product_ts_list) == 1:
-                return _product_ts_list[0].TradingSession
-            else:
-                _nearest_ts = [_ts for _ts in _product_ts_list if _ts.Date <= checking_date]
-                if _nearest_ts:
-                    return max(_nearest_ts, key=lambda x: x.date).TradingSession
-                else:
-                    return min(_product_ts_list, key=lambda x: x.date).TradingSession
+        _n = bisect_right(self._dates[product], checking_date or datetime.today().date()) - 1
+        return _product_ts_list[max(_n, 0)]
+
+    def get(self, product: Product, checking_date: date = None) -> List[List[time]] or None:
+        _ts = self.get_data(product, checking_date)
+        return _ts.TradingSession if _ts else None
+
+    def minute_mask(self, product: Product, checking_date: date = None) -> np.ndarray or None:
+        """见 trading_session_minute_mask; 返回的数组 只读, 且被多次查询共用"""
+        _ts = self.get_data(product, checking_date)
+        return self._minute_mask_of(_ts) if _ts else None
+
+    def _minute_mask_of(self, ts: TradingSessionData) -> np.ndarray:
+        if id(ts) not in self._masks:
+            _mask = trading_session_minute_mask(ts.TradingSession)
+            _mask.setflags(write=False)
+            self._masks[id(ts)] = _mask
+        return self._masks[id(ts)]
+
+    def sessions_for(
+            self, products: List[Product], dates: List[date]
+    ) -> Dict[Tuple[Product, date], np.ndarray or None]:
+        """
+        多个 product / 日期 的 分钟 mask, {(product, date): mask}; 没有交易时间信息的 product 为 None
+        每个 product 的日期 一次 np.searchsorted
+        """
+        _ordinals = np.fromiter((_.toordinal() for _ in dates), dtype=np.int64, count=len(dates))
+        d_result = dict()
+        for _product in products:
+            _product_ts_list = self._data.get(_product)
+            if not _product_ts_list:
+                for _date in dates:
+                    d_result[(_product, _date)] = None
+                continue
+            _ts_ordinals = np.fromiter(
+                (_.toordinal() for _ in self._dates[_product]), dtype=np.int64, count=len(_product_ts_list))
+            _n = np.maximum(np.searchsorted(_ts_ordinals, _ordinals, side='right') - 1, 0)
+            l_masks = [self._minute_mask_of(_ts) for _ts in _product_ts_list]
+            for _date, _i in zip(dates, _n.tolist()):
+                d_result[(_product, _date)] = l_masks[_i]
+        return d_result
 
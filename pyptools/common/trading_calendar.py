@@ -0,0 +1,98 @@
+"""
+交易日历
+
+TradingCalendar: 单个交易所, 由假期列表 一次性构建 np.busdaycalendar（假期 排序存储, 查询为 二分查找）
+    is_trading_day(d)               是否交易日
+    next_trading_day(d, n=1)        d 之后 第 n 个交易日
+    prev_trading_day(d, n=1)        d 之前 第 n 个交易日
+    trading_days(start, end)        [start, end] 中的交易日
+    n_trading_days_between(start, end)  [start, end] 中的交易日数量
+
+weekmask: 周一至周日 是否可能为交易日, 默认 '1111100'（周末 非交易日）;
+    '1111111' 时 只剔除假期, 与 Platinum DS 原来的处理（gen_date_range + gen_list_diff）相同.
+
+ExchangeTradingCalendars: {exchange: TradingCalendar}, 找不到 exchange 时 使用 default_exchange 的日历
+
+    calendars = ExchangeTradingCalendars(HolidayManager(path).holiday_by_exchange)
+    calendars.calendar('SHFE').trading_days(date(2024, 1, 1), date(2024, 12, 31))
+"""
+
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Iterable
+
+import numpy as np
+
+
+def _to_datetime64(d: date or datetime) -> np.datetime64:
+    if type(d) is datetime:
+        d = d.date()
+    return np.datetime64(d, 'D')
+
+
+class TradingCalendar:
+    def __init__(self, holidays: Iterable[date] or None = None, weekmask: str = '1111100'):
+        self.weekmask = weekmask
+        self._holidays = np.array(sorted(set(holidays or [])), dtype='datetime64[D]')
+        self._calendar = np.busdaycalendar(weekmask=weekmask, holidays=self._holidays)
+
+    def __repr__(self):
+        return f'<TradingCalendar(holidays={len(self._holidays)}, weekmask={self.weekmask})>'
+
+    def is_trading_day(self, d: date or datetime) -> bool:
+        return bool(np.is_busday(_to_datetime64(d), busdaycal=self._calendar))
+
+    def next_trading_day(self, d: date or datetime, n: int = 1) -> date:
+        """d 之后（不含 d）第 n 个交易日"""
+        assert n >= 1
+        return np.busday_offset(_to_datetime64(d), n, roll='backward', busdaycal=self._calendar).item()
+
+    def prev_trading_day(self, d: date or datetime, n: int = 1) -> date:
+        """d 之前（不含 d）第 n 个交易日"""
+        assert n >= 1
+        return np.busday_offset(_to_datetime64(d), -n, roll='forward', busdaycal=self._calendar).item()
+
+    def trading_days_array(self, start: date, end: date) -> np.ndarray:
+        """[start, end] 中的交易日, datetime64[D] 数组"""
+        _days = np.arange(_to_datetime64(start), _to_datetime64(end) + 1, dtype='datetime64[D]')
+        return _days[np.is_busday(_days, busdaycal=self._calendar)]
+
+    def trading_days(self, start: date, end: date) -> List[date]:
+        """[start, end] 中的交易日"""
+        return self.trading_days_array(start, end).tolist()
+
+    def n_trading_days_between(self, start: date, end: date) -> int:
+        """[start, end] 中的交易日数量; end < start 时为 0"""
+        if end < start:
+            return 0
+        return int(np.busday_count(_to_datetime64(start), _to_datetime64(end) + 1, busdaycal=self._calendar))
+
+
+class ExchangeTradingCalendars:
+    """
+    :param holidays: {exchange: [date, ]}, 如 HolidayManager.holiday_by_exchange
+    :param default_exchange: 找不到 exchange 时 使用的日历; 也没有时 只按 weekmask
+    """
+
+    def __init__(
+            self, holidays: Dict[str, List[date]] or None = None,
+            weekmask: str = '1111100', default_exchange: str = 'SHFE',
+    ):
+        self.weekmask = weekmask
+        self.default_exchange = default_exchange
+        self._calendars: Dict[str, TradingCalendar] = {
+            _exchange: TradingCalendar(_holidays, weekmask=weekmask)
+            for _exchange, _holidays in (holidays or {}).items()
+        }
+        self._no_holiday_calendar = TradingCalendar([], weekmask=weekmask)
+
+    def __contains__(self, exchange: str):
+        return exchange in self._calendars
+
+    def calendar(self, exchange: str or None = None) -> TradingCalendar:
+        if exchange in self._calendars:
+            return self._calendars[exchange]
+        return self._calendars.get(self.default_exchange, self._no_holiday_calendar)
+
+    def no_holiday_calendar(self) -> TradingCalendar:
+        """不考虑假期, 只按 weekmask"""
+        return self._no_holiday_calendar
@@ -72,25 +72,17 @@ def gen_list_diff(l1, l2) -> list:
     :param l2:
     :return:
     """
-    l1 = l1.copy()
-    l2 = l2.copy()
-    l1.sort()
-    l2.sort()
+    l1 = sorted(l1)
+    l2 = sorted(l2)
     l3 = []
+    # 双指针, 不再 list.pop(0)
+    j = 0
     for i in l1:
-        if len(l2) == 0:
-            l3.append(i)
-        else:
-            while len(l2) > 0:
-                if l2[0] > i:
-                    l3.append(i)
-                    break
-                elif l2[0] == i:
-                    break
-                else:
-                    l2.pop(0)
-            if len(l2) == 0:
-                l3.append(i)
+        while j < len(l2) and l2[j] < i:
+            j += 1
+        if j < len(l2) and l2[j] == i:
+            continue
+        l3.append(i)
     return l3
 
 
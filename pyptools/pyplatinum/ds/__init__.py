@@ -1 +1,2 @@
-from .object import DSChecker, DSManager
+from .object import DSManager
+from .checker import DSChecker
@@ -0,0 +1,148 @@
+"""
+列式读取 bar 数据文件
+
+BarData/60/<Prefix>/<YYYYMMDD>/<ticker>.csv, 每行: time,open,high,low,close,volume,price,open_interest
+
+    read_bar_files_once():  多个文件的内容 拼接后 一次 pd.read_csv（C 解析器）, 时间列 向量化转换
+    read_bar_files():       文件分组后 在 线程池/进程池 中 read_bar_files_once(), 再合并
+    BarDataList:            DataFrame 的 List[BarData] 只读视图, 访问某一行时 才构造 BarData
+
+DataFrame 的列: BAR_FRAME_COLUMNS
+    ticker          ticker name
+    date            交易日（文件夹日期）
+    datetime        交易日 + time
+    open, high, low, close, volume, price, open_interest
+"""
+
+import io
+import os
+from datetime import datetime
+from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from pyptools.common.object import Ticker, BarData
+
+BAR_FILE_COLUMNS = ['time', 'open', 'high', 'low', 'close', 'volume', 'price', 'open_interest']
+BAR_FLOAT_FIELDS = BAR_FILE_COLUMNS[1:]
+BAR_FRAME_COLUMNS = ['ticker', 'date', 'datetime'] + BAR_FLOAT_FIELDS
+
+
+def empty_bar_frame() -> pd.DataFrame:
+    return pd.DataFrame({
+        'ticker': pd.Series([], dtype=object),
+        'date': pd.Series([], dtype='datetime64[ns]'),
+        'datetime': pd.Series([], dtype='datetime64[ns]'),
+        **{_: pd.Series([], dtype=np.float64) for _ in BAR_FLOAT_FIELDS},
+    })
+
+
+def _read_text(path) -> str:
+    """去掉空行; 文件可能没有 最后的换行"""
+    with open(path) as f:
+        text = f.read().strip()
+    if '\n\n' in text or '\n\r\n' in text:
+        text = '\n'.join([_ for _ in text.splitlines() if _.strip()])
+    return text
+
+
+def read_bar_files_once(paths: List[str]) -> pd.DataFrame:
+    """
+    多个文件的内容 拼接后 用一次 pd.read_csv 解析, 避免 每个文件 单独解析的开销;
+    ticker / 交易日 按每个文件的行数 展开
+    """
+    l_text, l_ticker, l_date, l_n = [], [], [], []
+    for _path in paths:
+        _text = _read_text(_path)
+        if not _text:
+            continue
+        l_text.append(_text)
+        l_ticker.append(os.path.basename(_path)[:-4])
+        l_date.append(np.datetime64(datetime.strptime(os.path.basename(os.path.dirname(_path)), '%Y%m%d'), 'ns'))
+        l_n.append(_text.count('\n') + 1)
+    if not l_text:
+        return empty_bar_frame()
+    df = pd.read_csv(
+        io.StringIO('\n'.join(l_text)), header=None, names=BAR_FILE_COLUMNS,
+        dtype={'time': str, **{_: np.float64 for _ in BAR_FLOAT_FIELDS}}, engine='c',
+    )
+    if len(df) != sum(l_n) or df['time'].isna().any() or df[BAR_FLOAT_FIELDS[-1]].isna().any():
+        raise ValueError(f'Bar数据文件错误, {paths[0]} ... {len(paths)} files')
+    _n = np.asarray(l_n)
+    _dates = np.repeat(np.asarray(l_date), _n)
+    df.insert(0, 'datetime', _dates + pd.to_timedelta(df.pop('time')).to_numpy())
+    df.insert(0, 'date', _dates)
+    df.insert(0, 'ticker', np.repeat(np.asarray(l_ticker, dtype=object), _n))
+    return df
+
+
+def read_bar_file(path) -> pd.DataFrame:
+    """文件名 为 ticker, 所在文件夹名 为 交易日"""
+    return read_bar_files_once([path])
+
+
+def read_bar_files(
+        paths: List[str], max_workers: int = 8, use_processes: bool = False, chunk_size: int = 200,
+) -> pd.DataFrame:
+    """
+    按 paths 的顺序 合并; 文件按 chunk_size 分组, 每组 在 线程池/进程池 中 用 read_bar_files_once 读取
+    :param use_processes: True 时 使用进程池, 文件很多时 可以绕开 GIL; 默认 线程池
+    """
+    if not paths:
+        return empty_bar_frame()
+    l_chunks = [paths[i: i + chunk_size] for i in range(0, len(paths), chunk_size)]
+    if max_workers <= 1 or len(l_chunks) == 1:
+        l_df = [read_bar_files_once(_) for _ in l_chunks]
+    else:
+        _executor_cls = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        with _executor_cls(max_workers=min(max_workers, len(l_chunks))) as executor:
+            l_df = list(executor.map(read_bar_files_once, l_chunks))
+    l_df = [_ for _ in l_df if len(_)]
+    if not l_df:
+        return empty_bar_frame()
+    if len(l_df) == 1:
+        return l_df[0]
+    return pd.concat(l_df, ignore_index=True)
+
+
+class BarDataList(Sequence):
+    """bar DataFrame 的 List[BarData] 视图"""
+
+    def __init__(self, frame: pd.DataFrame, interval: float = 60):
+        self.frame = frame
+        self.interval = interval
+        self._ticker = frame['ticker'].to_numpy()
+        self._datetime = frame['datetime'].to_numpy(dtype='datetime64[us]')
+        self._values = {_: frame[_].to_numpy() for _ in BAR_FLOAT_FIELDS}
+
+    def __len__(self):
+        return len(self._datetime)
+
+    def _row(self, n: int) -> BarData:
+        _datetime: datetime = self._datetime[n].astype(datetime)
+        return BarData(
+            ticker=Ticker.gen_obj_from_name(self._ticker[n]),
+            date=_datetime.date(),
+            time=_datetime.time(),
+            interval=self.interval,
+            **{_: float(_v[n]) for _, _v in self._values.items()}
+        )
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return BarDataList(self.frame.iloc[item], interval=self.interval)
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError(item)
+        return self._row(item)
+
+    def __iter__(self):
+        for n in range(len(self)):
+            yield self._row(n)
+
+    def __repr__(self):
+        return f'<BarDataList(rows={len(self)})>'
@@ -0,0 +1,202 @@
+"""
+BarData 文件目录 索引
+
+BarData/60/<Prefix>/<YYYYMMDD>/<ticker>.csv
+
+    BarDataFileCatalog 记录每个 <Prefix>/<YYYYMMDD> 文件夹的 修改时间 和 文件名,
+    refresh() 时 只重新 listdir 修改时间变化的 日期文件夹（文件增删 会改变文件夹的修改时间）.
+    按日期 建立 ticker / product / exchange -> 文件路径 的索引（首次查询该日期时建立）, 查询为 dict 查找.
+    每次按日期查询 都会 stat 该日期的文件夹, 修改时间变化时 重新 listdir, 新写入的文件 立即可见;
+    refresh_interval 只影响 dates()（新增的 日期文件夹）.
+    设置 cache_path 时, 文件夹记录 保存到文件（pickle, 应放在 只有本用户可写 的目录）, 下次启动 只需要检查修改时间.
+
+    catalog = BarDataFileCatalog(os.path.join(ds_root, 'BarData/60'), DSManager.PrefixFolderName, cache_path)
+    catalog.ticker_file('rb2405.SHFE', date(2024, 1, 2))
+    catalog.product_files('rb.SHFE', date(2024, 1, 2))
+"""
+
+import os
+import time
+import pickle
+import logging
+from datetime import date, datetime
+from typing import Dict, List, Tuple
+
+from pyptools.common.object import Ticker
+
+
+class _DateIndex:
+    """某一天 的文件索引"""
+
+    def __init__(self):
+        self.tickers: Dict[str, str] = dict()                   # ticker name: path, 多个 prefix 都有时 取第一个
+        self.products: Dict[str, Dict[str, List[str]]] = dict()  # product name: {prefix: [path, ]}
+        self.exchanges: Dict[str, List[str]] = dict()           # exchange: [path, ]
+        self.prefixes: Dict[str, Dict[str, str]] = dict()       # prefix: {ticker name: path}
+
+
+class BarDataFileCatalog:
+    """
+    :param root: BarData/60 文件夹
+    :param prefixes: 按顺序查找的 Prefix 文件夹, 如 DSManager.PrefixFolderName
+    :param cache_path: 文件夹记录 的缓存文件; None 时 只保存在内存中
+    :param refresh_interval: dates() 时, 距上次 refresh() 超过此秒数 则自动 refresh()（全部 日期文件夹）; None 时 不自动
+    """
+    CacheVersion = 1
+
+    def __init__(
+            self, root: str, prefixes: List[str], cache_path: str or None = None,
+            refresh_interval: float or None = 60, logger=logging.getLogger('DSManager'),
+    ):
+        self.root = os.path.abspath(root)
+        self.prefixes = list(prefixes)
+        self.cache_path = cache_path
+        self.refresh_interval = refresh_interval
+        self.logger = logger
+        # {prefix: {'YYYYMMDD': (mtime, [ticker name, ])}}
+        self._folders: Dict[str, Dict[str, Tuple[float, List[str]]]] = {_: dict() for _ in self.prefixes}
+        self._index: Dict[str, _DateIndex] = dict()
+        self._refreshed_at: float or None = None
+        self._load_cache()
+
+    def _load_cache(self):
+        if not self.cache_path or not os.path.isfile(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, 'rb') as f:
+                _cache = pickle.load(f)
+        except Exception as e:
+            self.logger.warning(f'BarDataFileCatalog, 读取缓存失败, {self.cache_path}, {e}')
+            return
+        if _cache.get('version') != self.CacheVersion or _cache.get('root') != self.root:
+            return
+        for _prefix in self.prefixes:
+            self._folders[_prefix] = _cache['folders'].get(_prefix, dict())
+
+    def _save_cache(self):
+        if not self.cache_path:
+            return
+        _dir = os.path.dirname(self.cache_path)
+        if _dir and not os.path.isdir(_dir):
+            os.makedirs(_dir)
+        _p_tmp = self.cache_path + '.tmp'
+        with open(_p_tmp, 'wb') as f:
+            pickle.dump(dict(version=self.CacheVersion, root=self.root, folders=self._folders), f)
+        os.replace(_p_tmp, self.cache_path)
+
+    @staticmethod
+    def _is_date_folder_name(name: str) -> bool:
+        return len(name) == 8 and name.isdigit()
+
+    def refresh(self) -> int:
+        """检查 日期文件夹 的修改时间, 重新读取 新增/变化 的文件夹; 返回 变化的文件夹数量"""
+        n_changed = 0
+        for _prefix in self.prefixes:
+            _path_prefix = os.path.join(self.root, _prefix)
+            _old = self._folders[_prefix]
+            _new = dict()
+            if os.path.isdir(_path_prefix):
+                with os.scandir(_path_prefix) as it:
+                    for _entry in it:
+                        if not (self._is_date_folder_name(_entry.name) and _entry.is_dir()):
+                            continue
+                        _mtime = _entry.stat().st_mtime
+                        if _entry.name in _old and _old[_entry.name][0] == _mtime:
+                            _new[_entry.name] = _old[_entry.name]
+                            continue
+                        _new[_entry.name] = (_mtime, sorted([
+                            _[:-4] for _ in os.listdir(_entry.path) if _.endswith('.csv')]))
+                        self._index.pop(_entry.name, None)
+                        n_changed += 1
+            for _s_date in set(_old.keys()) - set(_new.keys()):
+                self._index.pop(_s_date, None)
+                n_changed += 1
+            self._folders[_prefix] = _new
+        self._refreshed_at = time.time()
+        if n_changed:
+            self.logger.info(f'BarDataFileCatalog, refresh, {n_changed} folders changed')
+            self._save_cache()
+        return n_changed
+
+    def _maybe_refresh(self):
+        if self._refreshed_at is None:
+            self.refresh()
+        elif self.refresh_interval is not None and time.time() - self._refreshed_at > self.refresh_interval:
+            self.refresh()
+
+    def _check_date_folders(self, s_date: str):
+        """重新检查 某一天 各 prefix 文件夹的 修改时间, 有变化时 重新 listdir 该文件夹"""
+        _changed = False
+        for _prefix in self.prefixes:
+            _path_date = os.path.join(self.root, _prefix, s_date)
+            _old = self._folders[_prefix].get(s_date)
+            try:
+                _mtime = os.stat(_path_date).st_mtime
+            except FileNotFoundError:
+                if _old is not None:
+                    del self._folders[_prefix][s_date]
+                    _changed = True
+                continue
+            if _old is not None and _old[0] == _mtime:
+                continue
+            self._folders[_prefix][s_date] = (_mtime, sorted([
+                _[:-4] for _ in os.listdir(_path_date) if _.endswith('.csv')]))
+            _changed = True
+        if _changed:
+            self._index.pop(s_date, None)
+
+    def _date_index(self, query_date: date) -> _DateIndex:
+        """只检查 该日期的文件夹, 不做 全部 日期文件夹 的 refresh()"""
+        _s_date = query_date.strftime('%Y%m%d')
+        self._check_date_folders(_s_date)
+        index = self._index.get(_s_date)
+        if index is not None:
+            return index
+        index = _DateIndex()
+        for _prefix in self.prefixes:
+            _folder = self._folders[_prefix].get(_s_date)
+            if _folder is None:
+                continue
+            _path_date = os.path.join(self.root, _prefix, _s_date)
+            d_prefix_files = dict()
+            for _ticker_name in _folder[1]:
+                _path = os.path.join(_path_date, _ticker_name + '.csv')
+                _ticker = Ticker.gen_obj_from_name(_ticker_name)
+                d_prefix_files[_ticker_name] = _path
+                index.tickers.setdefault(_ticker_name, _path)
+                index.products.setdefault(_ticker.product.name, dict()).setdefault(_prefix, []).append(_path)
+                index.exchanges.setdefault(_ticker.exchange, []).append(_path)
+            index.prefixes[_prefix] = d_prefix_files
+        self._index[_s_date] = index
+        return index
+
+    def ticker_file(self, ticker_name: str, query_date: date) -> str or None:
+        return self._date_index(query_date).tickers.get(ticker_name)
+
+    def product_files(self, product_name: str, query_date: date) -> List[str]:
+        """第一个 有此 product 合约的 prefix 中的文件"""
+        d_prefix_files = self._date_index(query_date).products.get(product_name)
+        if not d_prefix_files:
+            return []
+        return list(next(iter(d_prefix_files.values())))
+
+    def exchange_files(self, exchange: str, query_date: date) -> List[str]:
+        return list(self._date_index(query_date).exchanges.get(exchange, []))
+
+    def date_files(self, query_date: date, prefix: str or None = None) -> Dict[str, str]:
+        """{ticker name: path}; prefix 为 None 时 所有 prefix"""
+        index = self._date_index(query_date)
+        if prefix is not None:
+            return dict(index.prefixes.get(prefix, dict()))
+        d_files = dict()
+        for _prefix in self.prefixes:
+            d_files.update(index.prefixes.get(_prefix, dict()))
+        return d_files
+
+    def dates(self, prefix: str or None = None) -> List[date]:
+        """有数据文件夹 的日期"""
+        self._maybe_refresh()
+        _s_dates = set()
+        for _prefix in ([prefix] if prefix else self.prefixes):
+            _s_dates.update(self._folders.get(_prefix, dict()).keys())
+        return [datetime.strptime(_, '%Y%m%d').date() for _ in sorted(_s_dates)]
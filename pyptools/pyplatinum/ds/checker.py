@@ -4,6 +4,16 @@
 
 """
 
+import logging
+from datetime import date, time
+from typing import List, Dict
+
+import numpy as np
+
+from pyptools.common.object import Product, Ticker, BarData, TradingSessionData, trading_session_minute_mask
+from pyptools.common.constant import AllMinuteTime
+from .object import DSManager
+
 
 class BarDataChecker:
     def __init__(self):
@@ -35,52 +45,46 @@ class DSChecker:
                 self.logger.warning(f'找不到此Product的MostActivateTicker, {_product.name}, {tdate.strftime("%Y%m%d")}')
                 continue
 
-    def check_ticker_bar(self, tdate: date, tickers: List[Ticker]):
+    def check_ticker_bar(self, tdate: date, tickers: List[Ticker]) -> Dict[Ticker, List[time]]:
+        """
+        检查 交易时间内 缺少的 bar; 没有bar数据 或 没有交易时间信息 的ticker 跳过
+        :return: {ticker: [缺少的时间, ]}
+        """
         _default_timezone = '210'
         _trading_session_table = self.ds_manager.trading_session_manager
+        d_losing_times = dict()
         for _ticker in tickers:
             # 读取 bar数据
-            _bar_data: List[BarData] = self.ds_manager._get_ticker_bar(ticker=_ticker, query_date=tdate)
+            _file = self.ds_manager._get_ticker_bar_data_file(_ticker, tdate)
+            _bar_data: List[BarData] = self.ds_manager._read_a_bar_file(_file) if _file else []
             if not _bar_data:
                 self.logger.warning(f'找不到此Ticker的Bar数据, {_ticker.name}, {tdate.strftime("%Y%m%d")}')
                 continue
-            # 检查数据
             # 获取trading session
-            _ticker_trading_session = _trading_session_table.get(_default_timezone, _ticker.product, tdate)
+            _minute_mask = _trading_session_table.get_minute_mask(
+                _ticker.product, time_zone_index=_default_timezone, checking_date=tdate)
+            if _minute_mask is None:
+                self.logger.warning(f'找不到此Ticker的TradingSession, {_ticker.name}, {tdate.strftime("%Y%m%d")}')
+                continue
             # check1 连续
+            _losing_times = self._check_minute_mask(_bar_data, _minute_mask)
+            if _losing_times:
+                self.logger.warning(
+                    f'Bar数据缺失, {_ticker.name}, {tdate.strftime("%Y%m%d")}, {len(_losing_times)} minutes, '
+                    f'{",".join([_.strftime("%H%M") for _ in _losing_times])}')
+            d_losing_times[_ticker] = _losing_times
+        return d_losing_times
+
+    @staticmethod
+    def _check_minute_mask(data: List[BarData], minute_mask: np.ndarray) -> List[time]:
+        """minute_mask 中 为 True 但 没有bar数据 的时间"""
+        _present = np.zeros(len(AllMinuteTime), dtype=bool)
+        _present[[_.time.hour * 60 + _.time.minute for _ in data]] = True
+        return [AllMinuteTime[_] for _ in np.flatnonzero(minute_mask & ~_present)]
 
     @staticmethod
     def _check_trading_session(
             data: List[BarData], trading_session_data: TradingSessionData) -> List[time]:
-        _data_times: List[time] = [_.time for _ in data]        # 所有bar 时间
-        _data_times.sort()
-        _checking_time_n = -1       # 用于遍历 需要检查的 交易时间
-        _data_time_n = 0            # 用于遍历 所有bar的 数据时间
-        l_losing_time = []      # 存储缺少的时间
-        # 根据trading session 指定的时间区间进行检查
-        for _a_session in trading_session_data.TradingSession:
-            _session_start: time = _a_session[0]
-            _session_end: time = _a_session[1]
-            while True:
-                # 需要检查的 交易时间
-                _checking_time_n += 1
-                _checking_time = AllMinuteTime[_checking_time_n]
-                if _checking_time < _session_start:
-                    continue
-                if _checking_time > _session_end:
-                    break
-                # 看看bar数据中有没有此时间
-                while True:
-                    _data_time = _data_times[_data_time_n]
-                    if _data_time < _checking_time:
-                        _data_time_n += 1
-                        continue
-                    elif _data_time == _checking_time:
-                        # 存在此时间的数据
-                        break
-                    else:
-                        # 不存在此时间的数据
-                        l_losing_time.append(_checking_time)
-                        break
-        return l_losing_time
-
+        """缺少的时间（按 一天内的时间 排序）"""
+        return DSChecker._check_minute_mask(
+            data, trading_session_minute_mask(trading_session_data.TradingSession))
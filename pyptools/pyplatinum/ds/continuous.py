@@ -0,0 +1,126 @@
+"""
+product 的 复权连续 bar 数据
+
+每个交易日 取当天的 最活跃合约（MostActiveTickers.csv 中 Date <= 该日 的最后一条）的 bar 文件, 按日期拼接,
+价格字段（open, high, low, close, price）乘以 当天的 BackAdjustFactor（累计复权因子）, volume / open_interest 不变.
+normalize_to_last=True 时 再除以 最后一天的因子, 使 最后一天的价格 与 原始价格 相同.
+
+结果 按 (product, start, using_holiday) 缓存; 之后 end 更晚的查询 只读取 已加载的最后一天 之后的文件 并追加,
+已加载日期 之前的数据 不重新读取. start 不早于 已缓存的 start 时 使用该缓存, [start, end] 直接从缓存中截取.
+最多缓存 max_cached_series 个序列, 超过时 删除 最久未使用的.
+
+    builder = BackAdjustedBarBuilder(ds_manager)
+    df = builder.get(Product('rb', 'SHFE'), date(2024, 1, 1), date(2024, 6, 30))
+"""
+
+from datetime import date
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from pyptools.common.object import Product
+from .bars import read_bar_files, empty_bar_frame
+from .most_activate_ticker import MostActivateTickerInfo
+
+BACK_ADJUSTED_FIELDS = ['open', 'high', 'low', 'close', 'price']
+
+
+class _ContinuousSeries:
+    def __init__(self):
+        self.frame: pd.DataFrame = empty_bar_frame().assign(factor=pd.Series([], dtype=np.float64))
+        self.loaded_end: date or None = None     # 已加载的 最后一个有数据的日期
+
+
+class BackAdjustedBarBuilder:
+    """
+    :param ds: DSManager
+    :param max_workers: 读取文件的 默认 线程数
+    :param max_cached_series: 最多缓存的 (product, start, using_holiday) 序列数, LRU
+    """
+
+    def __init__(self, ds, max_workers: int = 8, max_cached_series: int = 32):
+        self.ds = ds
+        self.max_workers = max_workers
+        self.max_cached_series = max_cached_series
+        self._cache: Dict[Tuple[str, date, bool], _ContinuousSeries] = OrderedDict()
+
+    def mat_infos_for_dates(self, product: Product, dates: List[date]) -> List[MostActivateTickerInfo or None]:
+        """每个日期 对应的 最活跃合约信息, 即 Date <= 该日期 的最后一条; 没有时为 None"""
+        return self.ds.most_activate_tickers_manager.infos_for_dates(product, dates)
+
+    def _load(
+            self, product: Product, dates: List[date], max_workers: int, use_processes: bool) -> pd.DataFrame:
+        """dates 中每天 最活跃合约 的数据, 价格已乘以 当天因子"""
+        l_files, l_factors, l_dates = [], [], []
+        for _date, _info in zip(dates, self.mat_infos_for_dates(product, dates)):
+            if _info is None:
+                continue
+            _file = self.ds.bar_data_catalog.ticker_file(_info.Ticker.name, _date)
+            if not _file:
+                continue
+            l_files.append(_file)
+            l_factors.append(_info.BackAdjustFactor)
+            l_dates.append(np.datetime64(_date, 'ns'))
+        df = read_bar_files(l_files, max_workers=max_workers, use_processes=use_processes)
+        if not len(df):
+            return df.assign(factor=pd.Series([], dtype=np.float64))
+        # 每行的 因子: 按 交易日 对应到文件
+        _factor = np.asarray(l_factors, dtype=np.float64)[
+            np.searchsorted(np.asarray(l_dates), df['date'].to_numpy(dtype='datetime64[ns]'))]
+        df[BACK_ADJUSTED_FIELDS] = df[BACK_ADJUSTED_FIELDS].to_numpy() * _factor[:, None]
+        df['factor'] = _factor
+        return df
+
+    def get(
+            self, product: Product, start: date, end: date or None,
+            using_holiday: bool = True, normalize_to_last: bool = False,
+            max_workers: int or None = None, use_processes: bool = False,
+    ) -> pd.DataFrame:
+        """
+        :param end: None 时 只有 start 一天
+        :param max_workers: None 时 使用 self.max_workers; 与 use_processes 一起 传给 read_bar_files
+        :return: get_bar_data 的列 + factor; ticker 为 当天的最活跃合约
+        """
+        end = end or start
+        # 使用 start 不晚于 查询 start 的缓存中, start 最晚的一个
+        _keys = [
+            _ for _ in self._cache.keys()
+            if _[0] == product.name and _[2] == using_holiday and _[1] <= start
+        ]
+        if _keys:
+            _key = max(_keys, key=lambda x: x[1])
+        else:
+            _key = (product.name, start, using_holiday)
+            self._cache[_key] = _ContinuousSeries()
+            while len(self._cache) > max(self.max_cached_series, 1):
+                self._cache.popitem(last=False)
+        self._cache.move_to_end(_key)
+        series = self._cache[_key]
+
+        if series.loaded_end is None or end > series.loaded_end:
+            # 只加载 已加载日期 之后的交易日
+            _load_start = _key[1] if series.loaded_end is None else series.loaded_end
+            l_dates = [
+                _ for _ in self.ds._gen_trading_dates(product, _load_start, end, using_holiday)
+                if series.loaded_end is None or _ > series.loaded_end
+            ]
+            df_new = self._load(
+                product, l_dates, self.max_workers if max_workers is None else max_workers, use_processes)
+            if len(df_new):
+                series.frame = pd.concat([series.frame, df_new], ignore_index=True) \
+                    if len(series.frame) else df_new
+                series.loaded_end = df_new['date'].iloc[-1].date()
+
+        _dates = series.frame['date'].to_numpy()
+        df = series.frame.iloc[
+            np.searchsorted(_dates, np.datetime64(start, 'ns'), side='left'):
+            np.searchsorted(_dates, np.datetime64(end, 'ns'), side='right')
+        ].reset_index(drop=True)
+        if normalize_to_last and len(df):
+            df[BACK_ADJUSTED_FIELDS] = df[BACK_ADJUSTED_FIELDS].to_numpy() / df['factor'].iloc[-1]
+        return df
+
+    def clear(self):
+        self._cache.clear()
@@ -1,10 +1,13 @@
 import os
+from bisect import bisect_right
 from datetime import date, datetime
 from dataclasses import dataclass
 from pyptools.common.object import Product, Ticker
 from typing import List, Dict
 from collections import defaultdict
 
+import numpy as np
+
 
 @dataclass
 class MostActivateTickerInfo:
@@ -44,26 +47,57 @@ class MostActivateTickerFile:
 
 
 class MostActivateTickerManager:
+    """
+    每个 product 的记录 按日期排序, 查询某天的最活跃合约（Date <= 该日 的最后一条）为 二分查找
+    """
+
     def __init__(self, path):
         self._data: Dict[Product, List[MostActivateTickerInfo]] = MostActivateTickerFile.read(path)
+        for _infos in self._data.values():
+            _infos.sort(key=lambda x: x.Date)
+        self._dates: Dict[Product, List[date]] = {
+            _product: [_.Date for _ in _infos] for _product, _infos in self._data.items()}
+        self._ordinals: Dict[Product, np.ndarray] = dict()     # 日期的 toordinal(), 用于 np.searchsorted
 
     @property
     def data(self) -> Dict[Product, List[MostActivateTickerInfo]]:
         return self._data.copy()
 
-    def get_a_most_activate_ticker(self, product: Product, tdate: date = datetime.now().date()) -> Ticker or None:
-        """获取某个Product在某天时的最活跃合约"""
-        _product_mai: List[MostActivateTickerInfo] = self._data.get(product)
-        _the_info = max([_ for _ in _product_mai if _.Date <= tdate], key=lambda x: x.date)
-        if _the_info:
-            return _the_info.Ticker
-        else:
+    def get_a_most_activate_info(self, product: Product, tdate: date = None) -> MostActivateTickerInfo or None:
+        """某个Product在某天时的 最活跃合约信息"""
+        _dates = self._dates.get(product)
+        if not _dates:
             return None
+        _n = bisect_right(_dates, tdate or datetime.now().date()) - 1
+        return self._data[product][_n] if _n >= 0 else None
 
-    def get_most_activate_tickers_at_date(self, tdate: date = datetime.now().date()) -> Dict[Product, Ticker]:
-        """获取所有Product在某天时的最活跃合约"""
+    def get_a_most_activate_ticker(self, product: Product, tdate: date = None) -> Ticker or None:
+        """获取某个Product在某天时的最活跃合约"""
+        _info = self.get_a_most_activate_info(product, tdate)
+        return _info.Ticker if _info else None
+
+    def get_most_activate_tickers_at_date(self, tdate: date = None) -> Dict[Product, Ticker]:
+        """获取所有Product在某天时的最活跃合约; 该日期之前 没有记录的 Product 不包含在内"""
         _d_most_act_infos = {}
-        for _product, _l_most_act_infos in self._data.items():
-            _d_most_act_infos[_product] = max(
-                [_ for _ in _l_most_act_infos if _.Date <= tdate], key=lambda x: x.date).Ticker
+        for _product in self._data.keys():
+            _ticker = self.get_a_most_activate_ticker(_product, tdate)
+            if _ticker:
+                _d_most_act_infos[_product] = _ticker
         return _d_most_act_infos
+
+    def infos_for_dates(self, product: Product, dates: List[date]) -> List[MostActivateTickerInfo or None]:
+        """每个日期 的最活跃合约信息, 一次 np.searchsorted; 没有时为 None"""
+        if product not in self._data:
+            return [None] * len(dates)
+        if product not in self._ordinals:
+            self._ordinals[product] = np.fromiter(
+                (_.toordinal() for _ in self._dates[product]), dtype=np.int64, count=len(self._dates[product]))
+        _infos = self._data[product]
+        _n = np.searchsorted(
+            self._ordinals[product], np.fromiter((_.toordinal() for _ in dates), dtype=np.int64, count=len(dates)),
+            side='right') - 1
+        return [_infos[_] if _ >= 0 else None for _ in _n.tolist()]
+
+    def tickers_for_dates(self, product: Product, dates: List[date]) -> List[Ticker or None]:
+        """每个日期 的最活跃合约"""
+        return [_.Ticker if _ else None for _ in self.infos_for_dates(product, dates)]
@@ -26,15 +26,21 @@ from typing import Dict, List
 from collections import defaultdict
 import logging
 
+import pandas as pd
+
 from pyptools.common.object import (
     Product, Ticker,
     BarData
 )
 from pyptools.common.constant import BarDataMode
-from pyptools.common.utility import (gen_date_range, gen_list_diff, read_data_file_with_func)
+from pyptools.common.utility import read_data_file_with_func
+from pyptools.common.trading_calendar import ExchangeTradingCalendars
 from pyptools.pyplatinum.trading_session import TradingSessionManager
 from pyptools.pyplatinum.general_ticker_info import GeneralTickerInfoManager
 from .most_activate_ticker import MostActivateTickerManager
+from .catalog import BarDataFileCatalog
+from .bars import read_bar_file, read_bar_files, BarDataList
+from .continuous import BackAdjustedBarBuilder
 
 
 class DSManager:
@@ -62,7 +68,7 @@ class DSManager:
         获取数据:
             1) 获取数据文件路径
                 ge_bar_data_file()
-            2) 获取bar数据, List[BarData]
+            2) 获取bar数据, pd.DataFrame / List[BarData]
                 get_bar_data()
                 数据类型 ({Type}_{Mode}) :
                     1) Ticker_NormalData
@@ -86,7 +92,7 @@ class DSManager:
     #
     _instances = {}
 
-    def __new__(cls, root: str):
+    def __new__(cls, root: str, *args, **kwargs):
         """同一个DS目录，只能有1个实例"""
         if root in cls._instances.keys():
             pass
@@ -95,7 +101,11 @@ class DSManager:
             cls._instances[root] = _instance
         return cls._instances[root]
 
-    def __init__(self, root, logger=logging.Logger('DSManager')):
+    def __init__(self, root, logger=logging.Logger('DSManager'), bar_data_catalog_path: str or None = None):
+        """
+        :param bar_data_catalog_path: bar 数据文件索引 的缓存文件（pickle）, None 时 不保存到文件, 只在内存中;
+            每次查询 会检查 该日期文件夹的修改时间, 新写入的 bar 文件 立即可见
+        """
         assert os.path.isdir(root)
         self._root = root
         self.logger = logger
@@ -116,6 +126,8 @@ class DSManager:
         # 初始化
         # 假期信息
         self._holiday_infos: Dict[str, List[date]] = self._read_holiday_file()
+        # 交易日历; 与原来的处理相同, 只剔除假期, 不剔除周末; 找不到 exchange 时 使用 SHFE
+        self.trading_calendars = ExchangeTradingCalendars(self._holiday_infos, weekmask='1111111')
         # 主力合约、复权因子
         self.most_activate_tickers_manager = MostActivateTickerManager(self._most_activate_ticker_file)
         # 合约基本信息
@@ -123,8 +135,13 @@ class DSManager:
         # 交易时间
         self.trading_session_manager = TradingSessionManager(self._release_data_folder)
 
-        # bar 数据文件路径
-        self.bar_data_files = {}
+        # bar 数据文件路径 索引
+        self.bar_data_catalog = BarDataFileCatalog(
+            os.path.join(self._root, self.BarDataFolderRelpath), self.PrefixFolderName,
+            cache_path=bar_data_catalog_path, logger=self.logger,
+        )
+        # 复权连续数据
+        self.back_adjusted_bar_builder = BackAdjustedBarBuilder(self)
 
     def _read_holiday_file(self):
         _d = defaultdict(list)
@@ -140,69 +157,29 @@ class DSManager:
         return _d
 
     # 基础方法-获取数据/数据文件
+    # 通过 self.bar_data_catalog 查找, 不再每次 listdir
     # (1) ticker
     def _get_ticker_bar_data_file(self, ticker: Ticker, query_date: date) -> str or None:
         """获取某个ticker某一天的 bar 数据文件路径"""
-        p_file = None
-        # 查找文件
-        for _prefix in self.PrefixFolderName:
-            _file = os.path.join(
-                self._root, self.BarDataFolderRelpath, _prefix,
-                query_date.strftime('%Y%m%d'),
-                ticker.name + '.csv'
-            )
-            if os.path.isfile(_file):
-                p_file = _file
-                break
-        return p_file
+        return self.bar_data_catalog.ticker_file(ticker.name, query_date)
 
     # (2) product
     def _get_product_bar_data_file(self, product: Product, query_date: date) -> List[str]:
         """"""
-        l_p_file = []
-        # 查找文件
-        for _prefix in self.PrefixFolderName:
-            d_ticker_files: Dict[Ticker, str] = self._get_date_bar_data_file(query_date, _prefix)
-            for _ticker in d_ticker_files:
-                if _ticker.product == product:
-                    l_p_file.append(d_ticker_files[_ticker])
-            if l_p_file:
-                break
-        return l_p_file
+        return self.bar_data_catalog.product_files(product.name, query_date)
 
     # (3) exchange
     def _get_exchange_bar_data_file(self, exchange: str, query_date: date) -> List[str]:
-        l_files = []
-        for _prefix in self.PrefixFolderName:
-            d_ticker_files: Dict[Ticker, str] = self._get_date_bar_data_file(query_date, _prefix)
-            for _ticker in d_ticker_files:
-                if _ticker.exchange == exchange:
-                    l_files.append(d_ticker_files[_ticker])
-        return l_files
+        return self.bar_data_catalog.exchange_files(exchange, query_date)
 
     # 获取某一天的所有bar文件
     def _get_date_bar_data_file(self, query_date: date, prefix: str or None = None) -> Dict[Ticker, str]:
-        _checking_prefix = []
-        if prefix:
-            if prefix in self.PrefixFolderName:
-                _checking_prefix.append(prefix)
-        if not _checking_prefix:
-            _checking_prefix = self.PrefixFolderName
-
-        d_ticker_files = {}
-        for _prefix in _checking_prefix:
-            _path_date = os.path.join(
-                self._root, self.BarDataFolderRelpath, _prefix,
-                query_date.strftime('%Y%m%d'),
-            )
-            if not os.path.isdir(_path_date):
-                continue
-            for ticker_file_name in os.listdir(_path_date):
-                _ticker_name = ticker_file_name.replace('.csv', '')
-                _ticker = Ticker.gen_obj_from_name(_ticker_name)
-                _ticker_file = os.path.join(_path_date, ticker_file_name)
-                d_ticker_files[_ticker] = _ticker_file
-        return d_ticker_files
+        if prefix not in self.PrefixFolderName:
+            prefix = None
+        return {
+            Ticker.gen_obj_from_name(_ticker_name): _file
+            for _ticker_name, _file in self.bar_data_catalog.date_files(query_date, prefix).items()
+        }
 
     #
     def get_product_mat(self, product: Product, query_date: date) -> Ticker:
@@ -219,25 +196,7 @@ class DSManager:
         :param using_holiday:
         :return:
         """
-        # holiday 处理
-        _holidays = []
-        if not using_holiday:
-            _holidays = []
-        else:
-            holiday: Dict[str, List[date]] = self._holiday_infos.copy()
-            if symbol.exchange in holiday.keys():
-                _holidays: List[date] = holiday[symbol.exchange]
-            else:
-                _holidays: List[date] = holiday.get('SHFE')
-        # 查询日期
-        if end:
-            l_dates: List[date] = gen_date_range(start, end)
-        else:
-            l_dates: List[date] = [start]
-        # 剔除 holiday
-        if _holidays:
-            l_dates: List[date] = gen_list_diff(l_dates, _holidays)
-        return l_dates
+        return self._gen_exchange_trading_dates(symbol.exchange, start, end, using_holiday)
 
     # 交易日
     def _gen_exchange_trading_dates(
@@ -252,24 +211,11 @@ class DSManager:
         :param using_holiday:
         :return:
         """
-        _holidays = []
-        if not using_holiday:
-            _holidays = []
+        if using_holiday:
+            _calendar = self.trading_calendars.calendar(exchange)
         else:
-            holiday: Dict[str, List[date]] = self._holiday_infos.copy()
-            if exchange in holiday.keys():
-                _holidays: List[date] = holiday[exchange]
-            else:
-                _holidays: List[date] = holiday.get('SHFE')
-        # 查询日期
-        if end:
-            l_dates: List[date] = gen_date_range(start, end)
-        else:
-            l_dates: List[date] = [start]
-        # 剔除 holiday
-        if _holidays:
-            l_dates: List[date] = gen_list_diff(l_dates, _holidays)
-        return l_dates
+            _calendar = self.trading_calendars.no_holiday_calendar()
+        return _calendar.trading_days(start, end or start)
 
     # 获取bar文件，exchange
     def get_bar_data_file_in_exchange(
@@ -313,9 +259,10 @@ class DSManager:
                     _file_list: List[str] = self._get_product_bar_data_file(symbol, query_date)
                     _d_result[query_date] = _file_list
             elif mode == BarDataMode.BackAdjustedData:
-                for query_date in l_query_dates:
-                    # 查找主力合约
-                    _mat: Ticker = self.get_product_mat(symbol, query_date)
+                # 查找主力合约
+                l_mat: List[Ticker or None] = self.most_activate_tickers_manager.tickers_for_dates(
+                    symbol, l_query_dates)
+                for query_date, _mat in zip(l_query_dates, l_mat):
                     if _mat:
                         _file: str or None = self._get_ticker_bar_data_file(_mat, query_date)
                     else:
@@ -332,75 +279,49 @@ class DSManager:
             symbol: Ticker or Product,
             start: date, end: date or None,
             mode: BarDataMode = BarDataMode.NormalData,
-            using_holiday: bool = True
-    ) -> List[List[BarData]]:
-        """读取并返回BarData"""
-        # TODO 未完成
-        # holiday 处理
-        # 查询日期
-        l_query_dates = self._gen_trading_dates(symbol, start, end, using_holiday)
-
-        #
+            using_holiday: bool = True,
+            as_bar_data: bool = False,
+            max_workers: int = 8,
+            use_processes: bool = False,
+    ) -> pd.DataFrame or BarDataList:
+        """
+        读取 bar 数据, 文件在 线程池/进程池 中读取
+        :param mode: Product 的 BackAdjustedData 见 BackAdjustedBarBuilder
+        :param as_bar_data: True 时 返回 BarDataList（List[BarData] 视图）
+        :return: pd.DataFrame, 列为 ticker, date, datetime, open, high, low, close, volume, price, open_interest;
+            按 日期, 文件 的顺序排列
+        """
+        if type(symbol) is Product and mode == BarDataMode.BackAdjustedData:
+            # 最活跃合约 拼接, 价格 乘以 复权因子; 多一列 factor
+            df = self.back_adjusted_bar_builder.get(
+                symbol, start, end, using_holiday, max_workers=max_workers, use_processes=use_processes)
+            return BarDataList(df) if as_bar_data else df
         d_files: Dict[date, list] = self.get_bar_data_file(symbol, start, end, mode, using_holiday)
-        # 获取数据
-        l_data = []
-        if type(symbol) is Ticker:
-            for _date, _files in d_files:
-                for _file in _files:
-                    l_data.append(self._read_a_bar_file(_file))
-        elif type(symbol) is Product:
-            if mode == BarDataMode.NormalData:
-                for _date, _files in d_files:
-                    for _file in _files:
-                        l_data.append(self._read_a_bar_file(_file))
-            elif mode == BarDataMode.BackAdjustedData:
-                pass
+        l_files = [_file for _date in sorted(d_files.keys()) for _file in d_files[_date]]
+        df = read_bar_files(l_files, max_workers=max_workers, use_processes=use_processes)
+        if as_bar_data:
+            return BarDataList(df)
+        return df
 
     @staticmethod
     def _read_a_bar_file(file) -> List[BarData]:
-        file_name = os.path.basename(file)
-        s_date = os.path.basename(os.path.dirname(file))
-        ticker_name = file_name[:-4]
-        _ticker = Ticker.gen_obj_from_name(ticker_name)
-        _date = datetime.strptime(s_date, '%Y%m%d').date()
-
-        _l_data = []
-        with open(file) as f:
-            l_lines = f.readlines()
-        for line in l_lines:
-            line = line.strip()
-            if line == '':
-                continue
-            line_split = line.split(',')
-            if len(line_split) != 8:
-                print(f'Bar数据文件错误, {file}, {line}')
-                raise ValueError
-            _l_data.append(BarData(
-                ticker=_ticker,
-                date=_date,
-                time=datetime.strptime(line_split[0], '%H:%M:%s').time(),
-                open=float(line_split[1]),
-                high=float(line_split[2]),
-                low=float(line_split[3]),
-                close=float(line_split[4]),
-                volume=float(line_split[5]),
-                price=float(line_split[6]),
-                open_interest=float(line_split[7]),
-            ))
-        return _l_data
-
-
-    def _get_product_mat_bar(self, product: Product, query_date: date, _baj=False):
+        return list(BarDataList(read_bar_file(file)))
+
+    def _get_product_mat_bar(self, product: Product, query_date: date, _baj=False) -> pd.DataFrame:
         """
         获取product的bar数据; 两种方式: 最活跃合约(不进行baj) / 全部合约
         :param product:
         :param query_date:
-        :param _in_most_act:
+        :param _baj: True 时 价格乘以 复权因子
         :return:
         """
-        pass
-
-
+        if _baj:
+            return self.back_adjusted_bar_builder.get(product, query_date, query_date, using_holiday=False)
+        _info = self.back_adjusted_bar_builder.mat_infos_for_dates(product, [query_date])[0]
+        if _info is None:
+            return read_bar_files([])
+        _file = self._get_ticker_bar_data_file(_info.Ticker, query_date)
+        return read_bar_files([_file] if _file else [])
 
 
 class BarDataFile:
@@ -410,8 +331,8 @@ class BarDataFile:
         self.interval = interval
 
     def parse_a_line(self, s: str) -> BarData:
-        split_line = s.split(',')
-        if len(split_line) != 8:
+        s = s.split(',')
+        if len(s) != 8:
             raise ValueError
         _time = datetime.strptime(s[0], '%H:%M:%S').time()
         _open = float(s[1])
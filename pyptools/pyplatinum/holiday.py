@@ -3,6 +3,7 @@ from datetime import datetime, date
 from typing import List, Dict
 from collections import defaultdict
 
+from pyptools.common.trading_calendar import TradingCalendar, ExchangeTradingCalendars
 
 
 """
@@ -48,6 +49,10 @@ class HolidayManager:
         for _exchange, _holiday in self._holiday:
             self._holiday_by_exchange[_exchange].append(_holiday)
         self._all_holiday: List[date] = list(set([_[1] for _ in self._holiday]))
+        # is_holiday 使用 set 查找
+        self._holiday_set_by_exchange = {_k: set(_v) for _k, _v in self._holiday_by_exchange.items()}
+        self._all_holiday_set = set(self._all_holiday)
+        self._trading_calendars: Dict[str, ExchangeTradingCalendars] = dict()
 
     @property
     def holiday(self):
@@ -69,12 +74,25 @@ class HolidayManager:
         else:
             raise TypeError
 
-        _holiday = []
         if exchange:
-            if exchange in self._holiday_by_exchange.keys():
-                _holiday = self._holiday_by_exchange[exchange]
+            if exchange in self._holiday_set_by_exchange.keys():
+                _holiday = self._holiday_set_by_exchange[exchange]
             else:
                 raise KeyError
         else:
-            _holiday = self.all_holiday
+            _holiday = self._all_holiday_set
         return checking_date in _holiday
+
+    def trading_calendars(self, weekmask: str = '1111100') -> ExchangeTradingCalendars:
+        """按交易所的 交易日历, 找不到 exchange 时 使用 SHFE; weekmask 见 TradingCalendar"""
+        if weekmask not in self._trading_calendars:
+            self._trading_calendars[weekmask] = ExchangeTradingCalendars(
+                self._holiday_by_exchange, weekmask=weekmask)
+        return self._trading_calendars[weekmask]
+
+    def trading_calendar(self, exchange: str, weekmask: str = '1111100') -> TradingCalendar:
+        return self.trading_calendars(weekmask).calendar(exchange)
+
+    def is_trading_day(self, checking_date: date or datetime, exchange: str) -> bool:
+        """非周末, 且不是该交易所的假期"""
+        return self.trading_calendar(exchange).is_trading_day(checking_date)
@@ -1,2 +1,3 @@
 from .db import OmsDbManagement, Order, OrderLogs, Trade, TradeLogs, TraderPosition
 from .db import OrderState, Direction
+from .db import OmsIncrementalView, WATERMARK_COLUMNS
@@ -1,18 +1,32 @@
 """
+OMS 数据库
 
+增量查询: 按 WATERMARK_COLUMNS 中的时间列（水位）只读取 since 之后 新增/更新 的行,
+按 (时间, 主键) 分页, 逐页读取并 yield, 不一次性加载整张表.
+
+    oms = OmsDbManagement(db, host, user, pwd)
+    view = oms.create_view(Order)
+    view.poll()         # 第一次 全量加载; 之后 只读取并应用 增量, 返回 新增/变化 的行
+    view.rows           # {主键: Order}
+
+watermark 之前 lookback 时间内的行 会重新读取（防止 时间相同 / 提交较晚 的行被漏掉）, 与已有的行相同时 忽略.
+增量查询 无法发现 被删除的行, 以及 时间列为空 的行; 需要时 调用 view.refresh() 全量重新加载.
 """
 
 from urllib import parse
-from typing import Dict, List
+from typing import Dict, List, Iterator
 from collections import defaultdict
 from enum import Enum
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
+from dataclasses import replace
 
 from sqlalchemy import Column, String, Integer, Date, Float, ForeignKey, DateTime
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, select, and_, or_
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker
 
+from pyptools.common.db import build_dsn, get_engine, EnginePoolSettings, LARGE_POOL_SETTINGS
+
 
 class OrderState(Enum):
     ordered = 1
@@ -206,19 +220,90 @@ class TraderPosition(Base):  # 定义一个类，继承Base
                f'HedgeFlag={str(self.HedgeFlag)}'
 
 
+# 增量查询 使用的 时间列（水位）
+WATERMARK_COLUMNS = {
+    Order: 'UpdateTime',
+    OrderLogs: 'UpdateTime',
+    Trade: 'CreateTime',
+    TradeLogs: 'CreateTime',
+    TraderPosition: 'UpdateTime',
+}
+
+
+def _keyset_after(columns: list, values: tuple):
+    """(columns) > (values) 的字典序比较, 展开为 OR / AND, 不依赖 数据库对 行值比较 的支持"""
+    return or_(*[
+        and_(*[columns[i] == values[i] for i in range(n)], columns[n] > values[n])
+        for n in range(len(columns))
+    ])
+
+
+class OmsIncrementalView:
+    """
+    一张表在内存中的 物化视图, 每次 poll() 只读取 并应用 水位之后的增量
+    :param where: 额外的过滤条件, 如 OrderLogs.Date == '20240102'
+    :param lookback: 每次从 watermark - lookback 开始读取
+    """
+
+    def __init__(
+            self, oms: 'OmsDbManagement', model, where=None,
+            page_size: int = 5000, lookback: timedelta = timedelta(seconds=5),
+    ):
+        self.oms = oms
+        self.model = model
+        self.where = where
+        self.page_size = page_size
+        self.lookback = lookback
+        self._time_column = WATERMARK_COLUMNS[model]
+        self._pk_columns = [_.name for _ in model.__table__.primary_key.columns]
+        self.rows: Dict[tuple, object] = dict()
+        self._values: Dict[tuple, tuple] = dict()
+        self.watermark: datetime or None = None
+        self.n_polls = 0
+        self.n_rows_read = 0
+
+    def __len__(self):
+        return len(self.rows)
+
+    def poll(self) -> list:
+        """读取增量 并应用到 self.rows, 返回 新增/变化 的行"""
+        since = None if self.watermark is None else self.watermark - self.lookback
+        l_changed = []
+        for _row in self.oms.iter_rows(self.model, since=since, where=self.where, page_size=self.page_size):
+            self.n_rows_read += 1
+            _key = tuple(_row._mapping[_] for _ in self._pk_columns)
+            _values = tuple(_row)
+            _time = _row._mapping[self._time_column]
+            if self.watermark is None or _time > self.watermark:
+                self.watermark = _time
+            if self._values.get(_key) == _values:
+                continue
+            self._values[_key] = _values
+            self.rows[_key] = self.model(**_row._mapping)
+            l_changed.append(self.rows[_key])
+        self.n_polls += 1
+        return l_changed
+
+    def refresh(self) -> list:
+        """清空后 全量重新加载"""
+        self.rows.clear()
+        self._values.clear()
+        self.watermark = None
+        return self.poll()
+
+
 class OmsDbManagement:
-    def __init__(self, db, host, user, pwd, echo=False):
+    def __init__(
+            self, db, host, user, pwd, echo=False,
+            pool_settings: EnginePoolSettings or None = None, dialect: str or None = None,
+    ):
         # 初始化数据库连接
         # self.PMSession = PMDbGlobal(db=db, host=host, user=user, pwd=pwd, echo=echo)
-        # 初始化数据库连接
-        self.engine = create_engine(
-            f'mssql+pymssql://{str(user)}:{parse.quote_plus(pwd)}@{str(host)}/{str(db)}',
-            echo=echo,
-            max_overflow=50,    # 超过连接池大小之后，允许最大扩展连接数；
-            pool_size=50,    # 连接池的大小
-            pool_timeout=600,   # 连接池如果没有连接了，最长的等待时间
-            pool_recycle=-1,    # 多久之后对连接池中连接进行一次回收
-        )
+        # 初始化数据库连接; 进程内共享, 相同连接信息 复用同一个连接池; 默认 LARGE_POOL_SETTINGS
+        pool_settings = pool_settings or LARGE_POOL_SETTINGS
+        if echo:
+            pool_settings = replace(pool_settings, echo=echo)
+        self.engine = get_engine(build_dsn(host=host, user=user, pwd=pwd, database=db, dialect=dialect), pool_settings)
         # 创建DBSession类
         self.DBSession = sessionmaker(bind=self.engine)
         self.session = self.DBSession()
@@ -226,17 +311,54 @@ class OmsDbManagement:
     def close(self):
         self.session.close()
 
-    def query_orders(self) -> List[Order]:
-        return self.session.query(Order).all()
-
-    def query_order_logs(self, ):
-        return
-
-    def query_trades(self):
-        return
-
-    def query_trade_logs(self):
-        return
-
-    def query_positions(self):
-        return
+    def iter_rows(self, model, since: datetime or None = None, where=None, page_size: int = 5000) -> Iterator:
+        """
+        按 (WATERMARK_COLUMNS[model], 主键) 顺序 分页读取 时间 >= since 的行, 逐行 yield sqlalchemy Row
+        每页 使用一次连接, 页之间 不占用连接
+        """
+        _table = model.__table__
+        _time = _table.c[WATERMARK_COLUMNS[model]]
+        _order = [_time] + list(_table.primary_key.columns)
+        _stmt = select(_table).where(_time.isnot(None))
+        if since is not None:
+            _stmt = _stmt.where(_time >= since)
+        if where is not None:
+            _stmt = _stmt.where(where)
+        _last = None
+        while True:
+            _page_stmt = _stmt if _last is None else _stmt.where(_keyset_after(_order, _last))
+            with self.engine.connect() as conn:
+                _rows = conn.execute(_page_stmt.order_by(*_order).limit(page_size)).all()
+            yield from _rows
+            if len(_rows) < page_size:
+                return
+            _last = tuple(_rows[-1]._mapping[_.name] for _ in _order)
+
+    def _query(self, model, since: datetime or None, where=None) -> list:
+        if since is None:
+            _query = self.session.query(model)
+            return (_query if where is None else _query.filter(where)).all()
+        return [model(**_row._mapping) for _row in self.iter_rows(model, since=since, where=where)]
+
+    def query_orders(self, since: datetime or None = None) -> List[Order]:
+        """:param since: 只返回 UpdateTime >= since 的委托; None 时返回全部"""
+        return self._query(Order, since)
+
+    def query_order_logs(self, since: datetime or None = None, date: str or None = None) -> List[OrderLogs]:
+        """:param date: OrderBookLogs.Date"""
+        return self._query(OrderLogs, since, None if date is None else OrderLogs.Date == date)
+
+    def query_trades(self, since: datetime or None = None) -> List[Trade]:
+        """:param since: 只返回 CreateTime >= since 的成交"""
+        return self._query(Trade, since)
+
+    def query_trade_logs(self, since: datetime or None = None, date: str or None = None) -> List[TradeLogs]:
+        return self._query(TradeLogs, since, None if date is None else TradeLogs.Date == date)
+
+    def query_positions(self, since: datetime or None = None) -> List[TraderPosition]:
+        """:param since: 只返回 UpdateTime >= since 的持仓"""
+        return self._query(TraderPosition, since)
+
+    def create_view(self, model, where=None, page_size: int = 5000) -> OmsIncrementalView:
+        """:param model: Order / OrderLogs / Trade / TradeLogs / TraderPosition"""
+        return OmsIncrementalView(self, model, where=where, page_size=page_size)
@@ -1 +1,2 @@
 from .db import PMDbManagement, Strategy, Trader, TraderLog
+from .panel import TraderPnlPanel, TraderPnlPanelCache
@@ -17,12 +17,16 @@ from urllib import parse
 from typing import Dict, List
 from collections import defaultdict
 from datetime import datetime, date
+from dataclasses import replace
 
 from sqlalchemy import Column, String, Integer, Date, Float, ForeignKey, DateTime
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, select
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker
 
+from pyptools.common.db import build_dsn, get_engine, EnginePoolSettings, LARGE_POOL_SETTINGS
+from pyptools.pyplatinum.pm.panel import TraderPnlPanel
+
 Base = declarative_base()  # 创建对象的基类
 
 
@@ -137,18 +141,17 @@ class TraderLog(Base):
 
 
 class PMDbManagement:
-    def __init__(self, db, host, user, pwd, echo=False):
+    def __init__(
+            self, db, host, user, pwd, echo=False,
+            pool_settings: EnginePoolSettings or None = None, dialect: str or None = None,
+    ):
         # 初始化数据库连接
         # self.PMSession = PMDbGlobal(db=db, host=host, user=user, pwd=pwd, echo=echo)
-        # 初始化数据库连接
-        self.engine = create_engine(
-            f'mssql+pymssql://{str(user)}:{parse.quote_plus(pwd)}@{str(host)}/{str(db)}',
-            echo=echo,
-            max_overflow=50,    # 超过连接池大小之后，允许最大扩展连接数；
-            pool_size=50,    # 连接池的大小
-            pool_timeout=600,   # 连接池如果没有连接了，最长的等待时间
-            pool_recycle=-1,    # 多久之后对连接池中连接进行一次回收
-        )
+        # 初始化数据库连接; 进程内共享, 相同连接信息 复用同一个连接池; 默认 LARGE_POOL_SETTINGS
+        pool_settings = pool_settings or LARGE_POOL_SETTINGS
+        if echo:
+            pool_settings = replace(pool_settings, echo=echo)
+        self.engine = get_engine(build_dsn(host=host, user=user, pwd=pwd, database=db, dialect=dialect), pool_settings)
         # 创建DBSession类
         self.DBSession = sessionmaker(bind=self.engine)
         self.session = self.DBSession()
@@ -186,8 +189,36 @@ class PMDbManagement:
         _d[strategy_id] = defaultdict(list)
         _datas: List[list] = self.session.query(TraderLog.Date, TraderLog.TraderId).join(Trader).filter(
             Trader.StrategyId == strategy_id).all()
+        # 每个日期 只解析一次
+        d_dates = {_s: datetime.strptime(_s, '%Y%m%d').date() for _s in set([_[0] for _ in _datas])}
         for _data in _datas:
-            _date: date = datetime.strptime(_data[0], '%Y%m%d').date()
+            _date: date = d_dates[_data[0]]
             _trader_name = _data[1]
             _d[strategy_id][_trader_name].append(_date)
         return _d
+
+    def iter_trader_log_rows(
+            self, strategy_ids: List[str], fields: List[str] = ('Pnl',), start_date: str or None = None,
+            yield_per: int = 50000,
+    ):
+        """
+        只选择需要的列, 流式读取
+        :param start_date: 'YYYYMMDD', 只读取 Date >= start_date
+        yield (StrategyId, TraderId, Date, *fields)
+        """
+        _stmt = select(
+            Trader.StrategyId, TraderLog.TraderId, TraderLog.Date, *[getattr(TraderLog, _) for _ in fields]
+        ).join(Trader, Trader.Id == TraderLog.TraderId).where(Trader.StrategyId.in_(list(strategy_ids)))
+        if start_date is not None:
+            _stmt = _stmt.where(TraderLog.Date >= start_date)
+        with self.engine.connect() as conn:
+            _result = conn.execution_options(stream_results=True, yield_per=yield_per).execute(_stmt)
+            for _row in _result:
+                yield tuple(_row)
+
+    def load_pnl_panel(
+            self, strategy_ids: List[str], fields: List[str] = ('Pnl',), start_date: str or None = None,
+    ) -> TraderPnlPanel:
+        """多个 strategy 的 TraderLog -> dates × traders 面板"""
+        return TraderPnlPanel.from_rows(
+            self.iter_trader_log_rows(strategy_ids, fields=fields, start_date=start_date), fields=list(fields))
@@ -0,0 +1,203 @@
+"""
+TraderLog 的 列式面板
+
+TraderPnlPanel: dates × traders 的二维 NumPy 数组, 每个字段（Pnl / Commission / ...）一个,
+没有记录的位置为 nan, mask 标记 数据库中存在的记录.
+
+TraderPnlPanelCache: 按 strategy 缓存面板, 以 最大日期 为水位,
+之后的 get() 只读取 >= 水位日期 的 TraderLog 并合并; 设置 path 时 同时保存为 <path>/<strategy>.npz,
+下次启动 从文件加载后 只读取增量.
+
+    pm = PMDbManagement(db, host, user, pwd)
+    cache = TraderPnlPanelCache(pm, fields=['Pnl', 'Commission'], path='./cache')
+    panel = cache.get(['strategy1', 'strategy2'])
+    panel.to_frame('Pnl')       # pd.DataFrame, index 为日期, columns 为 trader
+
+水位之前 新增/修改 的 TraderLog 不会被增量读取, 需要时 cache.refresh(strategy_id).
+"""
+
+import os
+import logging
+from typing import List, Dict, Iterable
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger('pyptools.db')
+
+
+class TraderPnlPanel:
+    """
+    :param dates: 'YYYYMMDD' 字符串数组, 升序
+    :param traders: trader id 数组, 升序
+    :param strategies: 每个 trader 所属的 strategy
+    :param values: {field: float64 数组, shape (len(dates), len(traders))}
+    :param mask: bool 数组, 同 shape, 数据库中存在该 (date, trader) 的记录
+    """
+
+    def __init__(
+            self, dates: np.ndarray, traders: np.ndarray, strategies: np.ndarray,
+            values: Dict[str, np.ndarray], mask: np.ndarray,
+    ):
+        self.dates = dates
+        self.traders = traders
+        self.strategies = strategies
+        self.values = values
+        self.mask = mask
+        assert len(traders) == len(strategies)
+        for _field, _arr in values.items():
+            assert _arr.shape == (len(dates), len(traders)), f'{_field}, {_arr.shape}'
+
+    def __repr__(self):
+        return f'<TraderPnlPanel(dates={len(self.dates)}, traders={len(self.traders)}, ' \
+               f'fields={list(self.values.keys())})>'
+
+    @property
+    def max_date(self) -> str or None:
+        return str(self.dates[-1]) if len(self.dates) else None
+
+    @classmethod
+    def empty(cls, fields: List[str]) -> 'TraderPnlPanel':
+        return cls(
+            dates=np.empty(0, dtype=str), traders=np.empty(0, dtype=str), strategies=np.empty(0, dtype=str),
+            values={_: np.empty((0, 0), dtype=np.float64) for _ in fields}, mask=np.empty((0, 0), dtype=bool),
+        )
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[tuple], fields: List[str]) -> 'TraderPnlPanel':
+        """:param rows: (StrategyId, TraderId, Date, *fields), 可以是 生成器"""
+        l_strategy, l_trader, l_date = [], [], []
+        l_values = [[] for _ in fields]
+        for _row in rows:
+            l_strategy.append(_row[0])
+            l_trader.append(_row[1])
+            l_date.append(_row[2])
+            for _l, _v in zip(l_values, _row[3:]):
+                _l.append(_v)
+        if not l_date:
+            return cls.empty(fields)
+        _dates, _date_index = np.unique(np.asarray(l_date, dtype=str), return_inverse=True)
+        _traders, _first, _trader_index = np.unique(
+            np.asarray(l_trader, dtype=str), return_index=True, return_inverse=True)
+        _shape = (len(_dates), len(_traders))
+        _mask = np.zeros(_shape, dtype=bool)
+        _mask[_date_index, _trader_index] = True
+        d_values = dict()
+        for _field, _l in zip(fields, l_values):
+            _arr = np.full(_shape, np.nan)
+            _arr[_date_index, _trader_index] = np.asarray(_l, dtype=np.float64)
+            d_values[_field] = _arr
+        return cls(
+            dates=_dates, traders=_traders, strategies=np.asarray(l_strategy, dtype=str)[_first],
+            values=d_values, mask=_mask,
+        )
+
+    @classmethod
+    def combine(cls, panels: List['TraderPnlPanel']) -> 'TraderPnlPanel':
+        """按 日期/trader 的并集 合并; 同一 (date, trader) 以后面的 panel 为准"""
+        panels = [_ for _ in panels if len(_.dates)]
+        if not panels:
+            return cls.empty([])
+        if len(panels) == 1:
+            return panels[0]
+        _fields = list(panels[0].values.keys())
+        _dates = np.unique(np.concatenate([_.dates for _ in panels]))
+        _traders, _first = np.unique(np.concatenate([_.traders for _ in panels]), return_index=True)
+        _strategies = np.concatenate([_.strategies for _ in panels])[_first]
+        _shape = (len(_dates), len(_traders))
+        _mask = np.zeros(_shape, dtype=bool)
+        d_values = {_f: np.full(_shape, np.nan) for _f in _fields}
+        for _panel in panels:
+            _di = np.searchsorted(_dates, _panel.dates)
+            _ti = np.searchsorted(_traders, _panel.traders)
+            _rows, _cols = np.nonzero(_panel.mask)
+            _mask[_di[_rows], _ti[_cols]] = True
+            for _f in _fields:
+                d_values[_f][_di[_rows], _ti[_cols]] = _panel.values[_f][_rows, _cols]
+        return cls(dates=_dates, traders=_traders, strategies=_strategies, values=d_values, mask=_mask)
+
+    def select_strategies(self, strategy_ids: List[str]) -> 'TraderPnlPanel':
+        _cols = np.isin(self.strategies, strategy_ids)
+        _rows = self.mask[:, _cols].any(axis=1)
+        return TraderPnlPanel(
+            dates=self.dates[_rows], traders=self.traders[_cols], strategies=self.strategies[_cols],
+            values={_f: _arr[_rows][:, _cols] for _f, _arr in self.values.items()},
+            mask=self.mask[_rows][:, _cols],
+        )
+
+    def to_frame(self, field: str = 'Pnl') -> pd.DataFrame:
+        """index 为日期（datetime64）, columns 为 trader"""
+        return pd.DataFrame(
+            self.values[field], columns=self.traders,
+            index=pd.to_datetime(self.dates, format='%Y%m%d'),
+        )
+
+    def to_npz(self, path):
+        np.savez(
+            path, dates=self.dates, traders=self.traders, strategies=self.strategies, mask=self.mask,
+            **{f'value_{_f}': _arr for _f, _arr in self.values.items()}
+        )
+
+    @classmethod
+    def from_npz(cls, path) -> 'TraderPnlPanel':
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                dates=data['dates'], traders=data['traders'], strategies=data['strategies'], mask=data['mask'],
+                values={_k[len('value_'):]: data[_k] for _k in data.files if _k.startswith('value_')},
+            )
+
+
+class TraderPnlPanelCache:
+    """
+    :param pm: PMDbManagement
+    :param path: 缓存文件目录, None 时 只缓存在内存中
+    """
+
+    def __init__(self, pm, fields: List[str] = ('Pnl',), path: str or None = None):
+        self.pm = pm
+        self.fields = list(fields)
+        self.path = path
+        self._panels: Dict[str, TraderPnlPanel] = dict()
+        if path and not os.path.isdir(path):
+            os.makedirs(path)
+
+    def _file(self, strategy_id) -> str:
+        return os.path.join(self.path, f'{strategy_id}.npz')
+
+    def _load_file(self, strategy_id) -> TraderPnlPanel or None:
+        if not self.path or not os.path.isfile(self._file(strategy_id)):
+            return None
+        panel = TraderPnlPanel.from_npz(self._file(strategy_id))
+        if list(panel.values.keys()) != self.fields:
+            # 字段不同, 重新全量读取
+            return None
+        return panel
+
+    def _update(self, strategy_id) -> TraderPnlPanel:
+        panel = self._panels.get(strategy_id) or self._load_file(strategy_id)
+        if panel is None or panel.max_date is None:
+            new_panel = self.pm.load_pnl_panel([strategy_id], fields=self.fields)
+            panel = new_panel
+        else:
+            # 最大日期 当天的记录 可能被更新, 重新读取
+            new_panel = self.pm.load_pnl_panel([strategy_id], fields=self.fields, start_date=panel.max_date)
+            panel = TraderPnlPanel.combine([panel, new_panel])
+        logger.info(f'TraderPnlPanelCache, {strategy_id}, read {int(new_panel.mask.sum())} rows, '
+                    f'max date {panel.max_date}')
+        self._panels[strategy_id] = panel
+        if self.path and len(panel.dates):
+            panel.to_npz(self._file(strategy_id))
+        return panel
+
+    def get(self, strategy_ids: List[str]) -> TraderPnlPanel:
+        """按水位 更新各 strategy 后, 返回合并的面板"""
+        _panels = [self._update(_) for _ in strategy_ids]
+        if not any(len(_.dates) for _ in _panels):
+            return TraderPnlPanel.empty(self.fields)
+        return TraderPnlPanel.combine(_panels)
+
+    def refresh(self, strategy_id):
+        """丢弃缓存, 下次 get() 时全量读取"""
+        self._panels.pop(strategy_id, None)
+        if self.path and os.path.isfile(self._file(strategy_id)):
+            os.remove(self._file(strategy_id))
@@ -0,0 +1,214 @@
+"""
+QM report 批量入库
+
+    Pnl_*.csv       -> PnL
+    Position_*.csv  -> Position
+    Trades_*.csv    -> Trades
+    MorningCheck_Account.csv 没有对应的表, 忽略
+
+多进程解析 report 文件, 主进程 按主键去重后, 每个文件 在一个事务中 按 batch 先删除已有主键 再批量插入.
+已入库的文件 记录在 manifest（json）中, 文件大小 和 修改时间 都未变化时 跳过.
+
+    engine = get_engine(build_dsn(host, user, pwd, db))
+    ingestion = QMReportIngestion(engine, manifest_path='./qm_manifest.json')
+    ingestion.run(find_newest_report(path_reports))
+    ingestion.run(find_reports(path_reports))      # 补全所有日期
+"""
+
+import os
+import json
+import time
+import logging
+from datetime import datetime
+from typing import List, Dict, Tuple
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import insert, delete, and_, bindparam
+from sqlalchemy.engine import Engine
+
+from pyptools.pyplatinum.qm.db import PnL, Position, Trades
+from pyptools.pyplatinum.qm.object import (
+    match_report_file, QMReportPnLFile, QMReportPositionFile, QMReportTradesFile)
+
+logger = logging.getLogger('pyptools.db')
+
+
+def _pnl_rows(report: QMReportPnLFile) -> List[dict]:
+    return [
+        dict(Trader=_.Trader, DataTime=_.Datatime, PnL=_.NetProfit, Commission=_.Commission, InitX=_.InitX)
+        for _ in report.data
+    ]
+
+
+def _position_rows(report: QMReportPositionFile) -> List[dict]:
+    # 同一 (Trader, Ticker) 的多行（不同 HedgeFlag / Account）合并
+    d_rows = dict()
+    for _ in report.data:
+        _key = (_.Trader, _.Ticker)
+        if _key not in d_rows:
+            d_rows[_key] = dict(
+                Trader=_.Trader, DataTime=_.Datatime, Ticker=_.Ticker, LongPosition=0, ShortPosition=0)
+        d_rows[_key]['LongPosition'] += _.LongPosition
+        d_rows[_key]['ShortPosition'] += _.ShortPosition
+    for _row in d_rows.values():
+        _row['Position'] = _row['LongPosition'] - _row['ShortPosition']
+    return list(d_rows.values())
+
+
+def _trades_rows(report: QMReportTradesFile) -> List[dict]:
+    return [
+        dict(
+            Id=f'{_.InternalId}_{_.ExternalId}', Trader=_.Trader, DataTime=_.TradeTime, Ticker=_.Ticker,
+            Direction=_.Direction, Volume=_.Volume, Price=_.Price, Commission=_.Commission,
+        )
+        for _ in report.data
+    ]
+
+
+# report 文件类 -> (表, 转换为行)
+REPORT_TABLES = {
+    QMReportPnLFile: (PnL, _pnl_rows),
+    QMReportPositionFile: (Position, _position_rows),
+    QMReportTradesFile: (Trades, _trades_rows),
+}
+
+
+def parse_report(path) -> Tuple[str, str or None, List[dict]]:
+    """
+    在工作进程中运行, 返回 (path, 表名, 行); 不入库的文件 表名为 None
+    """
+    _cls = match_report_file(os.path.basename(path))
+    if _cls not in REPORT_TABLES:
+        return path, None, []
+    report = _cls(path)
+    if report.CreateDatetime is None:
+        logger.error(f'parse_report, 文件名 无法解析时间, {path}')
+        return path, None, []
+    report.read()
+    _table, _to_rows = REPORT_TABLES[_cls]
+    return path, _table.__tablename__, _to_rows(report)
+
+
+def dedupe_rows(rows: List[dict], key_columns: List[str]) -> List[dict]:
+    """主键相同的行, 保留最后一行"""
+    d_rows = dict()
+    for _row in rows:
+        d_rows[tuple(_row[_] for _ in key_columns)] = _row
+    return list(d_rows.values())
+
+
+@dataclass
+class QMReportIngestionResult:
+    files: int = 0
+    skipped: int = 0
+    failed: int = 0
+    rows: int = 0
+    duplicates: int = 0
+    elapsed: float = 0
+
+    def __str__(self):
+        return (f'files {self.files}, skipped {self.skipped}, failed {self.failed}, '
+                f'rows {self.rows}, duplicates {self.duplicates}, elapsed {self.elapsed:.2f}s')
+
+
+class QMReportIngestion:
+    """
+    :param manifest_path: 已入库文件 的记录; None 时 不记录, 每次都重新入库
+    :param processes: 解析 report 的进程数, <= 1 时 在当前进程中解析
+    """
+
+    def __init__(
+            self, engine: Engine, manifest_path: str or None = None,
+            processes: int = 4, batch_size: int = 1000,
+    ):
+        self.engine = engine
+        self.manifest_path = manifest_path
+        self.processes = processes
+        self.batch_size = batch_size
+        self.tables = {_table.__tablename__: _table.__table__ for _table, _ in REPORT_TABLES.values()}
+        self.manifest: Dict[str, dict] = self._load_manifest()
+
+    def _load_manifest(self) -> Dict[str, dict]:
+        if not self.manifest_path or not os.path.isfile(self.manifest_path):
+            return dict()
+        with open(self.manifest_path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def _save_manifest(self):
+        if not self.manifest_path:
+            return
+        _p_tmp = self.manifest_path + '.tmp'
+        with open(_p_tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=4, ensure_ascii=False)
+        os.replace(_p_tmp, self.manifest_path)
+
+    @staticmethod
+    def _file_state(path) -> dict:
+        _stat = os.stat(path)
+        return dict(size=_stat.st_size, mtime=_stat.st_mtime)
+
+    def is_ingested(self, path) -> bool:
+        """文件 大小 和 修改时间 与 manifest 中记录的相同"""
+        _record = self.manifest.get(os.path.abspath(path))
+        if _record is None:
+            return False
+        _state = self._file_state(path)
+        return _record['size'] == _state['size'] and _record['mtime'] == _state['mtime']
+
+    def _write(self, table_name: str, rows: List[dict]) -> int:
+        """一个事务中, 按 batch 删除已存在的主键 再插入"""
+        _table = self.tables[table_name]
+        _keys = [_.name for _ in _table.primary_key.columns]
+        _delete = delete(_table).where(and_(*[_table.c[_k] == bindparam(f'_k_{_k}') for _k in _keys]))
+        with self.engine.begin() as conn:
+            for i in range(0, len(rows), self.batch_size):
+                _batch = rows[i: i + self.batch_size]
+                conn.execute(_delete, [{f'_k_{_k}': _row[_k] for _k in _keys} for _row in _batch])
+                conn.execute(insert(_table), _batch)
+        return len(rows)
+
+    def _parse_all(self, paths: List[str]):
+        if self.processes <= 1 or len(paths) <= 1:
+            for _p in paths:
+                yield parse_report(_p)
+            return
+        with ProcessPoolExecutor(max_workers=min(self.processes, len(paths))) as executor:
+            yield from executor.map(parse_report, paths)
+
+    def run(self, paths: List[str], force: bool = False) -> QMReportIngestionResult:
+        """
+        :param paths: report 文件, 如 find_newest_report() / find_reports() 的结果
+        :param force: 忽略 manifest, 全部重新入库
+        """
+        _t = time.time()
+        result = QMReportIngestionResult()
+        l_todo = []
+        for _p in paths:
+            _cls = match_report_file(os.path.basename(_p))
+            if _cls not in REPORT_TABLES or (not force and self.is_ingested(_p)):
+                result.skipped += 1
+                continue
+            l_todo.append(os.path.abspath(_p))
+
+        for _p, _table_name, _rows in self._parse_all(l_todo):
+            if _table_name is None or not _rows:
+                # 解析失败 或 空文件, 不记录, 下次重新处理
+                logger.warning(f'QMReportIngestion, no data, {_p}')
+                result.failed += 1
+                continue
+            _keys = [_.name for _ in self.tables[_table_name].primary_key.columns]
+            _unique_rows = dedupe_rows(_rows, _keys)
+            result.duplicates += len(_rows) - len(_unique_rows)
+            result.rows += self._write(_table_name, _unique_rows)
+            result.files += 1
+            self.manifest[_p] = dict(
+                **self._file_state(_p), table=_table_name, rows=len(_unique_rows),
+                ingested_at=datetime.now().strftime('%Y%m%d %H%M%S'),
+            )
+            self._save_manifest()
+            logger.info(f'QMReportIngestion, {_table_name}, {len(_unique_rows)} rows, {_p}')
+
+        result.elapsed = time.time() - _t
+        logger.info(f'QMReportIngestion, {str(result)}')
+        return result
@@ -309,11 +309,68 @@ class QMReportAccountCheckFile(QMReportBaseFile):
         )
 
 
+QM_REPORT_FILE_CLASSES = [QMReportPnLFile, QMReportPositionFile, QMReportTradesFile, QMReportAccountCheckFile]
+
+
+def match_report_file(name: str) -> type or None:
+    """文件名 对应的 QMReport*File 类; 备份文件（名称含 bak）和 其他文件 返回 None"""
+    if 'bak' in name.lower():
+        return None
+    for _cls in QM_REPORT_FILE_CLASSES:
+        if _cls.name_pattern.match(name):
+            return _cls
+    return None
+
+
+def _report_date_folders(p) -> List[str]:
+    """p 下的 YYYYMMDD 文件夹, 升序"""
+    _l = []
+    for name in os.listdir(p):
+        if not os.path.isdir(os.path.join(p, name)):
+            continue
+        try:
+            datetime.strptime(name, '%Y%m%d')
+        except ValueError:
+            continue
+        _l.append(os.path.join(p, name))
+    return sorted(_l)
+
+
+def find_reports(p) -> List[str]:
+    """
+    Reports 文件夹 p 中 所有日期文件夹下的 report 文件
+    p 中没有日期文件夹时, 查找 p 本身
+    """
+    _l = []
+    for _folder in (_report_date_folders(p) or [p]):
+        for name in sorted(os.listdir(_folder)):
+            if match_report_file(name) is not None:
+                _l.append(os.path.join(_folder, name))
+    return _l
+
+
 #
-def find_newest_report(p):
+def find_newest_report(p) -> List[str]:
     """
     查找最新的 report
-    :param p:
-    :return:
+    :param p: Reports 文件夹（包含 YYYYMMDD 文件夹）, 或 某一个日期文件夹
+    :return: 最新日期文件夹中, MorningCheck_Account.csv 以及 每种 report 每个 (BrokerId, StrategyName) 最新的文件
     """
-    pass
+    _folders = _report_date_folders(p)
+    _folder = _folders[-1] if _folders else p
+    _l = []
+    d_newest = dict()
+    for name in sorted(os.listdir(_folder)):
+        _cls = match_report_file(name)
+        if _cls is None:
+            continue
+        if _cls is QMReportAccountCheckFile:
+            _l.append(os.path.join(_folder, name))
+            continue
+        match = _cls.name_pattern.match(name)
+        _key = (_cls.__name__, match.group('BrokerId'), match.group('StrategyName'))
+        _dt = match.group('date') + match.group('time')
+        if _key not in d_newest or _dt > d_newest[_key][0]:
+            d_newest[_key] = (_dt, os.path.join(_folder, name))
+    _l += [_[1] for _ in d_newest.values()]
+    return _l
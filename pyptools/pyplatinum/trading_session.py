@@ -8,9 +8,11 @@ TradingSessionManager.data -> Dict[{_time_zone_index}, Dict[(Product, date), Tra
 import os
 from datetime import date, time, datetime
 from dataclasses import dataclass
-from typing import Dict, List
+from typing import Dict, List, Tuple
 from collections import defaultdict
 
+import numpy as np
+
 from pyptools.common.object import Product
 from pyptools.common.object import TradingSessionData, TradingSessionDataSet
 
@@ -95,12 +97,29 @@ class TradingSessionManager:
                     _time_zone_index = '.'.join(_name.split('.')[1:])
                     self._data[_time_zone_index] = _ts
 
-    def get(self, product, time_zone_index='210', checking_date=datetime.today().date()) -> List[List[time]] or None:
+    def get(self, product, time_zone_index='210', checking_date: date = None) -> List[List[time]] or None:
+        """checking_date 为 None 时 为今天"""
         if time_zone_index in self._data:
             return self._data[time_zone_index].get(product=product, checking_date=checking_date)
         else:
             return None
 
+    def get_minute_mask(self, product, time_zone_index='210', checking_date: date = None) -> np.ndarray or None:
+        """1440 分钟 的 bool 数组, 见 TradingSessionDataSet.minute_mask"""
+        if time_zone_index in self._data:
+            return self._data[time_zone_index].minute_mask(product=product, checking_date=checking_date)
+        else:
+            return None
+
+    def sessions_for(
+            self, products: List[Product], dates: List[date], time_zone_index='210'
+    ) -> Dict[Tuple[Product, date], np.ndarray or None]:
+        """{(product, date): 1440 分钟 的 bool 数组}, 见 TradingSessionDataSet.sessions_for"""
+        if time_zone_index in self._data:
+            return self._data[time_zone_index].sessions_for(products, dates)
+        else:
+            return {(_product, _date): None for _product in products for _date in dates}
+
     def get_time_zone_data(self, time_zone_index='210') -> TradingSessionDataSet or None:
         if time_zone_index in self._data:
             return self._data[time_zone_index]